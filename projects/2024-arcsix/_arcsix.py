@@ -49,6 +49,8 @@ import ssfr
 # parameters
 #╭────────────────────────────────────────────────────────────────────────────╮#
 _FNAMES_ = {}
+
+_RAD_RESP_CATALOG_ = {}
 #╰────────────────────────────────────────────────────────────────────────────╯#
 
 
@@ -421,9 +423,7 @@ def cdata_hsr1_v0(
         flux_toa = ssfr.util.get_solar_kurudz()
 
         wvl_tot = data0_tot.data['wvl']
-        f_dn_sol_tot = np.zeros_like(wvl_tot)
-        for i, wvl0 in enumerate(wvl_tot):
-            f_dn_sol_tot[i] = ssfr.util.cal_weighted_flux(wvl0, flux_toa[:, 0], flux_toa[:, 1])*ssfr.util.cal_solar_factor(date)
+        f_dn_sol_tot = ssfr.util.cal_slit_flux(wvl_tot, flux_toa[:, 0], flux_toa[:, 1])*ssfr.util.cal_solar_factor(date)
         #╰────────────────────────────────────────────────────────────────────────────╯#
 
         f = h5py.File(fname_h5, 'w')
@@ -832,6 +832,9 @@ def cdata_ssfr_v0(
         dark_extend=1,
         light_extend=1,
         dark_corr_mode='interp',
+        workers=None,
+        dtype=np.float64,
+        keep=None,
         run=True,
         ):
 
@@ -852,6 +855,9 @@ def cdata_ssfr_v0(
                 dark_extend=dark_extend,
                 light_extend=light_extend,
                 dark_corr_mode=dark_corr_mode,
+                workers=workers,
+                dtype=dtype,
+                keep=keep,
                 )
 
         # data that are useful
@@ -874,6 +880,22 @@ def cdata_ssfr_v0(
             if isinstance(ssfr0.data_spec[key], np.ndarray):
                 g.create_dataset(key, data=ssfr0.data_spec[key], compression='gzip', compression_opts=9, chunks=True)
 
+        # dark cycle summary (x: tmhr, y: counts), see read_ssfr.dark_corr
+        g = f.create_group('dark')
+        for key in ssfr0.dark_summary.keys():
+            g.create_dataset(key, data=ssfr0.dark_summary[key], compression='gzip', compression_opts=9, chunks=True)
+
+        # temperature dependent dark model (only when temperature anomaly is detected), e.g., dataset <dark_temp_coef/zen|si/150.0>
+        # with coefficients of shape (6, 256), can be reused through read_ssfr(..., dark_temp_coef=) after loading with
+        # {spec_tag: {float(int_time0): f['dark_temp_coef'][spec_tag][int_time0][...] for int_time0 in f['dark_temp_coef'][spec_tag].keys()} for spec_tag in f['dark_temp_coef'].keys()}
+        if any([len(ssfr0.dark_temp_coef[spec_tag])>0 for spec_tag in ssfr0.dark_temp_coef.keys()]):
+            g = f.create_group('dark_temp_coef')
+            for spec_tag in ssfr0.dark_temp_coef.keys():
+                if len(ssfr0.dark_temp_coef[spec_tag]) > 0:
+                    g0 = g.create_group(spec_tag)
+                    for int_time0 in ssfr0.dark_temp_coef[spec_tag].keys():
+                        g0.create_dataset(repr(float(int_time0)), data=ssfr0.dark_temp_coef[spec_tag][int_time0])
+
         f.close()
         #╰────────────────────────────────────────────────────────────────────────────╯#
 
@@ -916,9 +938,7 @@ def cdata_ssfr_v1(
         flux_toa = ssfr.util.get_solar_kurudz()
 
         wvl_zen = data_ssfr_v0['spec/wvl_zen']
-        f_dn_sol_zen = np.zeros_like(wvl_zen)
-        for i, wvl0 in enumerate(wvl_zen):
-            f_dn_sol_zen[i] = ssfr.util.cal_weighted_flux(wvl0, flux_toa[:, 0], flux_toa[:, 1])*ssfr.util.cal_solar_factor(date)
+        f_dn_sol_zen = ssfr.util.cal_slit_flux(wvl_zen, flux_toa[:, 0], flux_toa[:, 1])*ssfr.util.cal_solar_factor(date)
         #╰────────────────────────────────────────────────────────────────────────────╯#
 
         f = h5py.File(fname_h5, 'w')
@@ -944,33 +964,20 @@ def cdata_ssfr_v1(
                 #╭──────────────────────────────────────────────────────────────╮#
                 fdir_cal = '%s/rad-cal' % _FDIR_CAL_
 
-                jday_today = ssfr.util.dtime_to_jday(date)
+                # calibration catalog is indexed once and shared across datasets and flight dates
+                if fdir_cal not in _RAD_RESP_CATALOG_.keys():
+                    _RAD_RESP_CATALOG_[fdir_cal] = ssfr.cal.rad_resp_catalog(fdir_cal, pattern='*lamp-1324|*lamp-150c*|*pituffik*rad-resp|*')
+                cat_cal = _RAD_RESP_CATALOG_[fdir_cal]
 
-                int_time_tag_zen = 'si-%3.3d|in-%3.3d' % (data_ssfr_v0['raw/int_time'][data_ssfr_v0['raw/dset_num']==idset][0, 0], data_ssfr_v0['raw/int_time'][data_ssfr_v0['raw/dset_num']==idset][0, 1])
-                int_time_tag_nad = 'si-%3.3d|in-%3.3d' % (data_ssfr_v0['raw/int_time'][data_ssfr_v0['raw/dset_num']==idset][0, 2], data_ssfr_v0['raw/int_time'][data_ssfr_v0['raw/dset_num']==idset][0, 3])
+                int_time_zen = data_ssfr_v0['raw/int_time'][data_ssfr_v0['raw/dset_num']==idset][0, [0, 1]]
+                int_time_nad = data_ssfr_v0['raw/int_time'][data_ssfr_v0['raw/dset_num']==idset][0, [2, 3]]
 
-                # fnames_cal_zen = sorted(ssfr.util.get_all_files(fdir_cal, pattern='*lamp-1324|*lamp-150c_after-pri|*pituffik*%s*zen*%s*' % (which_ssfr_for_flux.lower(), int_time_tag_zen)), key=os.path.getmtime)
-                fnames_cal_zen = sorted(ssfr.util.get_all_files(fdir_cal, pattern='*lamp-1324|*lamp-150c*|*pituffik*%s*zen*%s*' % (which_ssfr_for_flux.lower(), int_time_tag_zen)), key=os.path.getmtime)
-                jday_cal_zen = np.zeros(len(fnames_cal_zen), dtype=np.float64)
-                for i in range(jday_cal_zen.size):
-                    dtime0_s = os.path.basename(fnames_cal_zen[i]).split('|')[2].split('_')[0]
-                    dtime0 = datetime.datetime.strptime(dtime0_s, '%Y-%m-%d')
-                    jday_cal_zen[i] = ssfr.util.dtime_to_jday(dtime0) + i/86400.0
-                fname_cal_zen = fnames_cal_zen[np.argmin(np.abs(jday_cal_zen-jday_today))]
-                data_cal_zen = ssfr.util.load_h5(fname_cal_zen)
+                fname_cal_zen, data_cal_zen = cat_cal.get_resp(which_ssfr_for_flux, 'zen', int_time_zen, date)
 
                 msg = '\nMessage [cdata_ssfr_v1]: Using <%s> for %s zenith irradiance ...' % (os.path.basename(fname_cal_zen), which_ssfr.upper())
                 print(msg)
 
-                # fnames_cal_nad = sorted(ssfr.util.get_all_files(fdir_cal, pattern='*lamp-1324|*lamp-150c_after-pri|*pituffik*%s*nad*%s*' % (which_ssfr_for_flux.lower(), int_time_tag_nad)), key=os.path.getmtime)
-                fnames_cal_nad = sorted(ssfr.util.get_all_files(fdir_cal, pattern='*lamp-1324|*lamp-150c*|*pituffik*%s*nad*%s*' % (which_ssfr_for_flux.lower(), int_time_tag_nad)), key=os.path.getmtime)
-                jday_cal_nad = np.zeros(len(fnames_cal_nad), dtype=np.float64)
-                for i in range(jday_cal_nad.size):
-                    dtime0_s = os.path.basename(fnames_cal_nad[i]).split('|')[2].split('_')[0]
-                    dtime0 = datetime.datetime.strptime(dtime0_s, '%Y-%m-%d')
-                    jday_cal_nad[i] = ssfr.util.dtime_to_jday(dtime0) + i/86400.0
-                fname_cal_nad = fnames_cal_nad[np.argmin(np.abs(jday_cal_nad-jday_today))]
-                data_cal_nad = ssfr.util.load_h5(fname_cal_nad)
+                fname_cal_nad, data_cal_nad = cat_cal.get_resp(which_ssfr_for_flux, 'nad', int_time_nad, date)
 
                 msg = '\nMessage [cdata_ssfr_v1]: Using <%s> for %s nadir irradiance ...' % (os.path.basename(fname_cal_nad), which_ssfr.upper())
                 print(msg)
@@ -1938,6 +1945,9 @@ def main_process_data_v0(cfg, run=True):
                 dark_extend=cfg.ssfr['dark_extend'],
                 light_extend=cfg.ssfr['light_extend'],
                 dark_corr_mode=cfg.ssfr['dark_corr_mode'],
+                workers=cfg.ssfr.get('workers', None),
+                dtype=cfg.ssfr.get('dtype', np.float64),
+                keep=cfg.ssfr.get('keep', None),
                 fdir_out=fdir_out,
                 run=run
                 )
@@ -1963,6 +1973,9 @@ def main_process_data_v0(cfg, run=True):
                 dark_extend=cfg.ssrr['dark_extend'],
                 light_extend=cfg.ssrr['light_extend'],
                 dark_corr_mode=cfg.ssrr['dark_corr_mode'],
+                workers=cfg.ssrr.get('workers', None),
+                dtype=cfg.ssrr.get('dtype', np.float64),
+                keep=cfg.ssrr.get('keep', None),
                 fdir_out=fdir_out,
                 run=run
                 )
@@ -387,11 +387,11 @@ def ssfr_rad_cal(
 
     date_today_s = datetime.datetime.now().strftime('%Y-%m-%d')
 
-    ssfr_ = ssfr.lasp_ssfr.read_ssfr(fnames_pri, verbose=False)
+    # integration times from primary calibration (session is decoded once and reused by cdata_rad_resp)
+    dset_info = ssfr.cal.get_rad_cal_spectra(fnames_pri, which_ssfr='lasp|%s' % ssfr_tag)['dset_info']
 
-    for i in range(ssfr_.Ndset):
-        dset_tag = 'dset%d' % i
-        int_time = ssfr_.dset_info[dset_tag]
+    for dset_tag in dset_info.keys():
+        int_time = dict(dset_info[dset_tag])
 
         if len(tags_pri) == 7:
             cal_tag = '%s_%s' % (tags_pri[0], tags_pri[4])
@@ -460,6 +460,7 @@ def ssfr_ang_cal(fdir):
 
 def main_ssfr_rad_cal(
         which_ssfr='lasp|ssfr-a',
+        workers=None,
         ):
 
     """
@@ -643,6 +644,14 @@ def main_ssfr_rad_cal(
                 ]
         #╰────────────────────────────────────────────────────────────────────────────╯#
 
+    # decode and dark correct every calibration session once (in parallel), results are
+    # reused for all the primary/transfer/secondary combinations below
+    #╭────────────────────────────────────────────────────────────────────────────╮#
+    fdirs_all = sorted(set([fdir0[spec_tag] for fdirs0 in [fdirs_pri, fdirs_tra, fdirs_sec] for fdir0 in fdirs0 for spec_tag in fdir0.keys()]))
+    fnames_all = [sorted(glob.glob('%s/*.SKS' % fdir0))[-1:] for fdir0 in fdirs_all]
+    ssfr.cal.prepare_rad_cal_spectra([fnames0 for fnames0 in fnames_all if len(fnames0) > 0], which_ssfr=which_ssfr, workers=workers)
+    #╰────────────────────────────────────────────────────────────────────────────╯#
+
     for fdir_pri in fdirs_pri:
         for fdir_tra in fdirs_tra:
             for fdir_sec in fdirs_sec:
@@ -726,6 +735,7 @@ def field_calibration_check(
 
 def main_ssfr_rad_cal_all(
         which_ssfr='lasp|ssfr-a',
+        workers=None,
         ):
 
     """
@@ -917,6 +927,14 @@ def main_ssfr_rad_cal_all(
                 ]
         #╰────────────────────────────────────────────────────────────────────────────╯#
 
+    # decode and dark correct every calibration session once (in parallel), results are
+    # reused for all the primary/transfer/secondary combinations below
+    #╭────────────────────────────────────────────────────────────────────────────╮#
+    fdirs_all = sorted(set([fdir0[spec_tag] for fdirs0 in [fdirs_pri, fdirs_tra, fdirs_sec] for fdir0 in fdirs0 for spec_tag in fdir0.keys()]))
+    fnames_all = [sorted(glob.glob('%s/*.SKS' % fdir0))[-1:] for fdir0 in fdirs_all]
+    ssfr.cal.prepare_rad_cal_spectra([fnames0 for fnames0 in fnames_all if len(fnames0) > 0], which_ssfr=which_ssfr, workers=workers)
+    #╰────────────────────────────────────────────────────────────────────────────╯#
+
     for fdir_pri in fdirs_pri:
         for fdir_tra in fdirs_tra:
             for fdir_sec in fdirs_sec:
@@ -199,9 +199,7 @@ def cdata_hsr1_v0(
         flux_toa = ssfr.util.get_solar_kurudz()
 
         wvl_tot = data0_tot.data['wvl']
-        f_dn_sol_tot = np.zeros_like(wvl_tot)
-        for i, wvl0 in enumerate(wvl_tot):
-            f_dn_sol_tot[i] = ssfr.util.cal_weighted_flux(wvl0, flux_toa[:, 0], flux_toa[:, 1])*ssfr.util.cal_solar_factor(date)
+        f_dn_sol_tot = ssfr.util.cal_slit_flux(wvl_tot, flux_toa[:, 0], flux_toa[:, 1])*ssfr.util.cal_solar_factor(date)
         #╰────────────────────────────────────────────────────────────────────────────╯#
 
         f = h5py.File(fname_h5, 'w')
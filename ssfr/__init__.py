@@ -8,3 +8,4 @@ from . import nasa_ssfr
 from . import lasp_spn
 from . import lasp_hsr
 from . import lasp_alp
+from . import lasp_cg4
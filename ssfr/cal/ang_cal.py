@@ -18,23 +18,61 @@ __all__ = ['cal_ang_resp', 'cdata_ang_resp']
 
 
 
+def cal_ang_counts(
+        fname,
+        which_ssfr='lasp|ssfr-a',
+        index_si=0,
+        index_in=1,
+        int_time_si=60,
+        int_time_in=300,
+        ):
+
+    """
+    Mean dark corrected counts (shutter open) of Silicon and InGaAs spectrometers from one angular calibration file
+    """
+
+    if which_ssfr.split('|')[0] == 'nasa':
+        import ssfr.nasa_ssfr as ssfr_toolbox
+    else:
+        import ssfr.lasp_ssfr as ssfr_toolbox
+
+    ssfr0 = ssfr_toolbox.read_ssfr([fname], which_ssfr=which_ssfr, process=False)
+    ssfr0.dset_check()
+
+    cycle = ssfr0.get_shutter_cycle()
+    group_si = cycle.get_group(ispec=index_si, int_time0=int_time_si)
+    group_in = cycle.get_group(ispec=index_in, int_time0=int_time_in)
+
+    shutter, counts = ssfr.corr.dark_corr(ssfr0.data_raw['tmhr'], ssfr0.data_raw['shutter'], ssfr0.data_raw['count_raw'][:, :, index_si], mode='interp', index=group_si['index'], cycle=group_si)
+    logic  = (shutter==0)
+    counts_si = np.nanmean(counts[group_si['index'][logic], :], axis=0)
+
+    shutter, counts = ssfr.corr.dark_corr(ssfr0.data_raw['tmhr'], ssfr0.data_raw['shutter'], ssfr0.data_raw['count_raw'][:, :, index_in], mode='interp', index=group_in['index'], cycle=group_in)
+    logic  = (shutter==0)
+    counts_in = np.nanmean(counts[group_in['index'][logic], :], axis=0)
+
+    return counts_si, counts_in
+
+
+
 def cal_ang_resp(
         fnames,
         which_ssfr='lasp|ssfr-a',
         which_lc='zen',
         int_time={'si':60, 'in':300},
-        Nchan=256
+        Nchan=256,
+        workers=None,
         ):
 
+    """
+    workers=: number of processes for reading the files of different angles in parallel; default=None (in series)
+    """
+
     # check SSFR spectrometer
     #/----------------------------------------------------------------------------\#
     which_ssfr = which_ssfr.lower()
     which_lab  = which_ssfr.split('|')[0]
-    if which_lab == 'nasa':
-        import ssfr.nasa_ssfr as ssfr_toolbox
-    elif which_lab == 'lasp':
-        import ssfr.lasp_ssfr as ssfr_toolbox
-    else:
+    if which_lab not in ['nasa', 'lasp']:
         msg = '\nError [cal_ang_resp]: <which_ssfr=> does not support <\'%s\'> (only supports <\'nasa|ssfr-6\'> or <\'lasp|ssfr-a\'> or <\'lasp|ssfr-b\'>).' % which_ssfr
         raise ValueError(msg)
     #\----------------------------------------------------------------------------/#
@@ -71,22 +109,18 @@ def cal_ang_resp(
 
     Nfile = len(fnames)
 
+    tasks = [(fname, which_ssfr, index_si, index_in, int_time[si_tag], int_time[in_tag]) for fname in fnames.keys()]
+    if (workers is None) or (workers <= 1):
+        results = [cal_ang_counts(*task) for task in tasks]
+    else:
+        with mp.Pool(processes=workers) as pool:
+            results = pool.starmap(cal_ang_counts, tasks)
+
     counts_si   = np.zeros((Nfile, Nchan), dtype=np.float64)
     counts_in   = np.zeros((Nfile, Nchan), dtype=np.float64)
-    for i, fname in enumerate(fnames.keys()):
-
-        ssfr0 = ssfr_toolbox.read_ssfr([fname])
-
-        logic_si = (np.abs(ssfr0.data_raw['int_time'][:, index_si]-int_time[si_tag])<0.00001)
-        logic_in = (np.abs(ssfr0.data_raw['int_time'][:, index_in]-int_time[in_tag])<0.00001)
-
-        shutter, counts = ssfr.corr.dark_corr(ssfr0.data_raw['tmhr'][logic_si], ssfr0.data_raw['shutter'][logic_si], ssfr0.data_raw['count_raw'][logic_si, :, index_si], mode='interp')
-        logic  = (shutter==0)
-        counts_si[i, :] = np.nanmean(counts[logic, :], axis=0)
-
-        shutter, counts = ssfr.corr.dark_corr(ssfr0.data_raw['tmhr'][logic_in], ssfr0.data_raw['shutter'][logic_in], ssfr0.data_raw['count_raw'][logic_in, :, index_in], mode='interp')
-        logic  = (shutter==0)
-        counts_in[i, :] = np.nanmean(counts[logic, :], axis=0)
+    for i, (counts_si0, counts_in0) in enumerate(results):
+        counts_si[i, :] = counts_si0
+        counts_in[i, :] = counts_in0
 
     ang_resp = {
             si_tag: counts_si/(np.tile(counts_si[0, :], Nfile).reshape(Nfile, -1)),
@@ -106,6 +140,7 @@ def cdata_ang_resp(
         wvl_joint=950.0,
         wvl_range=[350.0, 2200.0],
         int_time={'si':60, 'in':300},
+        workers=None,
         verbose=True
         ):
 
@@ -155,7 +190,7 @@ def cdata_ang_resp(
 
     # get cosine response (aka angular response)
     #/----------------------------------------------------------------------------\#
-    ang_resp_ = cal_ang_resp(fnames, which_ssfr=which_ssfr, which_lc=which_lc, Nchan=Nchan, int_time=int_time)
+    ang_resp_ = cal_ang_resp(fnames, which_ssfr=which_ssfr, which_lc=which_lc, Nchan=Nchan, int_time=int_time, workers=workers)
     #\----------------------------------------------------------------------------/#
 
 
@@ -187,32 +222,23 @@ def cdata_ang_resp(
     #\----------------------------------------------------------------------------/#
 
 
-    # gridding the data
+    # gridding the data (one linear interpolation for all channels)
     #/----------------------------------------------------------------------------\#
     ang_mu_all   = np.linspace(0.0, 1.0, 1001)
     Nmu_all      = ang_mu_all.size
+
+    data0 = np.concatenate((ang_resp0[si_tag], ang_resp0[in_tag], ang_resp_std0[si_tag], ang_resp_std0[in_tag]), axis=1)
+    f = interpolate.interp1d(ang_mu0, data0, axis=0, fill_value='extrapolate')
+    data_all = f(ang_mu_all)
+
     ang_resp_all = {
-            si_tag: np.zeros((Nmu_all, Nchan), dtype=np.float64),
-            in_tag: np.zeros((Nmu_all, Nchan), dtype=np.float64)
+            si_tag: data_all[:, :Nchan],
+            in_tag: data_all[:, Nchan:2*Nchan]
             }
     ang_resp_std_all = {
-            si_tag: np.zeros((Nmu_all, Nchan), dtype=np.float64),
-            in_tag: np.zeros((Nmu_all, Nchan), dtype=np.float64)
+            si_tag: data_all[:, 2*Nchan:3*Nchan],
+            in_tag: data_all[:, 3*Nchan:]
             }
-
-    for i in range(Nchan):
-
-        f = interpolate.interp1d(ang_mu0, ang_resp0[si_tag][:, i], fill_value='extrapolate')
-        ang_resp_all[si_tag][:, i] = f(ang_mu_all)
-
-        f = interpolate.interp1d(ang_mu0, ang_resp0[in_tag][:, i], fill_value='extrapolate')
-        ang_resp_all[in_tag][:, i] = f(ang_mu_all)
-
-        f = interpolate.interp1d(ang_mu0, ang_resp_std0[si_tag][:, i], fill_value='extrapolate')
-        ang_resp_std_all[si_tag][:, i] = f(ang_mu_all)
-
-        f = interpolate.interp1d(ang_mu0, ang_resp_std0[in_tag][:, i], fill_value='extrapolate')
-        ang_resp_std_all[in_tag][:, i] = f(ang_mu_all)
     #\----------------------------------------------------------------------------/#
 
 
@@ -232,15 +258,14 @@ def cdata_ang_resp(
     wvl          = wvl_data[indices_sort]
     ang_resp = ang_resp_data[:, indices_sort]
 
-    ang_resp_int = np.zeros(wvl.size, dtype=np.float64)
-    for i in range(wvl.size):
-        ang_resp_int[i] = np.trapz(ang_resp[:, i], x=ang_mu_all)
+    # np.trapz is renamed to np.trapezoid in newer numpy
+    trapezoid = getattr(np, 'trapezoid', None) or np.trapz
+    ang_resp_int = trapezoid(ang_resp, x=ang_mu_all, axis=0)
 
+    # polynomial fitting of all mu at once (one least squares solve with multiple right-hand sides)
     logic = (wvl>=400.0) & (wvl<=2000.0)
     order = 4
-    coef  = np.zeros((Nmu_all, order+1), dtype=np.float64)
-    for i in range(Nmu_all):
-        coef[i, :] = np.polyfit(wvl[logic], ang_resp[i, :][logic], order)
+    coef  = np.polyfit(wvl[logic], ang_resp[:, logic].T, order).T
     #\----------------------------------------------------------------------------/#
 
 
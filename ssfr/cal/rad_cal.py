@@ -1,8 +1,11 @@
 import os
 import sys
 import copy
+import fnmatch
 import datetime
 import warnings
+import concurrent.futures
+from collections import OrderedDict
 import h5py
 import numpy as np
 from scipy import interpolate
@@ -14,12 +17,149 @@ import ssfr
 
 
 __all__ = [
+        'get_rad_cal_spectra',
+        'prepare_rad_cal_spectra',
         'cal_rad_resp',
         'cdata_rad_resp',
+        'rad_resp_catalog',
         ]
 
 
 
+_rad_cal_spectra = OrderedDict()
+_rad_cal_spectra_size = 64
+
+def _rad_cal_spectra_key(fnames, which_ssfr, dark_extend, light_extend):
+
+    """
+    Key of the calibration session memo, files are identified by path, modification time and size
+    (same as ssfr.util.load_asset) so that a rewritten file is decoded again
+    """
+
+    fnames_key = []
+    for fname in fnames:
+        stat = os.stat(fname)
+        fnames_key.append((os.path.abspath(fname), stat.st_mtime_ns, stat.st_size))
+
+    return (tuple(fnames_key), which_ssfr, dark_extend, light_extend)
+
+def _rad_cal_spectra_put(key, data):
+
+    _rad_cal_spectra[key] = data
+    _rad_cal_spectra.move_to_end(key)
+    while len(_rad_cal_spectra) > _rad_cal_spectra_size:
+        _rad_cal_spectra.popitem(last=False)
+
+def get_rad_cal_spectra(
+        fnames,
+        which_ssfr='lasp|ssfr-a',
+        dark_extend=5,
+        light_extend=5,
+        ):
+
+    """
+    Decode and dark-correct one calibration session once, results are memoized per process (LRU,
+    last <_rad_cal_spectra_size> sessions) and reused for zenith/nadir and all integration times
+    (see prepare_rad_cal_spectra for parallel)
+
+    Input:
+        fnames: Python list of SSFR files of the calibration session
+        which_ssfr=: 'lasp|ssfr-a', 'lasp|ssfr-b' or 'nasa|ssfr-6'; default='lasp|ssfr-a'
+        dark_extend=, light_extend=: see ssfr.corr.dark_corr; default=5
+
+    Output:
+        Python dictionary that contains
+            dset_info: integration times of every data set (see read_ssfr)
+            spectra  : Python dictionary {(ispec, int_time): (mean, standard deviation)} of dark
+                       corrected counts (shutter open), ispec is index of spectrometer (0-3), data
+                       sets that cannot be dark corrected are left out (with warning)
+    """
+
+    which_ssfr = which_ssfr.lower()
+    key = _rad_cal_spectra_key(fnames, which_ssfr, dark_extend, light_extend)
+    if key in _rad_cal_spectra.keys():
+        _rad_cal_spectra.move_to_end(key)
+        return _rad_cal_spectra[key]
+
+    which_lab = which_ssfr.split('|')[0]
+    if which_lab == 'nasa':
+        import ssfr.nasa_ssfr as ssfr_toolbox
+    elif which_lab == 'lasp':
+        import ssfr.lasp_ssfr as ssfr_toolbox
+    else:
+        msg = '\nError [get_rad_cal_spectra]: <which_ssfr=> does not support <\'%s\'> (only supports <\'nasa|ssfr-6\'> or <\'lasp|ssfr-a\'> or <\'lasp|ssfr-b\'>).' % which_ssfr
+        raise ValueError(msg)
+
+    ssfr0 = ssfr_toolbox.read_ssfr(fnames, process=False, verbose=False)
+    ssfr0.dset_check()
+
+    cycle = ssfr0.get_shutter_cycle()
+
+    spectra = {}
+    for ispec in range(ssfr0.Nspec):
+        for int_time0 in np.unique(cycle.int_time_set[:, ispec]):
+            try:
+                group = cycle.get_group(ispec=ispec, int_time0=int_time0, dark_extend=dark_extend, light_extend=light_extend)
+                shutter, counts = ssfr.corr.dark_corr(ssfr0.data_raw['tmhr'], ssfr0.data_raw['shutter'], ssfr0.data_raw['count_raw'][:, :, ispec], mode='interp', dark_extend=dark_extend, light_extend=light_extend, index=group['index'], cycle=group)
+                counts = counts[group['index'], :]
+                logic  = (shutter==0)
+                spectra[(ispec, float(int_time0))] = (np.nanmean(counts[logic, :], axis=0), np.nanstd(counts[logic, :], axis=0))
+            except (OSError, ValueError, IndexError) as error:
+                msg = '\nWarning [get_rad_cal_spectra]: cannot process %s=%dms (%s).' % (ssfr0.spec_info[ispec], int_time0, error)
+                warnings.warn(msg)
+
+    data = {
+            'dset_info': ssfr0.dset_info,
+            'spectra': spectra,
+            }
+
+    _rad_cal_spectra_put(key, data)
+
+    return data
+
+
+def prepare_rad_cal_spectra(
+        fnames_list,
+        which_ssfr='lasp|ssfr-a',
+        dark_extend=5,
+        light_extend=5,
+        workers=None,
+        ):
+
+    """
+    Run get_rad_cal_spectra for independent calibration sessions in a process pool, so that later
+    calls (e.g., cal_rad_resp through cdata_rad_resp) are served from memory
+
+    Input:
+        fnames_list: Python list of sessions (each is a Python list of SSFR files)
+        workers=: number of processes; default=None (number of CPUs)
+    """
+
+    which_ssfr = which_ssfr.lower()
+
+    fnames_new = []
+    keys_new   = []
+    for fnames in fnames_list:
+        key = _rad_cal_spectra_key(fnames, which_ssfr, dark_extend, light_extend)
+        if (key not in _rad_cal_spectra.keys()) and (key not in keys_new):
+            fnames_new.append(fnames)
+            keys_new.append(key)
+
+    if len(fnames_new) == 0:
+        return
+
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(get_rad_cal_spectra, fnames, which_ssfr=which_ssfr, dark_extend=dark_extend, light_extend=light_extend) for fnames in fnames_new]
+
+        for fnames, key, future in zip(fnames_new, keys_new, futures):
+            try:
+                _rad_cal_spectra_put(key, future.result())
+            except (OSError, ValueError, IndexError) as error:
+                msg = '\nWarning [prepare_rad_cal_spectra]: cannot process <%s> (%s).' % (', '.join(fnames), error)
+                warnings.warn(msg)
+
+
+
 def cal_rad_resp(
         fnames,
         resp=None,
@@ -30,6 +170,7 @@ def cal_rad_resp(
         int_time={'si':80.0, 'in':250.0},
         dark_extend=5,
         light_extend=5,
+        use_slit=False,
         verbose=True,
         ):
 
@@ -128,7 +269,7 @@ def cal_rad_resp(
             msg = '\nMessage [cal_rad_resp]: using calibrated lamp <%s> with lamp file at \n  <%s>...' % (which_lamp, fname_lamp)
             print(msg)
 
-        data      = np.loadtxt(fname_lamp)
+        data      = ssfr.util.load_asset(fname_lamp)
         data_wvl  = data[:, 0]
         if which_lamp == 'f-506c':
             data_flux = data[:, 1]*0.01      # W m^-2 nm^-1
@@ -145,19 +286,15 @@ def cal_rad_resp(
         #╰──────────────────────────────────────────────────────────────╯#
 
 
-        # use SSFR slit functions to get flux from lamp file
-        # the other option is to interpolate the lamp file at SSFR wavelength, which is commented out
+        # use SSFR slit functions to get flux from lamp file (use_slit=True)
+        # the other option is to interpolate the lamp file at SSFR wavelength
         #╭──────────────────────────────────────────────────────────────╮#
-        # lamp_nist_si = np.zeros_like(wvl_si)
-        # for i in range(lamp_nist_si.size):
-        #     lamp_nist_si[i] = ssfr.util.cal_weighted_flux(wvl_si[i], data_wvl, data_flux, slit_func_file='%s/slit/vis_0.1nm_s.dat' % ssfr.common.fdir_data)
-
-        # lamp_nist_in = np.zeros_like(wvl_in)
-        # for i in range(lamp_nist_in.size):
-        #     lamp_nist_in[i] = ssfr.util.cal_weighted_flux(wvl_in[i], data_wvl, data_flux, slit_func_file='%s/slit/nir_0.1nm_s.dat' % ssfr.common.fdir_data)
-
-        lamp_nist_si = np.interp(wvl_si, data_wvl, data_flux)
-        lamp_nist_in = np.interp(wvl_in, data_wvl, data_flux)
+        if use_slit:
+            lamp_nist_si = ssfr.util.cal_slit_flux(wvl_si, data_wvl, data_flux, slit_func_file='%s/slit/vis_0.1nm_s.dat' % ssfr.common.fdir_data)
+            lamp_nist_in = ssfr.util.cal_slit_flux(wvl_in, data_wvl, data_flux, slit_func_file='%s/slit/nir_0.1nm_s.dat' % ssfr.common.fdir_data)
+        else:
+            lamp_nist_si = np.interp(wvl_si, data_wvl, data_flux)
+            lamp_nist_in = np.interp(wvl_in, data_wvl, data_flux)
         #╰──────────────────────────────────────────────────────────────╯#
 
         resp = {
@@ -167,58 +304,34 @@ def cal_rad_resp(
     #╰────────────────────────────────────────────────────────────────────────────╯#
 
 
-    # read raw data
+    # read raw data (decoded and dark corrected once per calibration session, see get_rad_cal_spectra)
     #╭────────────────────────────────────────────────────────────────────────────╮#
     try:
-        ssfr0 = ssfr_toolbox.read_ssfr(fnames, dark_extend=dark_extend, light_extend=light_extend, verbose=False)
+        spectra_all = get_rad_cal_spectra(fnames, which_ssfr=which_ssfr, dark_extend=dark_extend, light_extend=light_extend)['spectra']
 
         # integration time fallback
         # in case the data does not contain measurement with given integration time
         #╭──────────────────────────────────────────────────────────────╮#
-        int_time_si_diff = np.zeros(ssfr0.Ndset, dtype=np.float64)
-        int_time_in_diff = np.zeros(ssfr0.Ndset, dtype=np.float64)
-        for idset, dset_tag in enumerate(ssfr0.dset_info.keys()):
-            int_time_si_diff[idset] = (ssfr0.dset_info[dset_tag][si_tag]-int_time[si_tag])
-            int_time_in_diff[idset] = (ssfr0.dset_info[dset_tag][in_tag]-int_time[in_tag])
-
-        idset_si = np.argmin(np.abs(int_time_si_diff))
-        idset_in = np.argmin(np.abs(int_time_in_diff))
-
         int_time_new = copy.deepcopy(int_time)
-        if int_time_si_diff[idset_si] != 0.0:
-            int_time_si_new = int_time_si_diff[idset_si]+int_time[si_tag]
-            msg = '\nWarning [cal_rad_resp]: Cannot find given integration time for <%s=%dms>, fallback to <%s=%dms>' % (si_tag, int_time[si_tag], si_tag, int_time_si_new)
-            warnings.warn(msg)
-            int_time_new[si_tag] = int_time_si_new
-
-        if int_time_in_diff[idset_in] != 0.0:
-            int_time_in_new = int_time_in_diff[idset_in]+int_time[in_tag]
-            msg = '\nWarning [cal_rad_resp]: Cannot find given integration time for <%s=%dms>, fallback to <%s=%dms>' % (in_tag, int_time[in_tag], in_tag, int_time_in_new)
-            warnings.warn(msg)
-            int_time_new[in_tag] = int_time_in_new
+        for spec_tag, index_spec in [(si_tag, index_si), (in_tag, index_in)]:
+            int_time_all  = np.array([key[1] for key in spectra_all.keys() if key[0]==index_spec])
+            if int_time_all.size == 0:
+                msg = '\nError [cal_rad_resp]: no dark corrected data for <%s>.' % spec_tag
+                raise OSError(msg)
+            int_time_diff = int_time_all - int_time[spec_tag]
+            i = np.argmin(np.abs(int_time_diff))
+            if int_time_diff[i] != 0.0:
+                msg = '\nWarning [cal_rad_resp]: Cannot find given integration time for <%s=%dms>, fallback to <%s=%dms>' % (spec_tag, int_time[spec_tag], spec_tag, int_time_all[i])
+                warnings.warn(msg)
+                int_time_new[spec_tag] = int_time_all[i]
         #╰──────────────────────────────────────────────────────────────╯#
 
-        logic_si = (np.abs(ssfr0.data_raw['int_time'][:, index_si]-int_time_new[si_tag])<0.00001)
-        logic_in = (np.abs(ssfr0.data_raw['int_time'][:, index_in]-int_time_new[in_tag])<0.00001)
-
-        shutter, counts = ssfr.corr.dark_corr(ssfr0.data_raw['tmhr'][logic_si], ssfr0.data_raw['shutter'][logic_si], ssfr0.data_raw['count_raw'][logic_si, :, index_si], mode='interp', dark_extend=dark_extend, light_extend=light_extend)
-        logic  = (shutter==0)
-        logic_nan = (np.sum(np.isnan(counts), axis=-1)) > 0
-        print(logic_nan.sum())
-        spectra_si     = np.nanmean(counts[logic, :], axis=0)
-        spectra_si_std = np.nanstd(counts[logic, :], axis=0)
-        msg = '\nMessage [cal_rad_resp]: '
-        print(msg)
-
-        shutter, counts = ssfr.corr.dark_corr(ssfr0.data_raw['tmhr'][logic_in], ssfr0.data_raw['shutter'][logic_in], ssfr0.data_raw['count_raw'][logic_in, :, index_in], mode='interp', dark_extend=dark_extend, light_extend=light_extend)
-        logic  = (shutter==0)
-        spectra_in     = np.nanmean(counts[logic, :], axis=0)
-        spectra_in_std = np.nanstd(counts[logic, :], axis=0)
+        spectra_si, spectra_si_std = [spectra0.copy() for spectra0 in spectra_all[(index_si, float(int_time_new[si_tag]))]]
+        spectra_in, spectra_in_std = [spectra0.copy() for spectra0 in spectra_all[(index_in, float(int_time_new[in_tag]))]]
 
-    except Exception as error:
+    except (OSError, ValueError, IndexError) as error:
 
-        print(error)
-        msg = '\nWarning [rad_cal_resp]: cannot process the data, set parameters to <None>.'
+        msg = '\nWarning [cal_rad_resp]: cannot process the data, set parameters to <None> (%s).' % error
         warnings.warn(msg)
         spectra_si     = None
         spectra_si_std = None
@@ -282,6 +395,7 @@ def cdata_rad_resp(
         wvl_joint=950.0,
         wvl_range=[350.0, 2200.0],
         int_time={'si':80.0, 'in':250.0},
+        use_slit=False,
         verbose=True,
         ):
 
@@ -341,6 +455,7 @@ def cdata_rad_resp(
                 spec_reverse=spec_reverse,
                 which_lamp=which_lamp,
                 int_time=int_time,
+                use_slit=use_slit,
                 verbose=verbose,
                 )
     else:
@@ -428,6 +543,153 @@ def cdata_rad_resp(
 
 
 
+class rad_resp_catalog:
+
+    """
+    Catalog of radiometric response files (output of cdata_rad_resp), e.g.,
+        2024-03-29_lamp-1324|2024-03-29_lamp-150c_after-pri|2024-05-27_lamp-150c_pituffik|2024-06-05_processed-for-arcsix|rad-resp|lasp|ssfr-a|zen|si-080|in-250.h5
+
+    Files are indexed once by instrument, light collector and Si/InGaAs integration times, and
+    sorted by the date of the secondary calibration (third date of the calibration chain) for
+    nearest-date lookup (binary search), loaded responses are kept in a bounded LRU cache.
+
+    Input:
+        fdir: directory of the radiometric response files (searched recursively)
+        pattern=: filename pattern to select files; default='*rad-resp|*.h5'
+        cache_size=: number of loaded responses kept in cache; default=16
+
+    Usage:
+        cat0 = rad_resp_catalog(fdir, pattern='*lamp-1324|*lamp-150c*|*pituffik*')
+        fname, data = cat0.get_resp('lasp|ssfr-a', 'zen', [80, 250], date)
+    """
+
+    def __init__(
+            self,
+            fdir,
+            pattern='*rad-resp|*.h5',
+            cache_size=16,
+            ):
+
+        self.fdir       = fdir
+        self.pattern    = pattern
+        self.cache_size = cache_size
+        self.cache      = OrderedDict()
+
+        self.entries = []
+        for fname in ssfr.util.get_all_files(fdir, pattern=pattern):
+            entry = self.parse_filename(fname)
+            if entry is not None:
+                self.entries.append(entry)
+
+        # group by (which_ssfr, which_lc, int_time) and sort by date, files with the same date
+        # are resolved to the latest modified one
+        #/----------------------------------------------------------------------------\#
+        self.index = {}
+        for entry in sorted(self.entries, key=lambda x: (x['jday'], x['mtime'])):
+            key = (entry['which_ssfr'], entry['which_lc'], entry['int_time'])
+            if key not in self.index.keys():
+                self.index[key] = {'jday': [], 'fname': []}
+            index0 = self.index[key]
+            if (len(index0['jday']) > 0) and (index0['jday'][-1] == entry['jday']):
+                index0['fname'][-1] = entry['fname']
+            else:
+                index0['jday'].append(entry['jday'])
+                index0['fname'].append(entry['fname'])
+
+        for key in self.index.keys():
+            self.index[key]['jday'] = np.array(self.index[key]['jday'])
+        #\----------------------------------------------------------------------------/#
+
+    def parse_filename(self, fname):
+
+        words = os.path.basename(fname).replace('.h5', '').split('|')
+        if 'rad-resp' not in words:
+            return None
+
+        i = words.index('rad-resp')
+        try:
+            chain = []
+            for word in words[:i]:
+                date0_s, tag0 = (word.split('_', 1) + [''])[:2]
+                chain.append((datetime.datetime.strptime(date0_s, '%Y-%m-%d'), tag0))
+
+            which_ssfr = '|'.join(words[i+1:i+3])
+            which_lc   = words[i+3]
+            int_time   = (int(words[i+4].replace('si-', '')), int(words[i+5].replace('in-', '')))
+        except (ValueError, IndexError):
+            msg = '\nWarning [rad_resp_catalog]: cannot parse <%s>, skipped.' % os.path.basename(fname)
+            warnings.warn(msg)
+            return None
+
+        if len(chain) == 0:
+            return None
+
+        date = chain[min(2, len(chain)-1)][0]
+
+        entry = {
+                'fname': fname,
+                'mtime': os.path.getmtime(fname),
+                'which_ssfr': which_ssfr,
+                'which_lc': which_lc,
+                'int_time': int_time,
+                'chain': chain,
+                'date': date,
+                'jday': ssfr.util.dtime_to_jday(date),
+                'lamp': chain[min(2, len(chain)-1)][1],
+                }
+
+        return entry
+
+    def select(self, which_ssfr, which_lc, int_time, date):
+
+        """
+        Return the response file nearest to <date> (datetime.datetime) for <which_ssfr> (e.g., 'lasp|ssfr-a'),
+        <which_lc> ('zen' or 'nad') and <int_time> ([Si, InGaAs] in ms)
+        """
+
+        key = (which_ssfr.lower(), which_lc.lower(), (int(int_time[0]), int(int_time[1])))
+        if key not in self.index.keys():
+            msg = '\nError [rad_resp_catalog]: cannot find radiometric response for <%s|%s|si-%3.3d|in-%3.3d> under <%s>.' % (key[0], key[1], key[2][0], key[2][1], self.fdir)
+            raise OSError(msg)
+
+        jday = self.index[key]['jday']
+        jday0 = ssfr.util.dtime_to_jday(date)
+
+        # nearest date, earlier one is used when equally distant
+        i = np.searchsorted(jday, jday0)
+        if (i == jday.size) or ((i > 0) and ((jday0-jday[i-1]) <= (jday[i]-jday0))):
+            i -= 1
+
+        return self.index[key]['fname'][i]
+
+    def load(self, fname):
+
+        if fname in self.cache.keys():
+            self.cache.move_to_end(fname)
+            return self.cache[fname]
+
+        data = ssfr.util.load_h5(fname)
+        for vname in data.keys():
+            data[vname].flags.writeable = False
+
+        self.cache[fname] = data
+        while len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+
+        return data
+
+    def get_resp(self, which_ssfr, which_lc, int_time, date):
+
+        """
+        Return (file name, data) of the radiometric response nearest to <date> (see select)
+        """
+
+        fname = self.select(which_ssfr, which_lc, int_time, date)
+
+        return fname, self.load(fname)
+
+
+
 if __name__ == '__main__':
 
     pass
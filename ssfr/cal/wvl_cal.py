@@ -5,6 +5,7 @@ import datetime
 import numpy as np
 
 import ssfr.common
+import ssfr.util
 
 __all__ = [
         'get_wvl_coef',
@@ -42,10 +43,7 @@ lamps = {
         }
 
 
-def get_wvl_coef(
-        which_spec,
-        fname='%s/wvl/wvl_coef.dat' % ssfr.common.fdir_data
-        ):
+def read_wvl_coef(fname):
 
     with open(fname, 'r') as f:
         lines = f.readlines()
@@ -60,7 +58,18 @@ def get_wvl_coef(
             if vname not in coefs.keys():
                 coefs[vname] = coef
 
-    return coefs[which_spec]
+    return coefs
+
+
+def get_wvl_coef(
+        which_spec,
+        fname='%s/wvl/wvl_coef.dat' % ssfr.common.fdir_data
+        ):
+
+    # parsed once per process (see ssfr.util.load_asset)
+    coefs = ssfr.util.load_asset(fname, reader=read_wvl_coef)
+
+    return coefs[which_spec].copy()
 
 
 def cal_wvl(coef, Nchan=256):
@@ -1,9 +1,13 @@
 import os
 
-__all__ = ['fdir_data']
+__all__ = ['fdir_data', 'fdir_cache']
 
 fdir_data = os.path.join(os.path.abspath(os.path.dirname(__file__)), 'data')
 
+# directory for binary (.npz) copies of the parsed data files (see ssfr.util.load_asset),
+# keyed by checksum of the source file; None to disable
+fdir_cache = None
+
 karg = {
         'verbose': True,
         }
@@ -30,3 +34,123 @@ serial_number = {
         'nasa|ssfr-6|nad|si': '045924',
         'nasa|ssfr-6|nad|in': '044829',
         }
+
+# binary record layouts of the raw data files (little endian, no padding), each layout
+# is compiled into a numpy structured dtype by ssfr.util.get_rec_dtype, fields are
+# defined as (name, type) or (name, type, shape) where type is either a numpy type
+# string or the name of another layout (nested record)
+#   headLen: number of bytes of the file header
+#   dataLen: number of bytes of each data record (used for checking)
+#/----------------------------------------------------------------------------\#
+rec_layout = {
+
+        # LASP SSFR (.SKS), struct format '<d9ld9ll11dl2Bl257hl2Bl257hl2Bl257hlBBl257h'
+        #   spectrometers are stored in the order of 'zen_si, nad_si, zen_in, nad_in',
+        #   first count is the spectrometer order
+        #   header is only valid when the first byte is 144 (see ssfr.lasp_ssfr.read_ssfr_head)
+        'lasp|ssfr|time': {
+            'fields': [
+                ('frac_second', '<f8'),
+                ('second'     , '<i4'),
+                ('minute'     , '<i4'),
+                ('hour'       , '<i4'),
+                ('day'        , '<i4'),
+                ('month'      , '<i4'),
+                ('year'       , '<i4'),
+                ('dow'        , '<i4'),
+                ('doy'        , '<i4'),
+                ('dst'        , '<i4'),
+                ],
+            },
+        'lasp|ssfr|spec': {
+            'fields': [
+                ('int_time', '<i4'),
+                ('shutter' , 'u1'),
+                ('eos'     , 'u1'),
+                ('null'    , '<i4'),
+                ('count'   , '<i2', (257,)),
+                ],
+            },
+        'lasp|ssfr': {
+            'headLen': 148,
+            'dataLen': 2276,
+            'fields': [
+                ('time_arinc', 'lasp|ssfr|time'),
+                ('time_crio' , 'lasp|ssfr|time'),
+                ('null'      , '<i4'),
+                ('temp'      , '<f8', (11,)),
+                ('spec'      , 'lasp|ssfr|spec', (4,)),
+                ],
+            },
+
+        # NASA Ames SSFR (.OSA2), struct format '<2l12B6l8L1024h'
+        'nasa|ssfr': {
+            'headLen': 0,
+            'dataLen': 2124,
+            'fields': [
+                ('btime'    , '<i4', (2,)),      # seconds since 1970-01-01
+                ('bcdtimstp', 'u1' , (12,)),
+                ('int_time' , '<i4', (4,)),      # integration time [ms]
+                ('accum'    , '<i4'),
+                ('shsw'     , '<i4'),            # shutter status (1:closed, 0:open)
+                ('temp'     , '<u4', (8,)),      # zsit, nsit, zirt, nirt, zirx, nirx, xt, it
+                ('count'    , '<i2', (4, 256)),  # zspecsi, zspecir, nspecsi, nspecir
+                ],
+            },
+
+        # LASP ALP (.plt3), struct format '<31d'
+        'lasp|alp': {
+            'headLen': 0,
+            'dataLen': 248,
+            'fields': [(vname, '<f8') for vname in [
+                'Computer_Hour', 'Computer_Minute', 'Computer_Second',
+                'GPS_Time', 'GPS_Week',
+                'Velocity_North', 'Velocity_East', 'Velocity_Up',
+                'Span_CPT_Pitch', 'Span_CPT_Roll',
+                'Latitude', 'Longitude', 'Height',
+                'Span_CPT_Status',
+                'Motor_Pitch', 'Motor_Roll',
+                'Inclinometer_Temperature', 'Motor_Roll_Temperature', 'Motor_Pitch_Temperature', 'Stage_Temperature',
+                'Relative_Humidity', 'Chassis_Temperature', 'System_Voltage',
+                'ARINC_Roll', 'ARINC_Pitch',
+                'Inclinometer_Roll_Voltage', 'Inclinometer_Pitch_Voltage',
+                'Inclinometer_Roll', 'Inclinometer_Pitch',
+                'Reference_Roll', 'Reference_Pitch',
+                ]],
+            },
+
+        # LASP CG4 (.CG4), struct format '<2l1l1B3B1l1h1B1B1l1l1l1l1l1B3B1l1h1B1B1l1l1l1l1l'
+        #   channel 1 is zenith and channel 2 is nadir
+        'lasp|cg4': {
+            'headLen': 0,
+            'dataLen': 76,
+            'fields': [
+                ('time1'       , '<i4', (2,)),   # seconds since 1970-01-01
+                ('cnt'         , '<i4'),
+                ('status1'     , 'u1'),
+                ('pad1'        , 'u1' , (3,)),
+                ('serial1'     , '<i4'),
+                ('sys_serial1' , '<i2'),
+                ('version1'    , 'u1'),
+                ('gain1'       , 'u1'),
+                ('voltage1'    , '<i4'),
+                ('temperature1', '<i4'),
+                ('reartemp1'   , '<i4'),
+                ('systemp1'    , '<i4'),
+                ('caltemp1'    , '<i4'),
+                ('status2'     , 'u1'),
+                ('pad2'        , 'u1' , (3,)),
+                ('serial2'     , '<i4'),
+                ('sys_serial2' , '<i2'),
+                ('version2'    , 'u1'),
+                ('gain2'       , 'u1'),
+                ('voltage2'    , '<i4'),
+                ('temperature2', '<i4'),
+                ('reartemp2'   , '<i4'),
+                ('systemp2'    , '<i4'),
+                ('caltemp2'    , '<i4'),
+                ],
+            },
+
+        }
+#\----------------------------------------------------------------------------/#
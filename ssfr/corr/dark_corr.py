@@ -1,10 +1,508 @@
 import sys
 import warnings
 import numpy as np
-from scipy import stats
+from scipy import stats, interpolate
 
 
-__all__ = ['dark_corr']
+__all__ = ['trim_dark_cycle', 'get_dark_cycle', 'shutter_cycle', 'get_dark_summary', 'combine_dark_summary', 'cal_dark_offset', 'fit_dark_temp', 'cal_dark_temp', 'fit_dark_spline', 'dark_corr', 'dark_corr_stream']
+
+
+
+def trim_dark_cycle(
+        index_s,
+        index_e,
+        status,
+        Nx,
+        dark_extend=1,
+        light_extend=1,
+        light_threshold=10,
+        dark_threshold=5,
+        shutter_mode={'open':0, 'close':1},
+        ):
+
+    """
+    Trim light/dark cycles (consecutive samples with the same shutter status) and remove the cycles that are too short
+
+    Input:
+        index_s/index_e: numpy array, starting (inclusive) and ending (exclusive) indices of the cycles
+        status: numpy array, shutter status of the cycles
+        Nx: integer, total number of samples
+
+    Output:
+        Python dictionary that contains
+            range: numpy array (Ncycle, 2), starting (inclusive) and ending (exclusive) indices of the trimmed cycles
+              tag: numpy array (Ncycle,), shutter_mode['open'] or shutter_mode['close'] of the cycles
+    """
+
+    logic_open  = (status==shutter_mode['open'])
+    logic_close = (status==shutter_mode['close'])
+
+    extend    = np.where(logic_open, light_extend, dark_extend)
+    threshold = np.where(logic_open, light_threshold, dark_threshold)
+
+    index_l = np.maximum(0, index_s+extend)
+    index_r = np.minimum(index_e-extend, Nx)
+
+    logic = (logic_open|logic_close) & ((index_r-index_l)>threshold)
+
+    cycle = {
+            'range': np.vstack((index_l[logic], index_r[logic])).T.astype(np.int64),
+              'tag': status[logic],
+            }
+
+    return cycle
+
+
+
+def get_dark_cycle(
+        shutter,
+        dark_extend=1,
+        light_extend=1,
+        light_threshold=10,
+        dark_threshold=5,
+        shutter_mode={'open':0, 'close':1},
+        ):
+
+    """
+    Segment shutter time series into light/dark cycles (run-length encoding)
+
+    Input:
+        shutter: numpy array, shutter status
+        dark_extend=/light_extend=: integer, number of samples trimmed at both sides of dark/light cycles
+        dark_threshold=/light_threshold=: integer, minimum number of samples (after trimming) to keep a dark/light cycle
+
+    Output:
+        Python dictionary that contains
+            range: numpy array (Ncycle, 2), starting (inclusive) and ending (exclusive) indices of the trimmed cycles
+              tag: numpy array (Ncycle,), shutter_mode['open'] or shutter_mode['close'] of the cycles
+    """
+
+    Nx = shutter.size
+
+    index_s = np.append(0, np.where(shutter[1:]!=shutter[:-1])[0]+1)
+    index_e = np.append(index_s[1:], Nx)
+    status  = shutter[index_s]
+
+    cycle = trim_dark_cycle(index_s, index_e, status, Nx, dark_extend=dark_extend, light_extend=light_extend, light_threshold=light_threshold, dark_threshold=dark_threshold, shutter_mode=shutter_mode)
+
+    return cycle
+
+
+
+class shutter_cycle:
+
+    """
+    Run-length encoded index of shutter light/dark cycles, a new run starts whenever the shutter status
+    or the integration time of any spectrometer changes (built once, e.g., cached by read_ssfr)
+
+    Input:
+        shutter: numpy array (N,), shutter status
+        int_time=: numpy array (N, Nspec), integration times; default=None
+        dark_extend=/light_extend=: integer, number of samples trimmed at both sides of dark/light cycles
+        dark_threshold=/light_threshold=: integer, minimum number of samples (after trimming) to keep a dark/light cycle
+
+    Output:
+        shutter_cycle object that contains
+            .Nx          : total number of samples
+            .Nrun        : number of runs
+            .start       : (Nrun,) starting (inclusive) index of runs
+            .end         : (Nrun,) ending (exclusive) index of runs
+            .state       : (Nrun,) shutter status of runs
+            .iset        : (Nrun,) index of integration time set (of .int_time_set) of runs
+            .int_time_set: (Nset, Nspec) unique integration time sets (same order as np.unique(int_time, axis=0))
+            .trim_start  : (Nrun,) starting index of runs after trimming
+            .trim_end    : (Nrun,) ending index of runs after trimming
+            .valid       : (Nrun,) whether the (trimmed) run is long enough to be used as light/dark cycle
+    """
+
+    ID = 'Shutter Cycle Index'
+
+    def __init__(
+            self,
+            shutter,
+            int_time=None,
+            dark_extend=1,
+            light_extend=1,
+            light_threshold=10,
+            dark_threshold=5,
+            shutter_mode={'open':0, 'close':1},
+            ):
+
+        self.Nx = shutter.size
+        self.dark_extend     = dark_extend
+        self.light_extend    = light_extend
+        self.light_threshold = light_threshold
+        self.dark_threshold  = dark_threshold
+        self.shutter_mode    = shutter_mode
+
+        if int_time is None:
+            int_time = np.zeros((self.Nx, 1), dtype=np.float64)
+        elif int_time.ndim == 1:
+            int_time = int_time[:, np.newaxis]
+
+        # run-length encoding
+        #/----------------------------------------------------------------------------\#
+        logic_break = (shutter[1:]!=shutter[:-1]) | np.any(int_time[1:, :]!=int_time[:-1, :], axis=-1)
+
+        self.start = np.append(0, np.where(logic_break)[0]+1).astype(np.int64)
+        self.end   = np.append(self.start[1:], self.Nx).astype(np.int64)
+        self.state = shutter[self.start]
+        self.Nrun  = self.start.size
+
+        self.int_time_set, self.iset = np.unique(int_time[self.start, :], axis=0, return_inverse=True)
+        self.iset = self.iset.ravel()
+        #\----------------------------------------------------------------------------/#
+
+        # trimmed runs
+        #/----------------------------------------------------------------------------\#
+        logic_open = (self.state==shutter_mode['open'])
+        extend     = np.where(logic_open, light_extend, dark_extend)
+        threshold  = np.where(logic_open, light_threshold, dark_threshold)
+
+        self.trim_start = np.maximum(0, self.start+extend)
+        self.trim_end   = np.minimum(self.end-extend, self.Nx)
+        self.valid = ((self.state==shutter_mode['open'])|(self.state==shutter_mode['close'])) & ((self.trim_end-self.trim_start)>threshold)
+        #\----------------------------------------------------------------------------/#
+
+    def get_slice(self, irun, trim=False):
+
+        """
+        Slice of the samples of the <irun>-th run
+        """
+
+        if trim:
+            return slice(self.trim_start[irun], self.trim_end[irun])
+        else:
+            return slice(self.start[irun], self.end[irun])
+
+    def get_index(self, logic_run=None):
+
+        """
+        Indices of the samples of the selected runs (all runs if <logic_run> is None)
+        """
+
+        if logic_run is None:
+            return np.arange(self.Nx)
+
+        Ns = (self.end-self.start)[logic_run]
+        Ns_cum = np.append(0, np.cumsum(Ns)[:-1])
+        index = np.repeat(self.start[logic_run]-Ns_cum, Ns) + np.arange(Ns.sum())
+
+        return index
+
+    def get_dset_num(self):
+
+        """
+        Index of integration time set for every sample (same as read_ssfr.data_raw['dset_num'])
+        """
+
+        return np.repeat(self.iset, self.end-self.start).astype(np.int32)
+
+    def get_group(
+            self,
+            ispec=None,
+            int_time0=None,
+            tolerance=0.00001,
+            dark_extend=None,
+            light_extend=None,
+            ):
+
+        """
+        Samples of one spectrometer at one integration time, e.g., for ssfr.corr.dark_corr(..., index=, cycle=)
+
+        Input:
+            ispec=/int_time0=: spectrometer index and integration time, default=None (all samples)
+            dark_extend=/light_extend=: default=None (use the settings of the object)
+
+        Output:
+            Python dictionary that contains
+                index: numpy array, indices of the samples
+                Ndark: integer, number of (untrimmed) dark samples
+                range: numpy array (Ncycle, 2), trimmed light/dark cycles (w.r.t. <index>), same as get_dark_cycle(shutter[index])
+                  tag: numpy array (Ncycle,), shutter status of the cycles
+        """
+
+        if dark_extend is None:
+            dark_extend = self.dark_extend
+        if light_extend is None:
+            light_extend = self.light_extend
+
+        if ispec is None:
+            logic_run = np.ones(self.Nrun, dtype=np.bool_)
+        else:
+            logic_set = (np.abs(self.int_time_set[:, ispec]-int_time0)<=tolerance)
+            logic_run = logic_set[self.iset]
+
+        # runs of the selected samples, merge neighbouring runs with the same shutter status
+        #/----------------------------------------------------------------------------\#
+        Ns = (self.end-self.start)[logic_run]
+        state = self.state[logic_run]
+        Nx = Ns.sum()
+
+        index_s0 = np.append(0, np.cumsum(Ns)[:-1])
+        logic_new = np.append(True, state[1:]!=state[:-1])
+
+        index_s = index_s0[logic_new]
+        index_e = np.append(index_s[1:], Nx).astype(np.int64)
+        status  = state[logic_new]
+        #\----------------------------------------------------------------------------/#
+
+        group = trim_dark_cycle(index_s, index_e, status, Nx, dark_extend=dark_extend, light_extend=light_extend, light_threshold=self.light_threshold, dark_threshold=self.dark_threshold, shutter_mode=self.shutter_mode)
+        group['index'] = np.repeat(self.start[logic_run]-index_s0, Ns) + np.arange(Nx)
+        group['Ndark'] = Ns[state==self.shutter_mode['close']].sum()
+
+        return group
+
+
+
+def fit_dark_temp(
+        x,
+        y,
+        deg=5,
+        ):
+
+    """
+    Polynomial fit of darks against temperature for all channels with one shared Vandermonde
+    least-squares solve (same as calling np.polyfit(x, y[:, iChan], deg) for every channel)
+
+    Input:
+        x: numpy array (N,), temperature
+        y: numpy array (N,) or (N, Ny), dark counts
+        deg=: integer, degree of polynomial; default=5
+
+    Output:
+        coef: numpy array (deg+1,) or (deg+1, Ny), polynomial coefficients (highest degree first)
+    """
+
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+
+    lhs = np.vander(x, deg+1)
+    scale = np.sqrt((lhs*lhs).sum(axis=0))
+    rcond = x.size*np.finfo(x.dtype).eps
+
+    coef, residual, rank, s = np.linalg.lstsq(lhs/scale, y, rcond=rcond)
+    coef = (coef.T/scale).T
+
+    if rank != (deg+1):
+        msg = '\nWarning [fit_dark_temp]: Polyfit may be poorly conditioned.'
+        warnings.warn(msg)
+
+    return coef
+
+
+
+def cal_dark_temp(
+        x,
+        coef,
+        ):
+
+    """
+    Evaluate temperature dependent darks (from fit_dark_temp) for all channels
+
+    Output:
+        dark: numpy array (N,) or (N, Ny)
+    """
+
+    return np.vander(np.asarray(x, dtype=np.float64), coef.shape[0]) @ coef
+
+
+
+def get_dark_summary(
+        x0,
+        data0,
+        cycle,
+        index=None,
+        shutter_mode={'open':0, 'close':1},
+        ):
+
+    """
+    Compact summary (centered moments) of every dark cycle, dark offsets of light samples can be
+    rebuilt from the summary without raw counts (see cal_dark_offset)
+
+    Input:
+        x0: numpy array (N,), e.g., time
+        data0: numpy array (N,) or (N, Ny), e.g., counts
+        cycle: Python dictionary, light/dark cycles of <shutter0[index]> from get_dark_cycle
+        index=: numpy array of indices, samples (w.r.t. <cycle>) of <x0> and <data0>; default=None (all samples)
+
+    Output:
+        Python dictionary that contains (Nd: number of dark cycles)
+            range : (Nd, 2) starting and ending indices of dark cycles w.r.t. <cycle>
+            n     : (Nd,) number of samples
+            x_s   : (Nd,) x of the first sample
+            x_e   : (Nd,) x of the last sample
+            x_mean: (Nd,) mean of x
+            sxx   : (Nd,) sum((x-x_mean)**2)
+            y_mean: (Nd, Ny) mean of data
+            sxy   : (Nd, Ny) sum((x-x_mean)*(y-y_mean))
+            syy   : (Nd, Ny) sum((y-y_mean)**2)
+    """
+
+    if index is None:
+        index = np.arange(x0.size)
+
+    data_shape = (-1,) + (1,)*(data0.ndim-1)
+
+    dark_range = cycle['range'][cycle['tag']==shutter_mode['close']]
+    dark_n = dark_range[:, 1] - dark_range[:, 0]
+    dark_start = np.append(0, np.cumsum(dark_n)[:-1])
+    dark_index = index[np.repeat(dark_range[:, 0]-dark_start, dark_n) + np.arange(dark_n.sum())]
+    dark_cid   = np.repeat(np.arange(dark_n.size), dark_n)
+
+    summary = {
+            'range': dark_range,
+                'n': dark_n,
+              'x_s': x0[index[dark_range[:, 0]]],
+              'x_e': x0[index[dark_range[:, 1]-1]],
+            }
+
+    if dark_n.size == 0:
+        summary['x_mean'] = np.zeros(0, dtype=np.float64)
+        summary['sxx']    = np.zeros(0, dtype=np.float64)
+        for vname in ['y_mean', 'sxy', 'syy']:
+            summary[vname] = np.zeros((0,)+data0.shape[1:], dtype=np.float64)
+        return summary
+
+    dark_x = x0[dark_index].astype(np.float64)
+    dark_y = data0[dark_index, ...].astype(np.float64)
+
+    summary['x_mean'] = np.add.reduceat(dark_x, dark_start, axis=0) / dark_n
+    summary['y_mean'] = np.add.reduceat(dark_y, dark_start, axis=0) / dark_n.reshape(data_shape)
+
+    dark_xc = dark_x - summary['x_mean'][dark_cid]
+    dark_yc = dark_y - summary['y_mean'][dark_cid, ...]
+    summary['sxx'] = np.add.reduceat(dark_xc**2, dark_start, axis=0)
+    summary['sxy'] = np.add.reduceat(dark_xc.reshape(data_shape)*dark_yc, dark_start, axis=0)
+    summary['syy'] = np.add.reduceat(dark_yc**2, dark_start, axis=0)
+
+    return summary
+
+
+
+def combine_dark_summary(
+        summary,
+        il,
+        ir,
+        ):
+
+    """
+    Linear fit of darks from two dark cycles (<il>-th and <ir>-th in <summary>) by combining
+    their centered moments (pairwise update), e.g.,
+        slope     = sum((x-x_mean)*(y-y_mean)) / sum((x-x_mean)**2)
+        intercept = y_mean - slope*x_mean
+
+    Output:
+        x_mean, y_mean, slope: dark offset at x is <y_mean + slope*(x-x_mean)>
+    """
+
+    data_shape = (-1,) + (1,)*(summary['y_mean'].ndim-1)
+
+    nl = summary['n'][il].astype(np.float64)
+    nr = summary['n'][ir].astype(np.float64)
+    n  = nl + nr
+
+    dx = summary['x_mean'][ir] - summary['x_mean'][il]
+    dy = summary['y_mean'][ir, ...] - summary['y_mean'][il, ...]
+    w  = nl*nr/n
+
+    x_mean = summary['x_mean'][il] + dx*nr/n
+    y_mean = summary['y_mean'][il, ...] + dy*(nr/n).reshape(data_shape)
+    sxx = summary['sxx'][il] + summary['sxx'][ir] + dx**2*w
+    sxy = summary['sxy'][il, ...] + summary['sxy'][ir, ...] + (dx*w).reshape(data_shape)*dy
+
+    slope = sxy / sxx.reshape(data_shape)
+
+    return x_mean, y_mean, slope
+
+
+
+def cal_dark_offset(
+        x,
+        summary,
+        mode='interp',
+        ):
+
+    """
+    Rebuild dark offsets at <x> (e.g., time of light samples) from dark summary (see get_dark_summary),
+    same as dark_corr for light samples between two dark cycles ('interp'), average darks of the next/previous
+    dark cycle for light samples before the first/after the last dark cycle, or average of all darks ('mean')
+
+    Output:
+        dark: numpy array (N,) or (N, Ny)
+    """
+
+    x = np.asarray(x, dtype=np.float64)
+    mode = mode.lower()
+
+    if summary['n'].size == 0:
+        msg = '\nError [cal_dark_offset]: No dark cycles are found in <summary>.'
+        raise OSError(msg)
+
+    if mode == 'mean':
+        weight = summary['n']/summary['n'].sum()
+        dark_mean = np.sum(summary['y_mean']*weight.reshape((-1,)+(1,)*(summary['y_mean'].ndim-1)), axis=0)
+        return np.repeat(dark_mean[np.newaxis, ...], x.size, axis=0)
+
+    elif mode == 'interp':
+
+        Nd = summary['n'].size
+        data_shape = (-1,) + (1,)*(summary['y_mean'].ndim-1)
+
+        ir = np.searchsorted(summary['x_s'], x)
+        il = ir - 1
+
+        logic_begin = (il<0)
+        logic_end   = (ir>(Nd-1))
+        logic_interp = ~(logic_begin|logic_end)
+
+        dark = np.zeros((x.size,)+summary['y_mean'].shape[1:], dtype=np.float64)
+        dark[logic_begin, ...] = summary['y_mean'][0, ...]
+        dark[logic_end, ...]   = summary['y_mean'][-1, ...]
+
+        x_mean, y_mean, slope = combine_dark_summary(summary, il[logic_interp], ir[logic_interp])
+        dark[logic_interp, ...] = y_mean + slope*(x[logic_interp]-x_mean).reshape(data_shape)
+
+        return dark
+
+    else:
+        msg = '\nError [cal_dark_offset]: <mode=%s> has not been implemented yet.' % mode
+        raise OSError(msg)
+
+
+
+def fit_dark_spline(
+        x,
+        y,
+        x_knot,
+        k=3,
+        ):
+
+    """
+    B-spline least-squares fit of darks against time for all channels (banded system with
+    multiple right-hand sides, see scipy.interpolate.make_lsq_spline)
+
+    Input:
+        x: numpy array (N,), time of dark samples (sorted)
+        y: numpy array (N,) or (N, Ny), dark counts
+        x_knot: numpy array, interior knots, e.g., center time of dark cycles
+        k=: integer, degree of B-spline; default=3 (cubic)
+
+    Output:
+        spl: scipy.interpolate.BSpline object, spl(x) returns darks of shape (N,) or (N, Ny)
+    """
+
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+
+    x_knot = np.asarray(x_knot, dtype=np.float64)
+    x_knot = x_knot[(x_knot>x[0]) & (x_knot<x[-1])]
+
+    knots = np.concatenate((np.repeat(x[0], k+1), x_knot, np.repeat(x[-1], k+1)))
+
+    spl = interpolate.make_lsq_spline(x, y, knots, k=k, axis=0)
+
+    return spl
 
 
 
@@ -20,9 +518,46 @@ def dark_corr(
         shutter_mode={'open':0, 'close':1},
         fill_value=np.nan,
         temp_threshold=25.0,
+        index=None,
+        out=None,
+        cycle=None,
+        coef=None,
+        return_coef=False,
+        summary=None,
+        spline_degree=3,
+        spline_step=4,
         verbose=False
         ):
 
+    """
+    Dark correction
+
+    Input:
+        x0: numpy array (N,), e.g., time or temperature (mode='temp')
+        shutter0: numpy array (N,), shutter status
+        data0: numpy array (N,) or (N, Ny), e.g., counts
+        mode=: string, 'interp', 'spline', 'mean' or 'temp'
+        index=: numpy array of indices, only correct data at <index> (e.g., samples of one integration time),
+                <x0>, <shutter0> and <data0> are not copied, data is gathered only where it is needed
+        out=: numpy array with the same shape as <data0>, if provided, corrected data is written into <out>
+              at <index> (other samples are not touched)
+        cycle=: Python dictionary, light/dark cycles of <shutter0[index]> from get_dark_cycle (reuse when
+                several data share the same shutter status)
+        coef=: numpy array (6, Ny), temperature dependent dark model from a previous fit (mode='temp'), e.g., to reuse
+               the model across files of the same flight instead of refitting; default=None (fit from data)
+        return_coef=: whether or not return the coefficients of temperature dependent dark model (mode='temp')
+        summary=: Python dictionary, dark summary of <cycle> from get_dark_summary (mode='interp'), computed if not provided
+        spline_degree=: integer, degree of B-spline dark model (mode='spline'), 'interp' is used instead when there are
+                        fewer than <spline_degree+1> dark cycles; default=3
+        spline_step=: integer, interior knots of B-spline dark model are placed at the center of every <spline_step>-th
+                      dark cycle (mode='spline'); default=4
+
+    Output:
+        shutter: numpy array, shutter status after dark correction (of the samples at <index>)
+        data_corr: numpy array, dark corrected data (<out> if provided)
+        coef: numpy array, only returned when <return_coef=True> (None if mode is not 'temp')
+    """
+
     # size check
     #/----------------------------------------------------------------------------\#
     if x0.size != shutter0.size:
@@ -33,6 +568,7 @@ def dark_corr(
 
     # dimension check
     #/----------------------------------------------------------------------------\#
+    swapAxis = False
     if data0.ndim == 1:
         Nx = data0.size
         if Nx != x0.size:
@@ -43,7 +579,7 @@ def dark_corr(
         Nx, Ny = data0.shape
         if Nx == x0.size:
             swapAxis = False
-        elif Ny == x0.size:
+        elif (Ny == x0.size) and (index is None) and (out is None):
             data0 = data0.T
             Nx, Ny = data0.shape
             swapAxis = True
@@ -54,70 +590,48 @@ def dark_corr(
     else:
         msg = '\nError [dark_corr]: Do not support <data0.ndim> greater than 2.'
         raise OSError(msg)
-    #\----------------------------------------------------------------------------/#
 
-
-    # make a copy of the data so the original data won't get overwritten in memory
-    #/----------------------------------------------------------------------------\#
-    x       = x0.copy()
-    shutter = shutter0.copy()
-    data    = data0.copy()
+    if (out is not None) and (out.shape != data0.shape):
+        msg = '\nError [dark_corr]: <out.shape> does not match <data0.shape>.'
+        raise OSError(msg)
     #\----------------------------------------------------------------------------/#
 
 
-    # append a different status at the begin and end to force cycle break
+    # samples to be corrected, the original data won't get overwritten in memory,
+    # data are gathered where needed and processed in float64 (e.g., for int16 raw counts)
     #/----------------------------------------------------------------------------\#
-    if shutter[0] == shutter_mode['open']:
-        shutter_append = np.append(shutter_mode['close'], shutter)
-    elif shutter[0] == shutter_mode['close']:
-        shutter_append = np.append(shutter_mode['open'], shutter)
-
-    if shutter[-1] == shutter_mode['open']:
-        shutter_append = np.append(shutter_append, shutter_mode['close'])
-    elif shutter[-1] == shutter_mode['close']:
-        shutter_append = np.append(shutter_append, shutter_mode['open'])
+    if index is None:
+        index = np.arange(Nx)
+        x       = x0
+        shutter = shutter0.copy()
+    else:
+        index = np.asarray(index)
+        x       = x0[index]
+        shutter = shutter0[index]
 
-    shutter_diff = shutter_append[1:]-shutter_append[:-1]
+    if out is None:
+        data_corr = np.zeros(data0.shape, dtype=np.float64)
+    else:
+        data_corr = out
+    data_corr[index, ...] = fill_value
     #\----------------------------------------------------------------------------/#
 
 
     # identify dark and light cycles
     #/----------------------------------------------------------------------------\#
-    break_indices = np.where(shutter_diff!=0)[0]
-
-    logic_light    = np.repeat(False, shutter.size)
-    logic_dark     = np.repeat(False, shutter.size)
-
-    circle_range   = []
-    circle_tag     = []
-
-    for i in range(break_indices.size-1):
-
-        index_l0 = break_indices[i]
-        index_r0 = break_indices[i+1]
-
-        shutter0     = shutter[index_l0:index_r0]
-        shutter0_uni = np.unique(shutter0)
-
-        if shutter0_uni.size != 1:
-            msg = '\nError [dark_corr]: The break indices are wrong.'
-            raise ValueError(msg)
-
-        if shutter0_uni[0] == shutter_mode['open']:
-            index_l = max([0, index_l0+light_extend])
-            index_r = min([index_r0-light_extend, shutter.size])
-            if (index_r-index_l) > light_threshold:
-                circle_range.append([index_l, index_r])
-                circle_tag.append(shutter_mode['open'])
-                logic_light[index_l:index_r] = True
-
-        elif shutter0_uni[0] == shutter_mode['close']:
-            index_l = max([0, index_l0+dark_extend])
-            index_r = min([index_r0-dark_extend, shutter.size])
-            if (index_r-index_l) > dark_threshold:
-                circle_range.append([index_l, index_r])
-                circle_tag.append(shutter_mode['close'])
-                logic_dark[index_l:index_r] = True
+    if cycle is None:
+        cycle = get_dark_cycle(shutter, dark_extend=dark_extend, light_extend=light_extend, light_threshold=light_threshold, dark_threshold=dark_threshold, shutter_mode=shutter_mode)
+    circle_range = cycle['range']
+    circle_tag   = cycle['tag']
+
+    # mark samples within the cycles (+1 at the start and -1 at the end of each cycle)
+    mark = np.zeros(shutter.size+1, dtype=np.int32)
+    np.add.at(mark, circle_range[:, 0],  1)
+    np.add.at(mark, circle_range[:, 1], -1)
+    logic_cycle = (np.cumsum(mark[:-1])>0)
+
+    logic_light = logic_cycle & (shutter==shutter_mode['open'])
+    logic_dark  = logic_cycle & (shutter==shutter_mode['close'])
     #\----------------------------------------------------------------------------/#
 
 
@@ -125,15 +639,13 @@ def dark_corr(
     #/----------------------------------------------------------------------------\#
     if 'exclude' not in shutter_mode.keys():
         shutter_mode['excluded'] = 10
-    logic_excluded = np.logical_not(logic_dark|logic_light)
+    logic_excluded = np.logical_not(logic_cycle)
     shutter[logic_excluded] = shutter_mode['excluded']
     #\----------------------------------------------------------------------------/#
 
 
     # perform dark correction
     #/----------------------------------------------------------------------------\#
-    data_corr      = np.zeros_like(data)
-    data_corr[...] = fill_value
 
     # dark correction mode, if only one mode is detected, return average
     #/--------------------------------------------------------------\#
@@ -142,73 +654,127 @@ def dark_corr(
     if (shutter_modes.size == 1):
         msg = '\nWarning [dark_corr]: Only one light/dark cycle is detected, returning average ...'
         warnings.warn(msg)
-        return np.mean(data[~logic_excluded, ...], axis=0)
+        return np.mean(data0[index[~logic_excluded], ...].astype(np.float64), axis=0)
     #\--------------------------------------------------------------/#
 
     if mode == 'mean':
 
-        dark_mean = np.mean(data[logic_dark, ...], axis=0)
-        data_corr[logic_light, ...] = data[logic_light, ...] - np.tile(dark_mean, logic_light.sum()).reshape(-1, Ny)
+        index_dark  = index[logic_dark]
+        index_light = index[logic_light]
 
-    elif mode == 'interp':
+        dark_mean = np.mean(data0[index_dark, ...].astype(np.float64), axis=0)
+        data_corr[index_light, ...] = data0[index_light, ...] - dark_mean[np.newaxis, ...]
 
-        Ncircle = len(circle_tag)
+    elif mode in ['interp', 'spline']:
 
-        for i in range(Ncircle):
+        Ncircle = len(circle_tag)
+        data_shape = (-1,) + (1,)*(data0.ndim-1)
+
+        # find neighbouring dark cycles (left: Nl, right: Nr) for every light cycle
+        #/--------------------------------------------------------------\#
+        indices_dark  = np.where(circle_tag==shutter_mode['close'])[0]
+        indices_light = np.where(circle_tag==shutter_mode['open'])[0]
+
+        Nr_indices = np.searchsorted(indices_dark, indices_light)
+        Nl_indices = Nr_indices - 1
+        #\--------------------------------------------------------------/#
+
+        # B-spline dark model needs at least <spline_degree+1> dark cycles, otherwise the knots
+        # are degenerate (make_lsq_spline fails), fall back to linear interpolation
+        #/--------------------------------------------------------------\#
+        if (mode == 'spline') and (indices_dark.size < (spline_degree+1)):
+            msg = '\nWarnings [dark_corr]: Found only %d dark cycles (<%d) for <mode=\'spline\'>, fall back to <mode=\'interp\'> ...' % (indices_dark.size, spline_degree+1)
+            warnings.warn(msg)
+            mode = 'interp'
+        #\--------------------------------------------------------------/#
+
+        # light cycles at the very beginning or very end (no dark cycle on one side)
+        #/--------------------------------------------------------------\#
+        for i, Nl_index, Nr_index in zip(indices_light, Nl_indices, Nr_indices):
 
-            ctag   = circle_tag[i]
             crange = circle_range[i]
-
-            if ctag == shutter_mode['open']:
-
-                Nl = i-1
-                while Nl >= 0 and circle_tag[Nl] != shutter_mode['close']:
-                    Nl -= 1
-
-                Nr = i+1
-                while Nr <= (Ncircle-1) and circle_tag[Nr] != shutter_mode['close']:
-                    Nr += 1
-
-                if Nl<0:
-                    msg = '\nWarnings [dark_corr]: Found light cycle at the very beginning, use average darks from the next available dark cycle ...'
-                    warnings.warn(msg)
-                    dark_mean = np.mean(data[circle_range[Nr][0]:circle_range[Nr][1], ...], axis=0)
-                    data_corr[crange[0]:crange[1], ...] = data[crange[0]:crange[1], ...] - np.tile(dark_mean, crange[1]-crange[0]).reshape(-1, Ny)
-
-                    if 'interp_begin' not in shutter_mode.keys():
-                        shutter_mode['interp_begin'] = -10
-                    shutter[crange[0]:crange[1]] = shutter_mode['interp_begin']
-
-                elif Nr>(Ncircle-1):
-                    msg = '\nWarnings [dark_corr]: Found light cycle at the very end, use average darks from the previous available dark cycle ...'
-                    warnings.warn(msg)
-                    dark_mean = np.mean(data[circle_range[Nl][0]:circle_range[Nl][1], ...], axis=0)
-                    data_corr[crange[0]:crange[1], ...] = data[crange[0]:crange[1], ...] - np.tile(dark_mean, crange[1]-crange[0]).reshape(-1, Ny)
-
-                    if 'interp_end' not in shutter_mode.keys():
-                        shutter_mode['interp_end'] = -11
-                    shutter[crange[0]:crange[1]] = shutter_mode['interp_end']
-                else:
-                    interp_x = np.append(x[circle_range[Nl][0]:circle_range[Nl][1]], x[circle_range[Nr][0]:circle_range[Nr][1]])
-                    target_x = x[crange[0]:crange[1]]
-                    for iChan in range(Ny):
-                        interp_y = np.append(data[circle_range[Nl][0]:circle_range[Nl][1], iChan], data[circle_range[Nr][0]:circle_range[Nr][1], iChan])
-                        slope, intercept, r_value, p_value, std_err = stats.linregress(interp_x, interp_y)
-                        dark_offset = target_x*slope + intercept
-                        data_corr[crange[0]:crange[1], iChan] = data[crange[0]:crange[1], iChan] - dark_offset
+            index_light = index[crange[0]:crange[1]]
+
+            if Nl_index<0:
+                msg = '\nWarnings [dark_corr]: Found light cycle at the very beginning, use average darks from the next available dark cycle ...'
+                warnings.warn(msg)
+                Nr = indices_dark[Nr_index]
+                dark_mean = np.mean(data0[index[circle_range[Nr][0]:circle_range[Nr][1]], ...].astype(np.float64), axis=0)
+                data_corr[index_light, ...] = data0[index_light, ...] - dark_mean[np.newaxis, ...]
+
+                if 'interp_begin' not in shutter_mode.keys():
+                    shutter_mode['interp_begin'] = -10
+                shutter[crange[0]:crange[1]] = shutter_mode['interp_begin']
+
+            elif Nr_index>(indices_dark.size-1):
+                msg = '\nWarnings [dark_corr]: Found light cycle at the very end, use average darks from the previous available dark cycle ...'
+                warnings.warn(msg)
+                Nl = indices_dark[Nl_index]
+                dark_mean = np.mean(data0[index[circle_range[Nl][0]:circle_range[Nl][1]], ...].astype(np.float64), axis=0)
+                data_corr[index_light, ...] = data0[index_light, ...] - dark_mean[np.newaxis, ...]
+
+                if 'interp_end' not in shutter_mode.keys():
+                    shutter_mode['interp_end'] = -11
+                shutter[crange[0]:crange[1]] = shutter_mode['interp_end']
+        #\--------------------------------------------------------------/#
+
+        logic_interp = (Nl_indices>=0) & (Nr_indices<indices_dark.size)
+
+        # light samples between two dark cycles
+        #/--------------------------------------------------------------\#
+        light_range = circle_range[indices_light[logic_interp]]
+        light_n = light_range[:, 1] - light_range[:, 0]
+        light_start = np.append(0, np.cumsum(light_n)[:-1])
+        light_index = np.repeat(light_range[:, 0]-light_start, light_n) + np.arange(light_n.sum())
+        light_cid   = np.repeat(np.arange(light_n.size), light_n)
+        #\--------------------------------------------------------------/#
+
+        # mode='interp': linear fit of the darks from both sides is solved in closed form
+        # for all channels and all light cycles at once, e.g.,
+        #   slope     = sum((x-x_mean)*(y-y_mean)) / sum((x-x_mean)**2)
+        #   intercept = y_mean - slope*x_mean
+        # where the sums are combined from per-dark-cycle (centered) moments
+        #/--------------------------------------------------------------\#
+        if (mode == 'interp') and (logic_interp.sum() > 0):
+
+            if summary is None:
+                summary = get_dark_summary(x0, data0, cycle, index=index, shutter_mode=shutter_mode)
+
+            x_mean, y_mean, slope = combine_dark_summary(summary, Nl_indices[logic_interp], Nr_indices[logic_interp])
+
+            dark_offset = y_mean[light_cid, ...] + slope[light_cid, ...] * (x[light_index]-x_mean[light_cid]).reshape(data_shape)
+            data_corr[index[light_index], ...] = data0[index[light_index], ...] - dark_offset
+        #\--------------------------------------------------------------/#
+
+        # mode='spline': smooth dark baseline of all dark cycles, B-spline least-squares
+        # fit (banded system) solved once for all channels
+        #/--------------------------------------------------------------\#
+        elif (mode == 'spline') and (logic_interp.sum() > 0):
+
+            dark_range = circle_range[indices_dark]
+            dark_n = dark_range[:, 1] - dark_range[:, 0]
+            dark_start = np.append(0, np.cumsum(dark_n)[:-1])
+            dark_index = np.repeat(dark_range[:, 0]-dark_start, dark_n) + np.arange(dark_n.sum())
+
+            x_dark = x[dark_index]
+            x_knot = (np.add.reduceat(x_dark, dark_start) / dark_n)[1:-1][::spline_step]
+
+            spl = fit_dark_spline(x_dark, data0[index[dark_index], ...], x_knot, k=spline_degree)
+
+            data_corr[index[light_index], ...] = data0[index[light_index], ...] - spl(x[light_index])
+        #\--------------------------------------------------------------/#
 
     elif mode == 'temp':
 
         msg = '\nWarnings [dark_corr]: Performing temperature dependent correction, please make sure input <x> is a temperature variable ...'
         warnings.warn(msg)
 
-        logic_fit = logic_dark & (x>temp_threshold)
+        if coef is None:
+            logic_fit = logic_dark & (x>temp_threshold)
+            coef = fit_dark_temp(x[logic_fit], data0[index[logic_fit], ...], deg=5)
 
-        x_fit = x[logic_fit]
-        for iChan in range(Ny):
-            y_fit = data[logic_fit, iChan]
-            coef  = np.polyfit(x_fit, y_fit, 5)
-            data_corr[logic_light, iChan] = data[logic_light, iChan] - np.polyval(coef, x[logic_light])
+        index_light = index[logic_light]
+        data_corr[index_light, ...] = data0[index_light, ...] - cal_dark_temp(x[logic_light], coef)
 
     else:
         msg = '\nError [dark_corr]: <mode=%s> has not been implemented yet.' % mode
@@ -216,12 +782,226 @@ def dark_corr(
     #\----------------------------------------------------------------------------/#
 
     if swapAxis:
-        return shutter, data_corr.T
+        data_corr = data_corr.T
+
+    if return_coef:
+        if mode != 'temp':
+            coef = None
+        return shutter, data_corr, coef
     else:
         return shutter, data_corr
 
 
 
+class dark_corr_stream:
+
+    """
+    Streaming (online) dark correction with the same result as dark_corr(mode='interp'), data are fed
+    in batches of records (e.g., while SSFR is recording), light cycles are buffered and emitted as
+    soon as the next dark cycle closes, memory is bounded to about one light/dark cycle
+
+    Input:
+        dark_extend=/light_extend=: integer, number of samples trimmed at both sides of dark/light cycles
+        dark_threshold=/light_threshold=: integer, minimum number of samples (after trimming) to keep a dark/light cycle
+        fill_value=: fill value for samples that are not corrected
+
+    How to use:
+        stream = dark_corr_stream()
+        for x, shutter, data in batches:
+            data_out = stream.feed(x, shutter, data)
+        data_out = stream.flush()
+
+        where <data_out> is a Python dictionary that contains the emitted samples (in order)
+            index  : (N,) sample index (counting from the first fed sample)
+            x      : (N,) e.g., time
+            shutter: (N,) shutter status after dark correction (same codes as dark_corr)
+            data   : (N,) or (N, Ny) dark corrected data
+    """
+
+    ID = 'Streaming Dark Correction'
+
+    def __init__(
+            self,
+            dark_extend=1,
+            light_extend=1,
+            light_threshold=10,
+            dark_threshold=5,
+            shutter_mode={'open':0, 'close':1, 'interp_begin':-10, 'interp_end':-11, 'excluded':10},
+            fill_value=np.nan,
+            ):
+
+        self.dark_extend     = dark_extend
+        self.light_extend    = light_extend
+        self.light_threshold = light_threshold
+        self.dark_threshold  = dark_threshold
+        self.shutter_mode    = shutter_mode
+        self.fill_value      = fill_value
+
+        self.Nx    = 0     # number of samples received
+        self.run   = None  # current (open) run of samples with the same shutter status
+        self.queue = []    # closed runs waiting for the next dark cycle
+        self.ready = []    # closed runs ready to be emitted
+        self.dark  = None  # summary of the last dark cycle
+
+    def feed(self, x, shutter, data):
+
+        """
+        Feed a batch of records, return the samples that can be emitted
+        """
+
+        x = np.asarray(x)
+        shutter = np.asarray(shutter)
+        data = np.asarray(data)
+
+        if (x.size != shutter.size) or (data.shape[0] != x.size):
+            msg = '\nError [dark_corr_stream]: <x>, <shutter> and <data> do not have the same number of records.'
+            raise OSError(msg)
+
+        if x.size == 0:
+            return self.emit()
+
+        index_s = np.append(0, np.where(shutter[1:]!=shutter[:-1])[0]+1)
+        index_e = np.append(index_s[1:], x.size)
+
+        for i in range(index_s.size):
+
+            state = shutter[index_s[i]]
+
+            if (self.run is not None) and (self.run['state'] != state):
+                self.close_run()
+
+            if self.run is None:
+                self.run = {'state': state, 'index0': self.Nx, 'x': [], 'data': []}
+
+            self.run['x'].append(x[index_s[i]:index_e[i]])
+            self.run['data'].append(data[index_s[i]:index_e[i], ...])
+            self.Nx += index_e[i] - index_s[i]
+
+        return self.emit()
+
+    def flush(self):
+
+        """
+        End of stream, light cycles after the last dark cycle are corrected with average darks of the
+        last dark cycle ('interp_end'), return the remaining samples
+        """
+
+        if self.run is not None:
+            self.close_run()
+
+        for run in self.queue:
+            if run['light']:
+                if self.dark is not None:
+                    self.correct_run(run, self.dark['y_mean'][0, ...], self.shutter_mode['interp_end'])
+                else:
+                    msg = '\nWarning [dark_corr_stream]: No dark cycles are found, light cycles are excluded ...'
+                    warnings.warn(msg)
+                    run['shutter'][...] = self.shutter_mode['excluded']
+            self.ready.append(run)
+        self.queue = []
+
+        return self.emit()
+
+    def close_run(self):
+
+        """
+        Close the current run, trim it and correct the waiting light cycles if it is a dark cycle
+        """
+
+        run = self.run
+        self.run = None
+
+        run['x']    = np.concatenate(run['x'])
+        run['data'] = np.concatenate(run['data'], axis=0)
+        Nx = run['x'].size
+
+        state = run['state']
+        if state == self.shutter_mode['open']:
+            extend, threshold = self.light_extend, self.light_threshold
+        else:
+            extend, threshold = self.dark_extend, self.dark_threshold
+
+        index_l = max(0, extend)
+        index_r = min(Nx-extend, Nx)
+        valid = ((state==self.shutter_mode['open']) or (state==self.shutter_mode['close'])) and ((index_r-index_l)>threshold)
+
+        run['range']   = [index_l, index_r]
+        run['light']   = valid and (state==self.shutter_mode['open'])
+        run['shutter'] = np.zeros(Nx, dtype=np.asarray(state).dtype)
+        run['shutter'][...] = self.shutter_mode['excluded']
+        run['data_corr'] = np.zeros(run['data'].shape, dtype=np.float64)
+        run['data_corr'][...] = self.fill_value
+
+        if valid:
+            run['shutter'][index_l:index_r] = state
+
+        if valid and (state==self.shutter_mode['close']):
+
+            cycle = {'range': np.array([[index_l, index_r]], dtype=np.int64), 'tag': np.array([state])}
+            dark = get_dark_summary(run['x'], run['data'], cycle, shutter_mode=self.shutter_mode)
+
+            for run0 in self.queue:
+                if run0['light']:
+                    if self.dark is None:
+                        msg = '\nWarnings [dark_corr_stream]: Found light cycle at the very beginning, use average darks from the next available dark cycle ...'
+                        warnings.warn(msg)
+                        self.correct_run(run0, dark['y_mean'][0, ...], self.shutter_mode['interp_begin'])
+                    else:
+                        summary = {vname: np.concatenate((self.dark[vname], dark[vname]), axis=0) for vname in ['n', 'x_mean', 'sxx', 'y_mean', 'sxy']}
+                        x_mean, y_mean, slope = combine_dark_summary(summary, np.array([0]), np.array([1]))
+                        index_l0, index_r0 = run0['range']
+                        x0 = run0['x'][index_l0:index_r0] - x_mean[0]
+                        dark_offset = y_mean[0, ...] + slope[0, ...]*x0.reshape((-1,)+(1,)*(run0['data'].ndim-1))
+                        run0['data_corr'][index_l0:index_r0, ...] = run0['data'][index_l0:index_r0, ...] - dark_offset
+                self.ready.append(run0)
+            self.queue = []
+
+            self.dark = dark
+            self.ready.append(run)
+
+        elif (len(self.queue)>0) or run['light']:
+            self.queue.append(run)
+
+        else:
+            self.ready.append(run)
+
+    def correct_run(self, run, dark_mean, shutter_code):
+
+        """
+        Correct light cycle with average darks
+        """
+
+        index_l, index_r = run['range']
+        run['data_corr'][index_l:index_r, ...] = run['data'][index_l:index_r, ...] - dark_mean[np.newaxis, ...]
+        run['shutter'][index_l:index_r] = shutter_code
+
+    def emit(self):
+
+        """
+        Concatenate and clear the runs that are ready
+        """
+
+        if len(self.ready) == 0:
+            data_out = {
+                    'index'  : np.zeros(0, dtype=np.int64),
+                    'x'      : np.zeros(0, dtype=np.float64),
+                    'shutter': np.zeros(0, dtype=np.int32),
+                    'data'   : np.zeros(0, dtype=np.float64),
+                    }
+            return data_out
+
+        data_out = {
+                'index'  : np.concatenate([np.arange(run['index0'], run['index0']+run['x'].size) for run in self.ready]),
+                'x'      : np.concatenate([run['x'] for run in self.ready]),
+                'shutter': np.concatenate([run['shutter'] for run in self.ready]),
+                'data'   : np.concatenate([run['data_corr'] for run in self.ready], axis=0),
+                }
+        self.ready = []
+
+        return data_out
+
+
+
 def dark_corr_old(
         x0,
         shutter0,
@@ -3,99 +3,137 @@ import sys
 import struct
 import datetime
 import warnings
+import concurrent.futures
 import h5py
 import numpy as np
 
 import ssfr
 
 __all__ = [
+            'cat_alp_raw',
+            'load_alp_rec',
             'read_alp_raw',
+            'read_alp_task',
             'read_alp',
         ]
 
 
-def read_alp_raw(fname, vnames=None, dataLen=248, verbose=False):
+def cat_alp_raw(fname, dataLen=248):
 
-    vnames_dict  = {                    \
-                    'Computer_Hour':0,  \
-                  'Computer_Minute':1,  \
-                  'Computer_Second':2,  \
-                         'GPS_Time':3,  \
-                         'GPS_Week':4,  \
-                   'Velocity_North':5,  \
-                    'Velocity_East':6,  \
-                      'Velocity_Up':7,  \
-                   'Span_CPT_Pitch':8,  \
-                    'Span_CPT_Roll':9,  \
-                         'Latitude':10, \
-                        'Longitude':11, \
-                           'Height':12, \
-                  'Span_CPT_Status':13, \
-                      'Motor_Pitch':14, \
-                       'Motor_Roll':15, \
-         'Inclinometer_Temperature':16, \
-           'Motor_Roll_Temperature':17, \
-          'Motor_Pitch_Temperature':18, \
-                'Stage_Temperature':19, \
-                'Relative_Humidity':20, \
-              'Chassis_Temperature':21, \
-                   'System_Voltage':22, \
-                       'ARINC_Roll':23, \
-                      'ARINC_Pitch':24, \
-        'Inclinometer_Roll_Voltage':25, \
-       'Inclinometer_Pitch_Voltage':26, \
-                'Inclinometer_Roll':27, \
-               'Inclinometer_Pitch':28, \
-                   'Reference_Roll':29, \
-                  'Reference_Pitch':30  \
-                  }
+    """
+    Catalog entry (see ssfr.util.get_raw_catalog) of an ALP data file, GPS time is only read
+    from the first and last data records (except for <day_counts>)
 
+    Output:
+        Python dictionary that contains
+            Nrec       : number of data records
+            day        : GPS time (in day) of first and last data records
+            day_counts : number of data records on each (integer) day, bad GPS time (during initialization) is excluded
+    """
+
+    fileSize = os.path.getsize(fname)
+    if fileSize > dataLen:
+        Nrec = fileSize // dataLen
+    else:
+        Nrec = 0
+
+    entry = {'Nrec': int(Nrec)}
+
+    if Nrec > 0:
+        gps_time = ssfr.util.load_rec(fname, 'lasp|alp')['GPS_Time']
+
+        day_int = np.int_(gps_time/86400.0)
+        day_unique, counts = np.unique(day_int[day_int>0], return_counts=True)
+
+        entry['day']        = [float(gps_time[0]/86400.0), float(gps_time[-1]/86400.0)]
+        entry['day_counts'] = {str(day0): int(count0) for day0, count0 in zip(day_unique, counts)}
+    else:
+        entry['day']        = []
+        entry['day_counts'] = {}
+
+    return entry
+
+def load_alp_rec(fname, dataLen=248):
+
+    """
+    Map ALP data file (.plt3) into memory as a (iterN, 31) float64 array without copying data,
+    see ssfr.common.rec_layout['lasp|alp'] for the variables (columns)
+
+    Input:
+        fname: string, file path of the ALP data
+        dataLen=: integer, number of bytes for each data record
+
+    Output:
+        numpy memmap of float64 with shape of (iterN, 31)
+    """
+
+    dtype = ssfr.util.get_rec_dtype('lasp|alp')
+    if dataLen != dtype.itemsize:
+        msg = '\nError [load_alp_rec]: <dataLen=%d> does not match the size of ALP data record (%d bytes).' % (dataLen, dtype.itemsize)
+        raise OSError(msg)
 
     fileSize = os.path.getsize(fname)
     if fileSize > dataLen:
-        iterN    = fileSize // dataLen
         residual = fileSize %  dataLen
         if residual != 0:
-            msg = '\nWarning [read_alp_raw]: <%s> has invalid data size.' % fname
+            msg = '\nWarning [load_alp_rec]: <%s> has invalid data size.' % fname
             warnings.warn(msg)
+        iterN = fileSize // dataLen
+        rec = np.memmap(fname, dtype='<f8', mode='r', shape=(iterN, len(dtype.names)))
     else:
-        msg = '\nWarning [read_alp_raw]: \'%s\' has invalid file size.' % fname
+        msg = '\nWarning [load_alp_rec]: \'%s\' has invalid file size.' % fname
         warnings.warn(msg)
-        iterN = 0
-        if vnames == None:
-            dataAll = np.zeros((iterN, len(vnames_dict)), dtype=np.float64)
-        else:
-            dataAll = np.zeros((iterN, len(vnames)), dtype=np.float64)
-        return dataAll
+        rec = np.zeros((0, len(dtype.names)), dtype=np.float64)
+
+    return rec
 
+def read_alp_raw(fname, vnames=None, dataLen=248, verbose=False):
+
+    """
+    Read ALP data file (.plt3) in bulk, only the columns of <vnames> are copied out of the data file
+    (see ssfr.common.rec_layout['lasp|alp'] for variable names)
+
+    Input:
+        fname: string, file path of the ALP data
+        vnames=: Python list, variable names, e.g., ['GPS_Time', 'Latitude', 'Longitude']; default=None (all 31 variables)
+
+    Output:
+        dataAll: numpy array with shape of (iterN, len(vnames))
+    """
+
+    vnames_all = list(ssfr.util.get_rec_dtype('lasp|alp').names)
     if vnames == None:
-        dataAll = np.zeros((iterN, len(vnames_dict)), dtype=np.float64)
-    else:
-        dataAll = np.zeros((iterN, len(vnames)), dtype=np.float64)
-        vnames_indice = []
-        for vname in vnames:
-            vnames_indice.append(vnames_dict[vname])
+        vnames = vnames_all
+
+    rec = load_alp_rec(fname, dataLen=dataLen)
 
-    f = open(fname, 'rb')
     if verbose:
         print('# //--------------------------------------------------------------------------\\ #')
         print('    Reading <%s> ...' % fname.split('/')[-1])
 
-    # read data record
-    for i in range(iterN):
-        dataRec = f.read(dataLen)
-        data    = struct.unpack('<31d', dataRec)
-        if vnames == None:
-            dataAll[i,:] = np.array(data, dtype=np.float64)
-        else:
-            dataAll[i,:] = np.array(data, dtype=np.float64)[vnames_indice]
+    dataAll = rec[:, [vnames_all.index(vname) for vname in vnames]]
 
     if verbose:
-        print(dataAll[:, 3].min()/3600.0, dataAll[:, 3].max()/3600.0)
+        print(rec[:, vnames_all.index('GPS_Time')].min()/3600.0, rec[:, vnames_all.index('GPS_Time')].max()/3600.0)
         print('# \\--------------------------------------------------------------------------// #')
 
     return dataAll
 
+def read_alp_task(task):
+
+    """
+    Read columns (variables) of an ALP file into shared output buffer, used by read_alp with <workers>
+
+    Input:
+        task: tuple of (fname, vnames, Nstart, Nend, buffer), where buffer is (file path, shape, dtype) of the shared output array
+    """
+
+    fname, vnames, Nstart, Nend, (fname_buf, shape, dtype) = task
+
+    dataAll = np.memmap(fname_buf, dtype=dtype, mode='r+', shape=shape)
+    dataAll[Nstart:Nend, :] = read_alp_raw(fname, vnames=vnames, verbose=False)
+    dataAll.flush()
+
 
 class read_alp:
 
@@ -108,15 +146,52 @@ class read_alp:
             tmhr_range=None,
             Ndata=15000,
             time_offset=0.0,
+            catalog=False,
+            vnames=None,
+            workers=None,
             verbose=ssfr.common.karg['verbose'],
             ):
 
+        '''
+        Description:
+        fnames      : list of ALP files to read
+        date=       : datetime.datetime object, date of the data, used to calculate julian day; default=None
+        tmhr_range= : two elements Python list, e.g., [15.0, 15.5], time range (in hour) of the data, only used with <catalog=True>,
+                      where files and data records outside of the range are skipped; default=None
+        Ndata=      : no longer used (kept for backward compatibility), number of data records is determined from file sizes
+        time_offset=: float, time offset in seconds added to GPS time; default=0.0
+        catalog=    : whether or not use the per-file time index (see ssfr.util.get_raw_catalog) to only read files within <tmhr_range>; default=False
+        vnames=     : Python list, ALP variables to read (keys of <self.vnames_dict>, GPS_Time is always read), e.g., ['Longitude', 'Latitude']; default=None (all variables in <self.vnames_dict>)
+        workers=    : number of processes for reading files in parallel; default=None (serial)
+        verbose=    : verbose tag; default=False
+        '''
+
         if len(fnames) == 0:
             msg = '\nError [read_alp]: No files are found in <fnames>.'
             raise OSError(msg)
 
         self.verbose = verbose
 
+        # select files within tmhr_range using catalog, reference day is determined from all the files
+        # (note: day counts in catalog do not include <time_offset>, when the offset is non-zero,
+        #  the reference day is determined from the offset GPS time of all the files instead)
+        # /--------------------------------------------------------------------------\ #
+        dayRef = None
+        if catalog and (tmhr_range is not None):
+            catalog0 = ssfr.util.get_raw_catalog(fnames, which_raw='lasp|alp', verbose=self.verbose)
+            if time_offset == 0.0:
+                dayRef = ssfr.util.get_catalog_day_ref(catalog0)
+            else:
+                day_int = np.int_(np.concatenate([(ssfr.util.load_rec(fname, 'lasp|alp')['GPS_Time'] + time_offset) / 86400.0 for fname, entry in zip(fnames, catalog0) if entry['Nrec']>0]))
+                day_unique, counts = np.unique(day_int[day_int>0], return_counts=True)
+                dayRef = day_unique[np.argmax(counts)]
+            day_range = [dayRef+tmhr_range[0]/24.0, dayRef+tmhr_range[1]/24.0]
+            fnames = ssfr.util.select_raw_files(fnames, catalog0, day_range, vname='day', time_offset=time_offset/86400.0)
+            if len(fnames) == 0:
+                msg = '\nError [read_alp]: No data records are found within <tmhr_range=[%.4f, %.4f]>.' % tuple(tmhr_range)
+                raise OSError(msg)
+        # \--------------------------------------------------------------------------/ #
+
         Nfile = len(fnames)
         if self.verbose:
             msg = '\nMessage [read_alp]: Processing %s files (Total of %d):' % (self.ID, Nfile)
@@ -141,28 +216,56 @@ class read_alp:
          'Relative_Humidity': 'rh', \
          }
 
-        self.vnames = list(self.vnames_dict.keys())
+        if vnames is None:
+            self.vnames = list(self.vnames_dict.keys())
+        else:
+            for vname in vnames:
+                if vname not in self.vnames_dict.keys():
+                    msg = '\nError [read_alp]: <%s> is not supported, please choose from %s.' % (vname, list(self.vnames_dict.keys()))
+                    raise OSError(msg)
+            self.vnames = ['GPS_Time'] + [vname for vname in vnames if vname != 'GPS_Time']
         # \--------------------------------------------------------------------------/ #
 
 
-        # read raw data
+        # read raw data, output array is allocated exactly from the file sizes
+        # when <workers> is specified, output array is allocated in shared (file-backed) memory
+        # so that worker processes can read data straight into it
         # /--------------------------------------------------------------------------\ #
-        Nx         = Ndata * len(fnames)
-        dataAll    = np.zeros((Nx, len(self.vnames)), dtype=np.float64)
+        dataLen = 248
+        Nrec = np.array([os.path.getsize(fname)//dataLen if os.path.getsize(fname)>dataLen else 0 for fname in fnames])
+        Nx   = Nrec.sum()
+        Nend = np.cumsum(Nrec)
+        Nstart = Nend - Nrec
 
-        Nstart = 0
-        for i, fname in enumerate(fnames):
+        if (workers is not None) and (workers > 1):
+            fdir_shm = ssfr.util.get_shared_dir(Nx*len(self.vnames)*8)
+            if fdir_shm is None:
+                msg = '\nWarning [read_alp]: not enough space for shared buffer (%.1f MB), reading data in series ...' % (Nx*len(self.vnames)*8/1.0e6)
+                warnings.warn(msg)
+                workers = None
+
+        if (workers is None) or (workers <= 1):
+
+            dataAll = np.zeros((Nx, len(self.vnames)), dtype=np.float64)
+
+            for i, fname in enumerate(fnames):
+
+                if self.verbose:
+                    msg = '    reading %3d/%3d <%s> ...' % (i+1, Nfile, fname)
+                    print(msg)
+
+                dataAll[Nstart[i]:Nend[i], :] = read_alp_raw(fname, vnames=self.vnames, dataLen=dataLen, verbose=False)
+
+        else:
 
             if self.verbose:
-                msg = '    reading %3d/%3d <%s> ...' % (i+1, Nfile, fname)
+                msg = '    reading %d files with %d processes ...' % (Nfile, workers)
                 print(msg)
 
-            dataAll0 = read_alp_raw(fname, vnames=self.vnames, dataLen=248, verbose=False)
-            Nend = Nstart + dataAll0.shape[0]
-            dataAll[Nstart:Nend, ...]  = dataAll0
-            Nstart = Nend
-
-        dataAll   = dataAll[:Nend, ...]
+            with ssfr.util.shared_buffers({'dataAll': ((Nx, len(self.vnames)), np.float64)}, fdir=fdir_shm, prefix='alp_') as shm:
+                with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+                    list(executor.map(read_alp_task, [(fname, self.vnames, Nstart[i], Nend[i], shm.buffers['dataAll']) for i, fname in enumerate(fnames) if Nrec[i]>0]))
+                dataAll = shm.detach()['dataAll']
         # \--------------------------------------------------------------------------/ #
 
 
@@ -177,17 +280,27 @@ class read_alp:
         #    the following code is to retrieve correct time from data that contains bad values
         # /--------------------------------------------------------------------------\ #
         day = (dataAll[:, self.vnames.index('GPS_Time')] + time_offset) / 86400.0
-        day_int = np.int_(day)
-        day_unique, counts = np.unique(day_int[day_int>0], return_counts=True)
-        dayRef = day_unique[np.argmax(counts)]
+        if dayRef is None:
+            day_int = np.int_(day)
+            day_unique, counts = np.unique(day_int[day_int>0], return_counts=True)
+            dayRef = day_unique[np.argmax(counts)]
         tmhr = (day-dayRef) * 24.0
         # \--------------------------------------------------------------------------/ #
+
+        # slice data using input tmhr_range (only with catalog, all data are kept otherwise)
+        # /--------------------------------------------------------------------------\ #
+        if catalog and (tmhr_range is not None):
+            logic = (tmhr>=tmhr_range[0]) & (tmhr<=tmhr_range[1])
+            tmhr    = tmhr[logic]
+            dataAll = dataAll[logic, :]
+        # \--------------------------------------------------------------------------/ #
         self.data_raw['tmhr'] = tmhr # time in hour
 
         for vname in self.vnames:
             self.data_raw[self.vnames_dict[vname]] = dataAll[:, self.vnames.index(vname)]
 
-        self.data_raw['ang_hed'] = ssfr.util.cal_heading(self.data_raw['lon'], self.data_raw['lat'])
+        if ('lon' in self.data_raw.keys()) and ('lat' in self.data_raw.keys()):
+            self.data_raw['ang_hed'] = ssfr.util.cal_heading(self.data_raw['lon'], self.data_raw['lat'])
 
         if date is not None:
             self.data_raw['jday'] = ssfr.util.dtime_to_jday(date) + self.data_raw['tmhr']/24.0
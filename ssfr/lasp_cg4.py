@@ -2,26 +2,20 @@
 import os
 import sys
 import glob
-import struct
 import datetime
-import multiprocessing as mp
 import h5py
-from pyhdf.SD import SD, SDC
 import numpy as np
-from scipy import interpolate
-from scipy.io import readsav
-import matplotlib as mpl
-mpl.use('Agg')
-import matplotlib.pyplot as plt
-from matplotlib.ticker import FixedLocator
-from matplotlib import rcParams
-import matplotlib.gridspec as gridspec
-import matplotlib.patches as mpatches
-# import cartopy.crs as ccrs
 
+import ssfr
 
 
-__all__ = ['cg4']
+
+__all__ = [
+        'read_cg4_cfg',
+        'decode_cg4_rec',
+        'read_cg4_raw',
+        'cg4',
+        ]
 
 
 
@@ -55,6 +49,54 @@ def read_cg4_cfg(fname):
 
 
 
+def decode_cg4_rec(rec, data=None):
+
+    """
+    Decode CG4 data records in bulk (see ssfr.common.rec_layout['lasp|cg4'] for the record layout),
+    channel 1 is zenith and channel 2 is nadir
+
+    Input:
+        rec: numpy structured array of CG4 record layout, e.g., read by ssfr.util.load_rec
+        data=: Python dictionary of pre-allocated arrays (same keys as output) to write into; default=None
+
+    Output:
+        Python dictionary that contains (N,) arrays of
+            julian_sec   : seconds since 1970-01-01 00:00:00
+            vol_zen, vol_nad
+            temp_zen, temp_nad
+            temp_rear_zen, temp_rear_nad
+            temp_sys_zen, temp_sys_nad
+    """
+
+    vnames_info = {
+                'vol_zen': 'voltage1',
+                'vol_nad': 'voltage2',
+               'temp_zen': 'temperature1',
+               'temp_nad': 'temperature2',
+          'temp_rear_zen': 'reartemp1',
+          'temp_rear_nad': 'reartemp2',
+           'temp_sys_zen': 'systemp1',
+           'temp_sys_nad': 'systemp2',
+            }
+
+    if data is None:
+        data = {vname: np.zeros(rec.size, dtype=np.float64) for vname in ['julian_sec']+list(vnames_info.keys())}
+
+    # IDL '800000'XL: int('800000', 16)
+    const = int('800000', 16)
+
+    factor = {
+            'zen': 1.25 / float(const) / rec['gain1'].astype(np.float64),
+            'nad': 1.25 / float(const) / rec['gain2'].astype(np.float64),
+            }
+
+    for vname, vname_rec in vnames_info.items():
+        data[vname][...] = (rec[vname_rec].astype(np.int64) - const) * factor[vname[-3:]]
+
+    data['julian_sec'][...] = rec['time1'][:, 0]
+
+    return data
+
 def read_cg4_raw(fname, headLen=0):
 
     """
@@ -85,54 +127,18 @@ def read_cg4_raw(fname, headLen=0):
     """
 
 
-    dataRecFmt = '<2l1l1B3B1l1h1B1B1l1l1l1l1l1B3B1l1h1B1B1l1l1l1l1l'
-    dataLen    = struct.calcsize(dataRecFmt)
-
     fileSize = os.path.getsize(fname)
-    if fileSize > headLen:
-        iterN   = (fileSize-headLen) // dataLen
-        residual = (fileSize-headLen) %  dataLen
-        if residual != 0:
-            print('Warning [read_cg4_raw]: %s contains unreadable data, omit the last data record...' % fname)
-    else:
-        exit('Error   [read_cg4_raw]: %s has invalid file size.' % fname)
-
-    julian_sec    = np.zeros(iterN, dtype=np.float64)  # start from 1970-01-01 00:00:00
-    vol_zen       = np.zeros(iterN, dtype=np.float64)
-    vol_nad       = np.zeros(iterN, dtype=np.float64)
-    temp_zen      = np.zeros(iterN, dtype=np.float64)
-    temp_nad      = np.zeros(iterN, dtype=np.float64)
-    temp_rear_zen = np.zeros(iterN, dtype=np.float64)
-    temp_rear_nad = np.zeros(iterN, dtype=np.float64)
-    temp_sys_zen  = np.zeros(iterN, dtype=np.float64)
-    temp_sys_nad  = np.zeros(iterN, dtype=np.float64)
-
-    const = int('800000', 16)
-    with open(fname, 'rb') as f:
+    if fileSize <= headLen:
+        msg = '\nError [read_cg4_raw]: <%s> has invalid file size.' % fname
+        raise OSError(msg)
 
-        for i in range(iterN):
-            dataRec = f.read(dataLen)
+    rec   = ssfr.util.load_rec(fname, 'lasp|cg4', headLen=headLen)
+    iterN = rec.size
 
-            data = struct.unpack(dataRecFmt, dataRec)
+    data = decode_cg4_rec(rec)
 
-            factor1 = 1.25 / float(const) / float(data[10])
-            factor2 = 1.25 / float(const) / float(data[23])
-
-            vol_zen[i] = (data[11] - const) * factor1
-            vol_nad[i] = (data[24] - const) * factor2
-
-            temp_zen[i] = (data[12] - const) * factor1
-            temp_nad[i] = (data[25] - const) * factor2
-
-            temp_rear_zen[i] = (data[13] - const) * factor1
-            temp_rear_nad[i] = (data[26] - const) * factor2
-
-            temp_sys_zen[i] =(data[14] - const) * factor1
-            temp_sys_zen[i] =(data[27] - const) * factor2
-
-            julian_sec[i] = data[0]
-
-    return julian_sec, vol_zen, vol_nad, temp_zen, temp_nad, temp_rear_zen, temp_rear_nad, temp_sys_zen, temp_sys_nad, iterN
+    return data['julian_sec'], data['vol_zen'], data['vol_nad'], data['temp_zen'], data['temp_nad'], \
+           data['temp_rear_zen'], data['temp_rear_nad'], data['temp_sys_zen'], data['temp_sys_nad'], iterN
 
 
 
@@ -143,65 +149,74 @@ class cg4:
 
     Input:
         fnames: Python list of CG4 file paths (string type)
+        fname_cfg=: string, file path of the CG4 configuration file (calibration coefficients), when provided,
+                    data are calibrated (self.calibrate) and filtered (self.filter); default=None
+        dtime=: datetime.datetime object, date of the data (tmhr is calculated w.r.t. this date); default=None (date of the first data record)
+        Ndata=: no longer used (kept for backward compatibility), number of data records is determined from file sizes
+        fname_h5=: string, file path to save calibrated data (self.save_h5); default=None
+        fname_png=: string, file path to save quicklook plot (self.plot); default=None
+
+    Output:
+        cg4 object that contains
+            .tmhr
+            .vol_zen, .vol_nad, .temp_zen, .temp_nad, .temp_rear_zen, .temp_rear_nad, .temp_sys_zen, .temp_sys_nad
+            .zen, .nad (after calibration)
     """
 
+    ID = 'CU LASP CG4'
 
-    def __init__(self, fnames, fname_cfg, dtime, Ndata=600):
+    def __init__(self, fnames, fname_cfg=None, dtime=None, Ndata=600, fname_h5=None, fname_png=None, headLen=0):
 
         if type(fnames) is not list:
-            exit('Error   [read_cg4]: input variable should be \'list\'.')
+            msg = '\nError [cg4]: Input variable <fnames> should be a Python list.'
+            raise OSError(msg)
         if len(fnames) == 0:
-            exit('Error   [read_cg4]: input \'list\' is empty.')
-
-        Nf = Ndata * len(fnames)
-
-        julian_sec    = np.zeros(Ndata*Nf, dtype=np.float64)  # start from 1970-01-01 00:00:00
-        vol_zen       = np.zeros(Ndata*Nf, dtype=np.float64)
-        vol_nad       = np.zeros(Ndata*Nf, dtype=np.float64)
-        temp_zen      = np.zeros(Ndata*Nf, dtype=np.float64)
-        temp_nad      = np.zeros(Ndata*Nf, dtype=np.float64)
-        temp_rear_zen = np.zeros(Ndata*Nf, dtype=np.float64)
-        temp_rear_nad = np.zeros(Ndata*Nf, dtype=np.float64)
-        temp_sys_zen  = np.zeros(Ndata*Nf, dtype=np.float64)
-        temp_sys_nad  = np.zeros(Ndata*Nf, dtype=np.float64)
-
+            msg = '\nError [cg4]: Input variable <fnames> is empty.'
+            raise OSError(msg)
+
+        # map data records into memory and allocate exactly for all data records
+        #/----------------------------------------------------------------------------\#
+        recs = [ssfr.util.load_rec(fname, 'lasp|cg4', headLen=headLen) for fname in fnames]
+        Nx = sum([rec.size for rec in recs])
+        if Nx == 0:
+            msg = '\nError [cg4]: No data records are found in <fnames>.'
+            raise OSError(msg)
+
+        vnames = ['julian_sec', 'vol_zen', 'vol_nad', 'temp_zen', 'temp_nad', 'temp_rear_zen', 'temp_rear_nad', 'temp_sys_zen', 'temp_sys_nad']
+        data = {vname: np.zeros(Nx, dtype=np.float64) for vname in vnames}
+        #\----------------------------------------------------------------------------/#
+
+        # decode data records file by file into the output arrays
+        #/----------------------------------------------------------------------------\#
         Nstart = 0
-        for fname in fnames:
-
-            julian_sec0, vol_zen0, vol_nad0, temp_zen0, temp_nad0, temp_rear_zen0, temp_rear_nad0, temp_sys_zen0, temp_sys_nad0, iterN = read_cg4_raw(fname)
-
-            Nend = Nstart + iterN
-
-            julian_sec[Nstart:Nend]    = julian_sec0
-            vol_zen[Nstart:Nend]       = vol_zen0
-            vol_nad[Nstart:Nend]       = vol_nad0
-            temp_zen[Nstart:Nend]      = temp_zen0
-            temp_nad[Nstart:Nend]      = temp_nad0
-            temp_rear_zen[Nstart:Nend] = temp_rear_zen0
-            temp_rear_nad[Nstart:Nend] = temp_rear_nad0
-            temp_sys_zen[Nstart:Nend]  = temp_sys_zen0
-            temp_sys_nad[Nstart:Nend]  = temp_sys_nad0
-
+        for rec in recs:
+            Nend = Nstart + rec.size
+            decode_cg4_rec(rec, data={vname: data[vname][Nstart:Nend] for vname in vnames})
             Nstart = Nend
+        #\----------------------------------------------------------------------------/#
 
-        julian_sec         = julian_sec[:Nend]
-        self.tmhr          = (julian_sec-((dtime-datetime.datetime(1970, 1, 1)).days)*86400) / 3600.0
-        self.vol_zen       = vol_zen[:Nend]
-        self.vol_nad       = vol_nad[:Nend]
-        self.temp_zen      = temp_zen[:Nend]
-        self.temp_nad      = temp_nad[:Nend]
-        self.temp_rear_zen = temp_rear_zen[:Nend]
-        self.temp_rear_nad = temp_rear_nad[:Nend]
-        self.temp_sys_zen  = temp_sys_zen[:Nend]
-        self.temp_sys_nad  = temp_sys_nad[:Nend]
+        if dtime is None:
+            dtime = datetime.datetime(1970, 1, 1) + datetime.timedelta(seconds=data['julian_sec'][0])
 
-        self.calibrate(fname_cfg)
+        self.tmhr          = (data['julian_sec']-((dtime-datetime.datetime(1970, 1, 1)).days)*86400) / 3600.0
+        self.vol_zen       = data['vol_zen']
+        self.vol_nad       = data['vol_nad']
+        self.temp_zen      = data['temp_zen']
+        self.temp_nad      = data['temp_nad']
+        self.temp_rear_zen = data['temp_rear_zen']
+        self.temp_rear_nad = data['temp_rear_nad']
+        self.temp_sys_zen  = data['temp_sys_zen']
+        self.temp_sys_nad  = data['temp_sys_nad']
 
-        self.filter()
+        if fname_cfg is not None:
+            self.calibrate(fname_cfg)
+            self.filter()
 
-        self.save_h5('CG4_%s.h5' % dtime.strftime('%Y%m%d'))
+        if fname_h5 is not None:
+            self.save_h5(fname_h5)
 
-        self.plot('CG4_QL_%s.png' % dtime.strftime('%Y%m%d'))
+        if fname_png is not None:
+            self.plot(fname_png)
 
 
     def calibrate(self, fname_cfg, nad_id=20618, zen_id=20592):
@@ -235,6 +250,10 @@ class cg4:
 
     def filter(self):
 
+        if not hasattr(self, 'zen'):
+            msg = '\nError [cg4]: Please run <calibrate> before <filter>.'
+            raise OSError(msg)
+
         # logic = (self.nad['T']>0.0) & (self.zen['T']>0.0) & (self.tmhr>0.0) & (self.tmhr<24.0)
         # logic = (self.tmhr>0.0) & (self.tmhr<24.0)
         # logic = np.repeat(True, self.nad['T'].size)
@@ -252,6 +271,10 @@ class cg4:
 
     def save_h5(self, fname):
 
+        if not hasattr(self, 'zen'):
+            msg = '\nError [cg4]: Please run <calibrate> before <save_h5>.'
+            raise OSError(msg)
+
         f  = h5py.File(fname, 'w')
         f['tmhr'] = self.tmhr
         g1 = f.create_group('nad')
@@ -265,6 +288,16 @@ class cg4:
 
     def plot(self, fname):
 
+        # matplotlib is only needed for plotting
+        import matplotlib as mpl
+        mpl.use('Agg')
+        import matplotlib.pyplot as plt
+        import matplotlib.patches as mpatches
+
+        if not hasattr(self, 'zen'):
+            msg = '\nError [cg4]: Please run <calibrate> before <plot>.'
+            raise OSError(msg)
+
         fig = plt.figure(figsize=(12, 8))
         ax1 = fig.add_subplot(211)
         ax1.scatter(self.tmhr, self.nad['F'], c='blue', s=6)
@@ -297,4 +330,6 @@ if __name__ == '__main__':
     fnames_cg4 = sorted(glob.glob('%s/*.CG4' % fdir))
     fname_cfg  = 'cg4_20181224.cfg'
 
-    cg4 = read_cg4(fnames_cg4, fname_cfg, datetime.datetime(2017, 8, 13))
+    dtime      = datetime.datetime(2017, 8, 13)
+
+    cg4_ = cg4(fnames_cg4, fname_cfg=fname_cfg, dtime=dtime, fname_h5='CG4_%s.h5' % dtime.strftime('%Y%m%d'), fname_png='CG4_QL_%s.png' % dtime.strftime('%Y%m%d'))
@@ -1,8 +1,10 @@
 import os
 import sys
 import glob
+import time
 import struct
 import warnings
+import concurrent.futures
 import numpy as np
 import datetime
 
@@ -13,21 +15,273 @@ import ssfr
 
 __all__ = [
         'get_ssfr_wvl',
+        'decode_ssfr_rec',
+        'load_ssfr_rec',
+        'get_ssfr_jday',
+        'cat_ssfr_raw',
         'read_ssfr_raw',
+        'follow_ssfr',
+        'read_ssfr_task',
         'read_ssfr',
         ]
 
 
 
 
+# binary layout of one LASP-SSFR data record (2276 bytes, little endian, no padding),
+# see ssfr.common.rec_layout['lasp|ssfr']
+#/----------------------------------------------------------------------------\#
+dtype_ssfr_rec  = ssfr.util.get_rec_dtype('lasp|ssfr')
+dtype_ssfr_time = ssfr.util.get_rec_dtype('lasp|ssfr|time')
+dtype_ssfr_spec = ssfr.util.get_rec_dtype('lasp|ssfr|spec')
+#\----------------------------------------------------------------------------/#
+
+
+
+
+def cal_jday_ssfr(time_rec):
+
+    """
+    Convert time fields (structured array of <dtype_ssfr_time>) into julian days (w.r.t 0001-01-01).
+
+    Integer days and seconds are accumulated exactly before converting to float so that the result
+    is identical to datetime.datetime arithmetic, e.g.,
+    (datetime.datetime(year, month, day, hour, minute, second, microsecond)-datetime.datetime(1, 1, 1)).total_seconds()/86400.0 + 1.0
+    """
+
+    date = np.asarray(time_rec['year']-1970, dtype='datetime64[Y]').astype('datetime64[M]') + (time_rec['month']-1)
+    date = date.astype('datetime64[D]') + (time_rec['day']-1)
+    days = (date - np.datetime64('0001-01-01', 'D')).astype(np.int64)
+
+    usec = np.int64(1000000)*(days*86400 + time_rec['hour']*3600 + time_rec['minute']*60 + time_rec['second']) + \
+            np.rint(time_rec['frac_second']*1000000.0).astype(np.int64)
+
+    sec_int, usec_res = np.divmod(usec, 1000000)
+    jday = (sec_int.astype(np.float64) + usec_res/1000000.0) / 86400.0 + 1.0
+
+    return jday
+
+
+
+
+def decode_ssfr_rec(rec, data=None):
+
+    """
+    Decode LASP-SSFR data records in bulk.
+
+    Input:
+        rec: numpy structured array of <dtype_ssfr_rec>, e.g., read by np.fromfile or np.memmap
+        data=: Python dictionary of pre-allocated arrays (same keys as output) to write into; default=None
+
+    Output:
+        Python dictionary that contains
+            count_raw  (numpy array)[N/A]: (N, 256, 4), order of 'zen_si, zen_in, nad_si, nad_in'
+            shutter    (numpy array)[N/A]: (N,)
+            int_time   (numpy array)[ms] : (N, 4)
+            temp       (numpy array)[N/A]: (N, 11)
+            jday_ARINC (numpy array)[day]: (N,)
+            jday_cRIO  (numpy array)[day]: (N,)
+            qual_flag  (numpy array)[N/A]: (N,)
+    """
+
+    # [0, 2, 1, 3]: change order from 'zen_si, nad_si, zen_in, nad_in' to 'zen_si, zen_in, nad_si, nad_in'
+    order = [0, 2, 1, 3]
+
+    if data is None:
+        Ndata = rec.size
+        data = {
+               'count_raw': np.zeros((Ndata, 256, 4), dtype=np.float64),
+                 'shutter': np.zeros(Ndata          , dtype=np.int32),
+                'int_time': np.zeros((Ndata, 4)     , dtype=np.float64),
+                    'temp': np.zeros((Ndata, 11)    , dtype=np.float64),
+              'jday_ARINC': np.zeros(Ndata          , dtype=np.float64),
+               'jday_cRIO': np.zeros(Ndata          , dtype=np.float64),
+               'qual_flag': np.zeros(Ndata          , dtype=np.int32),
+                }
+
+    spec = rec['spec']
+
+    for i, index in enumerate(order):
+        data['count_raw'][:, :, i] = spec['count'][:, index, 1:]
+
+    data['shutter'][...]    = spec['shutter'][:, 0]
+    data['int_time'][...]   = spec['int_time'][:, order]
+    data['temp'][...]       = rec['temp']
+    data['jday_ARINC'][...] = cal_jday_ssfr(rec['time_arinc'])
+    data['jday_cRIO'][...]  = cal_jday_ssfr(rec['time_crio'])
+
+    # quality check, data record is flagged as bad (0) when
+    # 1) shutter status is inconsistent among spectrometers
+    # 2) EOS is not 1
+    # 3) null is not 257
+    # 4) spectrometer order is not 'zen_si, nad_si, zen_in, nad_in'
+    #/----------------------------------------------------------------------------\#
+    shutter_logic = np.any(spec['shutter'] != spec['shutter'][:, [0]], axis=-1)
+    eos_logic     = np.any(spec['eos'] != 1, axis=-1)
+    null_logic    = np.any(spec['null'] != 257, axis=-1)
+    order_logic   = np.any(spec['count'][:, :, 0] != np.arange(4), axis=-1)
+
+    data['qual_flag'][...] = ~(shutter_logic | eos_logic | null_logic | order_logic)
+    #\----------------------------------------------------------------------------/#
+
+    return data
+
+
+
+
+def read_ssfr_head(fname, headLen=148):
+
+    """
+    Read header of a LASP-SSFR file, header is valid when the first byte is 144
+
+    Output:
+        offset : number of bytes before the first data record (0 if header is not valid)
+        comment: comment in header (b'' if header is not valid)
+    """
+
+    with open(fname, 'rb') as f:
+        headRec = f.read(headLen)
+
+    head = struct.unpack('<B144s3B', headRec)
+    if head[0] != 144:
+        offset  = 0
+        comment = b''
+    else:
+        offset  = headLen
+        comment = head[1]
+
+    return offset, comment
+
+def load_ssfr_rec(
+        fname,
+        headLen=148,
+        dataLen=2276,
+        ):
+
+    """
+    Map the data records of a LASP-SSFR file into memory (np.memmap) without decoding them.
+
+    Since every data record has the same length, the number of records is determined from file size,
+    and only the records that are accessed (e.g., rec[100:200] or rec['time_arinc']) are read from disk.
+
+    Input:
+        fname: string, file path of the SSFR data
+        headLen=: integer, number of bytes for the header
+        dataLen=: integer, number of bytes for each data record
+
+    Output:
+        comment: comment in header
+        rec: numpy memmap of <dtype_ssfr_rec> with shape of (iterN,)
+    """
+
+    ssfr.util.if_file_exists(fname, exitTag=True)
+
+    if dataLen != dtype_ssfr_rec.itemsize:
+        msg = '\nError [load_ssfr_rec]: <dataLen=%d> does not match the size of LASP-SSFR data record (%d bytes).' % (dataLen, dtype_ssfr_rec.itemsize)
+        raise OSError(msg)
+
+    fileSize = os.path.getsize(fname)
+    if fileSize > headLen:
+        iterN   = (fileSize-headLen) // dataLen
+        residual = (fileSize-headLen) %  dataLen
+        if residual != 0:
+            msg = '\nWarning [load_ssfr_rec]: <%s> contains unreadable data, omit the last data record...' % fname
+            warnings.warn(msg)
+    else:
+        msg = '\nError [load_ssfr_rec]: <%s> has invalid file size.' % fname
+        raise OSError(msg)
+
+    offset, comment = read_ssfr_head(fname, headLen=headLen)
+
+    if iterN > 0:
+        rec = np.memmap(fname, dtype=dtype_ssfr_rec, mode='r', offset=offset, shape=(iterN,))
+    else:
+        rec = np.zeros(0, dtype=dtype_ssfr_rec)
+
+    return comment, rec
+
+
+
+
+def get_ssfr_jday(rec, which_time='arinc'):
+
+    """
+    Julian days (w.r.t 0001-01-01) of LASP-SSFR data records, only time fields are accessed.
+
+    Input:
+        rec: numpy structured array of <dtype_ssfr_rec>
+        which_time=: "ARINC" or "cRIO"; default='arinc'
+    """
+
+    which_time = which_time.lower()
+    if which_time == 'arinc':
+        return cal_jday_ssfr(rec['time_arinc'])
+    elif which_time == 'crio':
+        return cal_jday_ssfr(rec['time_crio'])
+    else:
+        msg = '\nError [get_ssfr_jday]: <which_time=> only supports <\'arinc\'> or <\'crio\'>.'
+        raise ValueError(msg)
+
+
+def cal_shutter_cycle(shutter):
+
+    """
+    Count number of light (shutter open, 0) and dark (shutter closed, 1) cycles (runs of consecutive shutter status)
+    """
+
+    if shutter.size == 0:
+        return {'light': 0, 'dark': 0}
+
+    shutter_s = shutter[np.r_[0, np.flatnonzero(np.diff(shutter))+1]]
+
+    return {'light': int((shutter_s==0).sum()), 'dark': int((shutter_s==1).sum())}
+
+def cat_ssfr_raw(fname, headLen=148, dataLen=2276):
+
+    """
+    Catalog entry (see ssfr.util.get_raw_catalog) of a LASP-SSFR data file, time is only read from
+    the first and last data records
+
+    Output:
+        Python dictionary that contains
+            Nrec       : number of data records
+            jday_ARINC : julian days of first and last data records (ARINC time)
+            jday_cRIO  : julian days of first and last data records (cRIO time)
+            int_time   : sets of integration times (order of 'zen_si, zen_in, nad_si, nad_in')
+            Ncycle     : number of light and dark shutter cycles
+    """
+
+    comment, rec = load_ssfr_rec(fname, headLen=headLen, dataLen=dataLen)
+
+    entry = {'Nrec': int(rec.size)}
+
+    if rec.size > 0:
+        rec_se = rec[[0, -1]]
+        entry['jday_ARINC'] = get_ssfr_jday(rec_se, which_time='arinc').tolist()
+        entry['jday_cRIO']  = get_ssfr_jday(rec_se, which_time='crio').tolist()
+
+        spec = rec['spec']
+        entry['int_time'] = np.unique(spec['int_time'][:, [0, 2, 1, 3]], axis=0).tolist()
+        entry['Ncycle']   = cal_shutter_cycle(spec['shutter'][:, 0])
+    else:
+        entry['jday_ARINC'] = []
+        entry['jday_cRIO']  = []
+        entry['int_time']   = []
+        entry['Ncycle']     = cal_shutter_cycle(np.zeros(0, dtype=np.int32))
+
+    return entry
+
+
+
+
 def get_ssfr_wvl(
         which_ssfr,
         Nchan=256,
         ):
 
     which_ssfr = which_ssfr.lower()
-    if which_ssfr not in ['lasp|ssfr-a', 'lasp|ssfr-b']:
-        msg = 'Error [get_ssfr_wvl]: <which_ssfr> can only be <lasp|ssfr-a> or <lasp|ssfr-b>.'
+    if which_ssfr not in ['lasp|ssfr-a', 'lasp|ssfr-b', 'nasa|ssfr-6']:
+        msg = 'Error [get_ssfr_wvl]: <which_ssfr> can only be <lasp|ssfr-a>, <lasp|ssfr-b> or <nasa|ssfr-6>.'
         raise OSError(msg)
 
     wvls = {
@@ -99,36 +353,8 @@ def read_ssfr_raw(
     iterN (numpy array)   [N/A]    : number of data record
     '''
 
-    ssfr.util.if_file_exists(fname, exitTag=True)
-
-    fileSize = os.path.getsize(fname)
-    if fileSize > headLen:
-        iterN   = (fileSize-headLen) // dataLen
-        residual = (fileSize-headLen) %  dataLen
-        if residual != 0:
-            msg = '\nWarning [read_ssfr_raw]: <%s> contains unreadable data, omit the last data record...' % fname
-            warnings.warn(msg)
-    else:
-        msg = '\nError [read_ssfr_raw]: <%s> has invalid file size.' % fname
-        raise OSError(msg)
-
-    count_raw = np.zeros((iterN, 256, 4), dtype=np.float64) # raw counts (Ntime, Nchan, Nspec)
-    shutter    = np.zeros(iterN          , dtype=np.int32  ) # shutter status (1:closed, 0:open)
-    int_time   = np.zeros((iterN, 4)     , dtype=np.float64) # integration time [ms]
-    temp       = np.zeros((iterN, 11)    , dtype=np.float64) # temperature
-    qual_flag  = np.ones(iterN           , dtype=np.int32)   # quality flag (1:good, 0:bad)
-    jday_ARINC = np.zeros(iterN          , dtype=np.float64) # ARINC time (aircraft time, e.g., from P-3)
-    jday_cRIO  = np.zeros(iterN          , dtype=np.float64) # cRIO time (SSFR computer time)
-
-    f           = open(fname, 'rb')
-
-    # read head
-    headRec   = f.read(headLen)
-    head      = struct.unpack('<B144s3B', headRec)
-    if head[0] != 144:
-        f.seek(0)
-    else:
-        comment = head[1]
+    comment, rec = load_ssfr_rec(fname, headLen=headLen, dataLen=dataLen)
+    iterN = rec.size
 
     if verbose:
         print('#//--------------------------------------------------------------\\#')
@@ -136,56 +362,19 @@ def read_ssfr_raw(
         print(comment)
         print('#\\--------------------------------------------------------------//#')
 
-    # read data record
-    for i in range(iterN):
-        dataRec = f.read(dataLen)
-        # ---------------------------------------------------------------------------------------------------------------
-        # d9l: frac_second[d] , second[l] , minute[l] , hour[l] , day[l] , month[l] , year[l] , dow[l] , doy[l] , DST[l]
-        # d9l: frac_second0[d], second0[l], minute0[l], hour0[l], day0[l], month0[l], year0[l], dow0[l], doy0[l], DST0[l]
-        # l11d: null[l], temp(11)[11d]
-        # ----------------          below repeat for zen_si, nad_si, zen_in, nad_in          ----------------------------
-        # l2Bl: int_time[l], shutter[B], EOS[B], null[l]
-        # 257h: raw counts(257)
-        # ---------------------------------------------------------------------------------------------------------------
-        data     = struct.unpack('<d9ld9ll11dl2Bl257hl2Bl257hl2Bl257hlBBl257h', dataRec)
-
-        dataHead = data[:32]
-        dataSpec = np.transpose(np.array(data[32:]).reshape((4, 261)))[:, [0, 2, 1, 3]]
-        # [0, 2, 1, 3]: change order from 'zen_si, nad_si, zen_in, nad_in' to 'zen_si, zen_in, nad_si, nad_in'
-        # transpose: change shape from (4, 261) to (261, 4)
-
-        shutter_logic = (np.unique(dataSpec[1, :]).size != 1)
-        eos_logic     = any(dataSpec[2, :] != 1)
-        null_logic    = any(dataSpec[3, :] != 257)
-        order_logic   = not np.array_equal(dataSpec[4, :], np.array([0, 2, 1, 3]))
-
-        if any([shutter_logic, eos_logic, null_logic, order_logic]):
-            qual_flag[i] = 0
-
-        count_raw[i, :, :]  = dataSpec[5:, :]
-        shutter[i]        = dataSpec[1, 0]
-        int_time[i, :]    = dataSpec[0, :]
-        temp[i, :]        = dataHead[21:]
-
-        dtime          = datetime.datetime(dataHead[6] , dataHead[5] , dataHead[4] , dataHead[3] , dataHead[2] , dataHead[1] , int(round(dataHead[0]*1000000.0)))
-        dtime0         = datetime.datetime(dataHead[16], dataHead[15], dataHead[14], dataHead[13], dataHead[12], dataHead[11], int(round(dataHead[10]*1000000.0)))
-
-        # calculate the proleptic Gregorian ordinal of the date
-        jday_ARINC[i]  = (dtime  - datetime.datetime(1, 1, 1)).total_seconds() / 86400.0 + 1.0
-        jday_cRIO[i]   = (dtime0 - datetime.datetime(1, 1, 1)).total_seconds() / 86400.0 + 1.0
-
-    f.close()
+    data0 = decode_ssfr_rec(rec)
+    jday_ARINC = data0['jday_ARINC']
 
     data_ = {
              'comment': comment,
-           'count_raw': count_raw,
-             'shutter': shutter,
-            'int_time': int_time,
-                'temp': temp,
+           'count_raw': data0['count_raw'],
+             'shutter': data0['shutter'],
+            'int_time': data0['int_time'],
+                'temp': data0['temp'],
                 'jday': jday_ARINC,
           'jday_ARINC': jday_ARINC,
-           'jday_cRIO': jday_cRIO,
-           'qual_flag': qual_flag,
+           'jday_cRIO': data0['jday_cRIO'],
+           'qual_flag': data0['qual_flag'],
                'iterN': iterN,
             }
 
@@ -194,6 +383,163 @@ def read_ssfr_raw(
 
 
 
+def follow_ssfr(
+        fdir,
+        pattern='*.SKS',
+        interval=10.0,
+        timeout=None,
+        skip_existing=False,
+        which_time='arinc',
+        headLen=148,
+        dataLen=2276,
+        verbose=ssfr.common.karg['verbose'],
+        ):
+
+    """
+    Follow (tail) LASP-SSFR files that are still being written by the instrument, e.g., for in-flight quicklook.
+
+    The byte offset of each file is tracked. At every poll, only the complete data records appended since
+    the last poll are read and decoded (a partial data record at the end of the file is left for the next
+    poll), and new files under <fdir> that match <pattern> are picked up (in the order of file names).
+
+    Input:
+        fdir: string, directory of the SSFR data files
+        pattern=: string, file name pattern; default='*.SKS'
+        interval=: float, time interval (in seconds) between polls when no new data records are found; default=10.0
+        timeout=: float, stop when no new data records are found within <timeout> seconds; default=None (follow forever)
+        skip_existing=: boolen, whether or not skip data records that are already in the files at start; default=False
+        which_time=: "ARINC" or "cRIO", time used for <jday>; default='arinc'
+        headLen=: integer, number of bytes for the header
+        dataLen=: integer, number of bytes for each data record
+
+    Output:
+        generator of batches of data records (one batch per file per poll), each batch is a Python dictionary
+        that contains the variables of decode_ssfr_rec and
+            fname  : file path of the data records
+            comment: comment in header
+            index  : (N,) indices of the data records in the file
+            jday   : (N,) julian days of <which_time>
+
+    How to use:
+    for data0 in follow_ssfr('/some/path/SSFR', interval=5.0):
+        print(data0['fname'], data0['jday'].size)
+    """
+
+    if dataLen != dtype_ssfr_rec.itemsize:
+        msg = '\nError [follow_ssfr]: <dataLen=%d> does not match the size of LASP-SSFR data record (%d bytes).' % (dataLen, dtype_ssfr_rec.itemsize)
+        raise OSError(msg)
+
+    if which_time.lower() not in ['arinc', 'crio']:
+        msg = '\nError [follow_ssfr]: <which_time=> only supports <\'arinc\'> or <\'crio\'>.'
+        raise ValueError(msg)
+    vname_time = {'arinc': 'jday_ARINC', 'crio': 'jday_cRIO'}[which_time.lower()]
+
+    # status of followed files, <fname>: [offset (bytes) of header, offset (bytes) of next data record, comment]
+    status = {}
+    if skip_existing:
+        for fname in sorted(glob.glob(os.path.join(fdir, pattern))):
+            if os.path.getsize(fname) >= headLen:
+                offset, comment = read_ssfr_head(fname, headLen=headLen)
+                Nrec = (os.path.getsize(fname)-offset) // dataLen
+                status[fname] = [offset, offset+Nrec*dataLen, comment]
+
+    time_last = time.time()
+    while True:
+
+        Nnew = 0
+        for fname in sorted(glob.glob(os.path.join(fdir, pattern))):
+
+            fileSize = os.path.getsize(fname)
+
+            # header can only be determined after it has been completely written
+            #/--------------------------------------------------------------\#
+            if fname not in status.keys():
+                if fileSize < headLen:
+                    continue
+                offset, comment = read_ssfr_head(fname, headLen=headLen)
+                status[fname] = [offset, offset, comment]
+                if verbose:
+                    msg = '\nMessage [follow_ssfr]: Following <%s> ...' % fname
+                    print(msg)
+            #\--------------------------------------------------------------/#
+
+            offset_head, offset, comment = status[fname]
+
+            if fileSize < offset:
+                msg = '\nWarning [follow_ssfr]: <%s> has been truncated, re-reading from the beginning ...' % fname
+                warnings.warn(msg)
+                offset_head, comment = read_ssfr_head(fname, headLen=headLen)
+                offset = offset_head
+                status[fname] = [offset_head, offset, comment]
+
+            Nrec = (fileSize-offset) // dataLen
+            if Nrec == 0:
+                continue
+
+            with open(fname, 'rb') as f:
+                f.seek(offset)
+                rec = np.frombuffer(f.read(Nrec*dataLen), dtype=dtype_ssfr_rec)
+            Nrec = rec.size
+
+            index_s = (offset-offset_head) // dataLen
+            status[fname][1] = offset + Nrec*dataLen
+
+            data0 = decode_ssfr_rec(rec)
+            data0['fname']   = fname
+            data0['comment'] = comment
+            data0['index']   = np.arange(index_s, index_s+Nrec)
+            data0['jday']    = data0[vname_time].copy()
+
+            Nnew += Nrec
+            yield data0
+
+        if Nnew > 0:
+            time_last = time.time()
+        else:
+            if (timeout is not None) and ((time.time()-time_last) >= timeout):
+                if verbose:
+                    msg = '\nMessage [follow_ssfr]: No new data records within %.1f seconds, stop following.' % timeout
+                    print(msg)
+                break
+            time.sleep(interval)
+
+
+
+
+def read_ssfr_task(task):
+
+    """
+    Decode a range of data records of a LASP-SSFR file into shared output buffers,
+    worker function used by read_ssfr(..., workers=N).
+
+    Input:
+        task: Python tuple of (fname, index, Nstart, Nend, buffers), where
+              index  : slice or numpy array, indices of data records to decode
+              Nstart : starting position in the output buffers
+              Nend   : ending position in the output buffers
+              buffers: Python dictionary of {vname: (file path, shape, dtype)} of the output buffers
+    """
+
+    fname, index, Nstart, Nend, buffers = task
+
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        comment, rec = load_ssfr_rec(fname)
+
+    data0 = {}
+    for vname, (fname_buf, shape, dtype) in buffers.items():
+        data0[vname] = np.memmap(fname_buf, dtype=dtype, mode='r+', shape=shape)[Nstart:Nend, ...]
+
+    decode_ssfr_rec(rec[index], data=data0)
+
+    for vname in data0.keys():
+        data0[vname].flush()
+
+    return Nend-Nstart
+
+
+
+
 class read_ssfr:
 
     ID = 'CU LASP SSFR'
@@ -209,11 +555,38 @@ class read_ssfr:
     count_base = -2**15
     count_ceil = 2**15
 
+    # bits of per-sample flag word (data_raw['flag'], uint8), e.g., saturation of zenith silicon
+    # is <(flag>>flag_bit['saturation|zen|si']) & 1>
+    flag_bit = {
+            'saturation|zen|si': 0,
+            'saturation|zen|in': 1,
+            'saturation|nad|si': 2,
+            'saturation|nad|in': 3,
+            'dark': 4,
+            'qual_flag': 5,
+            'dark_corr': 6,
+            }
+
+    # index of temperature (in data_raw['temp']) used for temperature dependent dark correction
+    # of each spectrometer, None to skip temperature dependent dark correction
+    temp_dark_corr = {
+            0: 1,
+            1: 1,
+            2: 2,
+            3: 2,
+            }
+
     def __init__(
             self,
             fnames,
             Ndata=2000,
             which_time='arinc',
+            jday_range=None,
+            tmhr_range=None,
+            step=1,
+            workers=None,
+            catalog=False,
+            dtype=np.float64,
             process=True,
             dark_corr_mode='interp',
             dark_fallback=True,
@@ -223,16 +596,32 @@ class read_ssfr:
             wvl_s=ssfr.common.ssfr_default['wvl_range'][0],
             wvl_e=ssfr.common.ssfr_default['wvl_range'][1],
             wvl_j=ssfr.common.ssfr_default['wvl_joint'],
+            dark_temp_coef=None,
+            keep=None,
             verbose=ssfr.common.karg['verbose'],
             ):
 
         '''
         Description:
         fnames      : list of SSFR files to read
-        Ndata=      : pre-defined number of data records (any number larger than the "number of data records per file" will work); default=600
+        Ndata=      : no longer used (kept for backward compatibility), number of data records is determined from file sizes
         which_time=  : "ARINC" or "cRIO"; default='arinc'
+        jday_range= : two elements Python list, e.g., [738999.5, 739000.0], only decode data records within the julian day range; default=None
+        tmhr_range= : two elements Python list, e.g., [15.0, 15.5], only decode data records within the time range (in hour, w.r.t. the date of the first data record); default=None
+        step=       : only decode every <step>-th data record (of each file), e.g., for quicklook; default=1
+        workers=    : number of processes for decoding files (and record ranges of large files) in parallel, also used as
+                      number of threads for dark correction (see dark_corr); default=None (serial)
+        catalog=    : whether or not use the per-file time index (see ssfr.util.get_raw_catalog) to only open files within <jday_range>/<tmhr_range>; default=False
+        dtype=      : data type of the processed counts, e.g., np.float32 for compact storage, where <count_raw> is kept
+                      as int16 (same as raw data) and dark corrected counts are stored in float32 (dark correction is
+                      still calculated in float64); default=np.float64
         process=    : whether or not process data, e.g., dark correction; default=True
-        dark_corr_mode=: dark correction mode, can be 'interp' or 'mean'; default='interp'
+        dark_corr_mode=: dark correction mode, can be 'interp', 'spline' (smooth B-spline dark baseline over all dark cycles) or 'mean'; default='interp'
+        dark_temp_coef=: temperature dependent dark model (self.dark_temp_coef) from another read_ssfr object of the same flight,
+                      reused instead of refitting when temperature anomaly is detected; default=None
+        keep=       : Python list of data cubes (N, 256, 4) to keep after processing, e.g., ['count_raw', 'spec'], can be
+                      'count_raw', 'saturation', 'count_dark-corr', 'count_per_ms_dark-corr' and 'spec' (self.data_spec),
+                      counts per ms are calculated in place when 'count_dark-corr' is not kept; default=None (keep all)
         verbose=    : verbose tag; default=False
         '''
 
@@ -248,6 +637,7 @@ class read_ssfr:
         #\----------------------------------------------------------------------------/#
 
         self.verbose = verbose
+        self.dtype   = np.dtype(dtype)
 
         # read in all the data
         # after the following process, the object will contain
@@ -271,69 +661,189 @@ class read_ssfr:
 
         self.data_raw['info'] = {}
         self.data_raw['info']['ssfr_tag'] = '%s' % (self.ID)
-        self.data_raw['info']['fnames']   = fnames
-
-        Nx         = Ndata * len(fnames)
-        comment    = []
-        count_raw  = np.zeros((Nx, self.Nchan, self.Nspec), dtype=np.float64)
-        shutter    = np.zeros(Nx                          , dtype=np.int32  )
-        int_time   = np.zeros((Nx, self.Nspec)            , dtype=np.float64)
-        temp       = np.zeros((Nx, self.Ntemp)            , dtype=np.float64)
-        qual_flag  = np.zeros(Nx                          , dtype=np.int32)
-        jday_ARINC = np.zeros(Nx                          , dtype=np.float64)
-        jday_cRIO  = np.zeros(Nx                          , dtype=np.float64)
+
+        # use catalog to select files within time range without opening the files
+        #/--------------------------------------------------------------\#
+        jday_ref = None
+        if catalog and ((jday_range is not None) or (tmhr_range is not None)):
+
+            catalog0 = ssfr.util.get_raw_catalog(fnames, which_raw='lasp|ssfr', verbose=self.verbose)
+
+            vname_time = {'arinc': 'jday_ARINC', 'crio': 'jday_cRIO'}[which_time.lower()]
+            Nrec = np.array([entry['Nrec'] for entry in catalog0])
+            if Nrec.sum() == 0:
+                msg = '\nError [read_ssfr]: No data records are found in <fnames>.'
+                raise OSError(msg)
+
+            jday_ref = catalog0[np.where(Nrec>0)[0][0]][vname_time][0]
+            if jday_range is None:
+                jday_range = [int(jday_ref)+tmhr_range[0]/24.0, int(jday_ref)+tmhr_range[-1]/24.0]
+
+            fnames = ssfr.util.select_raw_files(fnames, catalog0, jday_range, vname=vname_time)
+            if len(fnames) == 0:
+                msg = '\nError [read_ssfr]: No data records are found within <jday_range=[%.6f, %.6f]>.' % tuple(jday_range)
+                raise OSError(msg)
+        #\--------------------------------------------------------------/#
+
+        # map data records into memory, data are only decoded later on for the selected records
+        #/--------------------------------------------------------------\#
+        comment = []
+        recs    = []
+        for fname in fnames:
+            comment0, rec0 = load_ssfr_rec(fname)
+            comment.append(comment0)
+            recs.append(rec0)
+
+        Nrec = np.array([rec0.size for rec0 in recs])
+        if Nrec.sum() == 0:
+            msg = '\nError [read_ssfr]: No data records are found in <fnames>.'
+            raise OSError(msg)
+        #\--------------------------------------------------------------/#
+
+        # select data records by time range and step
+        #/--------------------------------------------------------------\#
+        if jday_ref is None:
+            jday_ref = get_ssfr_jday(recs[np.where(Nrec>0)[0][0]][:1], which_time=which_time)[0]
+        if (jday_range is None) and (tmhr_range is not None):
+            jday_range = [int(jday_ref)+tmhr_range[0]/24.0, int(jday_ref)+tmhr_range[-1]/24.0]
+
+        indices = []
+        for i, rec0 in enumerate(recs):
+
+            if (jday_range is None) or (rec0.size == 0):
+                indices.append(slice(None, None, step))
+                continue
+
+            jday_se0 = get_ssfr_jday(rec0[[0, -1]], which_time=which_time)
+            if (jday_se0.max() < jday_range[0]) or (jday_se0.min() > jday_range[-1]):
+                indices.append(slice(0, 0))
+            else:
+                jday0 = get_ssfr_jday(rec0, which_time=which_time)
+                indices.append(np.where((jday0>=jday_range[0]) & (jday0<=jday_range[-1]))[0][::step])
+
+        Nsel = np.array([index0.size if isinstance(index0, np.ndarray) else len(range(*index0.indices(rec0.size))) for rec0, index0 in zip(recs, indices)])
+        if Nsel.sum() == 0:
+            msg = '\nError [read_ssfr]: No data records are found within <jday_range=[%.6f, %.6f]>.' % tuple(jday_range)
+            raise OSError(msg)
+        #\--------------------------------------------------------------/#
+
+        # allocate exactly for the selected data records
+        # when <workers> is specified, output arrays are allocated in shared (file-backed) memory
+        # so that worker processes can decode data straight into them
+        #/--------------------------------------------------------------\#
+        if self.dtype == np.float64:
+            dtype_count = np.float64
+        else:
+            dtype_count = np.int16
+
+        Nx = Nsel.sum()
+        vars_info = {
+               'count_raw': ((Nx, self.Nchan, self.Nspec), dtype_count),
+                 'shutter': ((Nx,)                     , np.int32),
+                'int_time': ((Nx, self.Nspec)          , np.float64),
+                    'temp': ((Nx, self.Ntemp)          , np.float64),
+              'jday_ARINC': ((Nx,)                     , np.float64),
+               'jday_cRIO': ((Nx,)                     , np.float64),
+               'qual_flag': ((Nx,)                     , np.int32),
+                }
+
+        workers_read = workers
+        if (workers_read is not None) and (workers_read > 1):
+            nbytes = sum([int(np.prod(shape))*np.dtype(dtype).itemsize for shape, dtype in vars_info.values()])
+            fdir_shm = ssfr.util.get_shared_dir(nbytes)
+            if fdir_shm is None:
+                msg = '\nWarning [read_ssfr]: not enough space for shared buffers (%.1f MB), reading data in series ...' % (nbytes/1.0e6)
+                warnings.warn(msg)
+                workers_read = None
+        #\--------------------------------------------------------------/#
 
         Nfile = len(fnames)
         if self.verbose:
             msg = '\nMessage [read_ssfr]: Processing CU-LASP SSFR files (Total of %d):' % (Nfile)
             print(msg)
 
+        # decode data records at precomputed offsets, the records of large files are split into
+        # chunks (<Nchunk> records) when running in parallel
+        #/--------------------------------------------------------------\#
+        if (workers_read is None) or (workers_read <= 1):
+            Nchunk = Nx
+        else:
+            Nchunk = max(1000, int(np.ceil(Nx/(4.0*workers_read))))
+
+        tasks  = []
         Nstart = 0
         for i, fname in enumerate(fnames):
 
+            if Nsel[i] == 0:
+                if self.verbose:
+                    msg = '    skipping %3d/%3d <%s> ...' % (i+1, Nfile, fname)
+                    print(msg)
+                continue
+
             if self.verbose:
                 msg = '    reading %3d/%3d <%s> ...' % (i+1, Nfile, fname)
                 print(msg)
 
-            data0 = read_ssfr_raw(fname, verbose=False)
-
-            Nend = data0['iterN'] + Nstart
-
-            comment.append(data0['comment'])
-            count_raw[Nstart:Nend, ...]    = data0['count_raw']
-            shutter[Nstart:Nend, ...]    = data0['shutter']
-            int_time[Nstart:Nend, ...]   = data0['int_time']
-            temp[Nstart:Nend, ...]       = data0['temp']
-            jday_ARINC[Nstart:Nend, ...] = data0['jday_ARINC']
-            jday_cRIO[Nstart:Nend, ...]  = data0['jday_cRIO']
-            qual_flag[Nstart:Nend, ...]  = data0['qual_flag']
-
-            Nstart = Nend
-
-        self.data_raw['count_raw']    = count_raw[:Nend, ...]
-        self.data_raw['shutter']    = shutter[:Nend, ...]
-        self.data_raw['int_time']   = int_time[:Nend, ...]
-        self.data_raw['temp']       = temp[:Nend, ...]
-        self.data_raw['jday_a'] = jday_ARINC[:Nend, ...]
-        self.data_raw['jday_c']  = jday_cRIO[:Nend, ...]
-        self.data_raw['qual_flag']  = qual_flag[:Nend, ...]
-        self.data_raw['info']['comment'] = comment
+            for k0 in range(0, Nsel[i], Nchunk):
+                k1 = min(k0+Nchunk, Nsel[i])
+                if isinstance(indices[i], slice):
+                    index_s, index_e, index_step = indices[i].indices(recs[i].size)
+                    index0 = slice(index_s+k0*index_step, index_s+k1*index_step, index_step)
+                else:
+                    index0 = indices[i][k0:k1]
+                tasks.append((i, index0, Nstart+k0, Nstart+k1))
+
+            Nstart += Nsel[i]
+
+        if (workers_read is None) or (workers_read <= 1):
+            data_all = {vname: np.zeros(shape, dtype=dtype) for vname, (shape, dtype) in vars_info.items()}
+            for i, index0, Nstart0, Nend0 in tasks:
+                data0 = {vname: data_all[vname][Nstart0:Nend0, ...] for vname in data_all.keys()}
+                decode_ssfr_rec(recs[i][index0], data=data0)
+        else:
+            with ssfr.util.shared_buffers(vars_info, fdir=fdir_shm, prefix='ssfr_') as shm:
+                with concurrent.futures.ProcessPoolExecutor(max_workers=workers_read) as executor:
+                    list(executor.map(read_ssfr_task, [(fnames[i], index0, Nstart0, Nend0, shm.buffers) for i, index0, Nstart0, Nend0 in tasks]))
+                data_all = shm.detach()
+        #\--------------------------------------------------------------/#
+
+        count_raw  = data_all['count_raw']
+        shutter    = data_all['shutter']
+        int_time   = data_all['int_time']
+        temp       = data_all['temp']
+        jday_ARINC = data_all['jday_ARINC']
+        jday_cRIO  = data_all['jday_cRIO']
+        qual_flag  = data_all['qual_flag']
+
+        self.data_raw['info']['fnames']  = [fname for i, fname in enumerate(fnames) if Nsel[i]>0]
+        self.data_raw['count_raw']  = count_raw
+        self.data_raw['shutter']    = shutter
+        self.data_raw['int_time']   = int_time
+        self.data_raw['temp']       = temp
+        self.data_raw['jday_a']     = jday_ARINC
+        self.data_raw['jday_c']     = jday_cRIO
+        self.data_raw['qual_flag']  = qual_flag
+        self.data_raw['info']['comment'] = [comment0 for i, comment0 in enumerate(comment) if Nsel[i]>0]
         self.data_raw['info']['Ndata'] = self.data_raw['shutter'].size
 
         if which_time.lower() == 'arinc':
             self.data_raw['jday'] = self.data_raw['jday_a'].copy()
         elif which_time.lower() == 'crio':
             self.data_raw['jday'] = self.data_raw['jday_c'].copy()
-        self.data_raw['tmhr'] = (self.data_raw['jday'] - int(self.data_raw['jday'][0])) * 24.0
+        self.data_raw['tmhr'] = (self.data_raw['jday'] - int(jday_ref)) * 24.0
         #\----------------------------------------------------------------------------/#
 
         # process data
         #/----------------------------------------------------------------------------\#
         if process:
+            in_place = (keep is not None) and ('count_dark-corr' not in keep)
             self.dset_check()
-            self.dark_corr(dark_corr_mode=dark_corr_mode, dark_extend=dark_extend, light_extend=light_extend, dark_fallback=dark_fallback)
+            self.dark_corr(dark_corr_mode=dark_corr_mode, dark_extend=dark_extend, light_extend=light_extend, dark_fallback=dark_fallback, dark_temp_coef=dark_temp_coef, workers=workers, in_place=in_place)
             if which_ssfr is not None:
                 self.wvl_join(which_ssfr, wvl_start=wvl_s, wvl_end=wvl_e, wvl_join=wvl_j)
+
+        if keep is not None:
+            self.keep_data(keep)
         #\----------------------------------------------------------------------------/#
 
         if self.verbose:
@@ -342,24 +852,69 @@ class read_ssfr:
             msg = '\nMessage [read_ssfr]: Data processing complete (%s to %s).' % (dtime_s0, dtime_e0)
             print(msg)
 
+    def keep_data(self, keep):
+
+        """
+        Remove data cubes (N, 256, 4) that are not in <keep> (see read_ssfr), e.g., keep=['count_raw', 'spec']
+        """
+
+        for vname in ['count_raw', 'saturation', 'count_dark-corr', 'count_per_ms_dark-corr']:
+            if (vname not in keep) and (vname in self.data_raw.keys()):
+                del self.data_raw[vname]
+
+        if ('spec' not in keep) and hasattr(self, 'data_spec'):
+            del self.data_spec
+
     def dset_check(
             self,
             ):
 
         # saturation detection: if counts greater than the minimum dark counts or above
-        # 90% of the dynamic range (whichever the smallest) is determined as saturation
+        # 90% of the dynamic range (whichever the smallest) is determined as saturation,
+        # saturation is stored as boolean mask
         #/----------------------------------------------------------------------------\#
+        logic_dark = (self.data_raw['shutter']==1)
+
         dynamic_range = self.count_ceil-self.count_base
-        dark_min = self.data_raw['count_raw'][self.data_raw['shutter']==1].min()
+        dark_min = float(self.data_raw['count_raw'][logic_dark].min())
         manual_min = 0.1*dynamic_range+self.count_base
         count_saturation = self.count_ceil - min((dark_min, manual_min)) + self.count_base
-        self.data_raw['saturation'] = np.int_(self.data_raw['count_raw']>(count_saturation))
-        self.data_raw['saturation'][self.data_raw['shutter']==1, :, :] = 0
+        self.data_raw['saturation'] = np.greater(self.data_raw['count_raw'], count_saturation)
+        self.data_raw['saturation'][logic_dark, :, :] = False
+
+        # saturation of any channel for every sample and spectrometer
+        saturation = self.data_raw['saturation'].any(axis=1)
         #\----------------------------------------------------------------------------/#
 
-        self.data_raw['dset_num'] = np.zeros(self.data_raw['jday'].size, dtype=np.int32)
-        int_time_dset = np.unique(self.data_raw['int_time'], axis=0)
+        # per-sample flag word (see self.flag_bit)
+        #/----------------------------------------------------------------------------\#
+        flag = np.zeros(self.data_raw['shutter'].size, dtype=np.uint8)
+        for ispec in range(self.Nspec):
+            flag |= (saturation[:, ispec].astype(np.uint8) << self.flag_bit['saturation|%s' % self.spec_info[ispec]])
+        flag |= (logic_dark.astype(np.uint8) << self.flag_bit['dark'])
+        flag |= ((self.data_raw['qual_flag']!=1).astype(np.uint8) << self.flag_bit['qual_flag'])
+        self.data_raw['flag'] = flag
+        #\----------------------------------------------------------------------------/#
+
+        # group data by integration times with shutter cycle index (run-length encoded by
+        # shutter status and integration times, same as np.unique(int_time, axis=0, return_inverse=True))
+        #/----------------------------------------------------------------------------\#
+        cycle = self.get_shutter_cycle(update=True)
+
+        self.data_raw['dset_num'] = cycle.get_dset_num()
+        int_time_dset = cycle.int_time_set
         self.Ndset, _ = int_time_dset.shape
+
+        Ns = cycle.end - cycle.start
+        Ns_dset   = np.bincount(cycle.iset, weights=Ns, minlength=self.Ndset).astype(np.int64)
+        Ns_light  = np.bincount(cycle.iset, weights=Ns*(cycle.state==0), minlength=self.Ndset).astype(np.int64)
+        Ns_dark   = np.bincount(cycle.iset, weights=Ns*(cycle.state==1), minlength=self.Ndset).astype(np.int64)
+
+        Ns_saturation = np.zeros((self.Ndset, self.Nspec), dtype=np.int64)
+        for ispec in range(self.Nspec):
+            Ns_saturation[:, ispec] = np.bincount(self.data_raw['dset_num'], weights=saturation[:, ispec], minlength=self.Ndset)
+        #\----------------------------------------------------------------------------/#
+
         if self.verbose:
             msg = '\nMessage [read_ssfr]:\nTotal of %d sets of integration times were found:' % self.Ndset
             print(msg)
@@ -368,34 +923,49 @@ class read_ssfr:
         self.dset_info = {}
         for idset in range(self.Ndset):
 
-            # seperate data by integration times
-            #/----------------------------------------------------------------------------\#
-            logic = (self.data_raw['int_time'][:, 0] == int_time_dset[idset, 0]) & \
-                    (self.data_raw['int_time'][:, 1] == int_time_dset[idset, 1]) & \
-                    (self.data_raw['int_time'][:, 2] == int_time_dset[idset, 2]) & \
-                    (self.data_raw['int_time'][:, 3] == int_time_dset[idset, 3])
-
-            logic_light = logic & (self.data_raw['shutter']==0)
-            logic_dark  = logic & (self.data_raw['shutter']==1)
-
-            self.data_raw['dset_num'][logic] = idset
-
-            saturation = np.int_(np.sum(self.data_raw['saturation'][logic], axis=1)>0)
-            #\----------------------------------------------------------------------------/#
-
             dset_name = 'dset%d' % idset
-            paired_info = [item for pair in zip([self.spec_info[i] for i in range(self.Nspec)], int_time_dset[idset, :], np.sum(saturation, axis=0)) for item in pair]
+            paired_info = [item for pair in zip([self.spec_info[i] for i in range(self.Nspec)], int_time_dset[idset, :], Ns_saturation[idset, :]) for item in pair]
             if self.verbose:
                 msg = '    %-6s (%5d samples, %5d lights and %5d darks):\n\
          %s=%3dms (%5d saturated)\n\
          %s=%3dms (%5d saturated)\n\
          %s=%3dms (%5d saturated)\n\
-         %s=%3dms (%5d saturated)' % (dset_name, logic.sum(), logic_light.sum(), logic_dark.sum(), *paired_info)
+         %s=%3dms (%5d saturated)' % (dset_name, Ns_dset[idset], Ns_light[idset], Ns_dark[idset], *paired_info)
                 print(msg)
 
             self.dset_info[dset_name] = {self.spec_info[i]:int_time_dset[idset, i] for i in range(self.Nspec)}
         #\----------------------------------------------------------------------------/#
 
+    def get_shutter_cycle(
+            self,
+            update=False,
+            ):
+
+        """
+        Shutter cycle index (see ssfr.corr.shutter_cycle) built from data_raw['shutter'] and data_raw['int_time'],
+        it is cached as self.cycle, use <update=True> to rebuild after data_raw is changed
+        """
+
+        if update or (getattr(self, 'cycle', None) is None) or (self.cycle.Nx != self.data_raw['shutter'].size):
+            self.cycle = ssfr.corr.shutter_cycle(self.data_raw['shutter'], int_time=self.data_raw['int_time'])
+
+        return self.cycle
+
+    def map_threads(self, func, tasks, workers=None):
+
+        """
+        Apply <func> to <tasks> with a thread pool (NumPy releases GIL for heavy operations),
+        results are returned in the order of <tasks>
+        """
+
+        if (workers is None) or (workers <= 1) or (len(tasks) <= 1):
+            return [func(task) for task in tasks]
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=min(workers, len(tasks))) as executor:
+            results = list(executor.map(func, tasks))
+
+        return results
+
     def dark_corr(
             self,
             dark_corr_mode='interp',
@@ -404,9 +974,19 @@ class read_ssfr:
             fill_value=np.nan,
             dark_fallback=True,
             temp_threshold=25.0,
+            dark_temp_coef=None,
+            workers=None,
+            in_place=False,
             ):
 
         """
+        in_place=: whether or not calculate counts per ms in place of dark corrected counts, where data_raw['count_dark-corr']
+                   is not kept (saves one data cube); default=False
+        workers=: number of threads for processing (spectrometer, integration time) groups in parallel; default=None (serial)
+        dark_temp_coef=: Python dictionary, e.g., {'zen|si': {150.0: coef}}, coefficients (6, 256) of temperature
+                         dependent dark model for each spectrometer and integration time, reused instead of refitting;
+                         fitted coefficients are stored in self.dark_temp_coef
+
         shutter =
           0: 'open', shutter open, taking light measurements
 
@@ -434,67 +1014,138 @@ class read_ssfr:
         shutter_dark_corr_spec = np.zeros((self.data_raw['shutter'].size, self.Nspec), dtype=self.data_raw['shutter'].dtype)
         shutter_dark_corr_spec[...] = shutter_mode['unknown']
 
-        count_dark_corr = np.zeros_like(self.data_raw['count_raw'])
+        count_dark_corr = np.zeros(self.data_raw['count_raw'].shape, dtype=self.dtype)
         count_dark_corr[...] = fill_value
 
-        fail_list = []
-        total = self.data_raw['count_raw'].size
-        count = 0
+        shutter  = self.data_raw['shutter']
+        tmhr     = self.data_raw['tmhr']
+        int_time = self.data_raw['int_time']
+
+        cycle = self.get_shutter_cycle()
+
+        if dark_temp_coef is None:
+            dark_temp_coef = {}
+        self.dark_temp_coef = {self.spec_info[ispec]:{} for ispec in range(self.Nspec)}
 
         # go through each spectrometer and every integration time
         # linear interpolation is default for dark correction when two neighbouring
         # dark cycles are found. When there are no two adjacent dark cycles:
         # 1) only one: fill in with average darks (done within the ssfr.corr.dark_corr)
         # 2) no darks: fill in with average darks (done in this function when dark_fallback=True)
+        #
+        # samples are grouped by (spectrometer, integration time) with index arrays from the
+        # cached shutter cycle index (see get_shutter_cycle), data are corrected in place of
+        # <count_dark_corr> (per spectrometer view), groups are independent (disjoint samples)
+        # and can be processed by a thread pool (workers=)
         #/----------------------------------------------------------------------------\#
-        for ispec in range(self.Nspec):
-            int_time = np.unique(self.data_raw['int_time'][:, ispec])
-            for int_time0 in int_time:
-                logic = (self.data_raw['int_time'][:, ispec]==int_time0)
-                logic_light = (logic & ((self.data_raw['shutter']==shutter_mode['open'])))
-                logic_dark  = (logic & ((self.data_raw['shutter']==shutter_mode['close'])))
+        def dark_corr_group(task):
+
+            ispec, int_time0 = task
+
+            group = cycle.get_group(ispec=ispec, int_time0=int_time0, tolerance=0.0, dark_extend=dark_extend, light_extend=light_extend)
+            index = group['index']
+
+            result = {'ispec': ispec, 'int_time': int_time0, 'index': index, 'summary': None, 'coef': None, 'fail': None}
 
-                if logic_dark.sum() > 0:
+            if group['Ndark'] > 0:
+
+                # dark summary is only used by (and kept for) linear interpolation
+                if dark_corr_mode == 'interp':
+                    summary = ssfr.corr.get_dark_summary(tmhr, self.data_raw['count_raw'][:, :, ispec], group, index=index, shutter_mode=shutter_mode)
+                    result['summary'] = summary
+                else:
+                    summary = None
+
+                shutter_dark_corr_spec[index, ispec], _ = \
+                        ssfr.corr.dark_corr(
+                        tmhr,
+                        shutter,
+                        self.data_raw['count_raw'][:, :, ispec],
+                        mode=dark_corr_mode,
+                        dark_extend=dark_extend,
+                        light_extend=light_extend,
+                        shutter_mode=shutter_mode,
+                        fill_value=fill_value,
+                        index=index,
+                        out=count_dark_corr[:, :, ispec],
+                        cycle=group,
+                        summary=summary,
+                        )
+
+                if self.temp_dark_corr is not None:
+                    x_temp = self.data_raw['temp'][:, self.temp_dark_corr[ispec]]
+                    index_temp = index[x_temp[index]>temp_threshold]
+                else:
+                    index_temp = index[:0]
 
-                    shutter_dark_corr_spec[logic, ispec], count_dark_corr[logic, :, ispec] = \
+                if index_temp.size > 600:
+                    msg = '\nWarning [read_ssfr]: Temperature anomaly detected, performing temperature dependent dark correction for data with temperature >25 Celcius ...'
+                    warnings.warn(msg)
+                    coef = dark_temp_coef.get(self.spec_info[ispec], {}).get(int_time0, None)
+                    shutter_dark_corr_spec[index_temp, ispec], _, result['coef'] = \
                             ssfr.corr.dark_corr(
-                            self.data_raw['tmhr'][logic],
-                            self.data_raw['shutter'][logic],
-                            self.data_raw['count_raw'][logic, :, ispec],
-                            mode=dark_corr_mode,
+                            x_temp,
+                            shutter,
+                            self.data_raw['count_raw'][:, :, ispec],
+                            mode='temp',
                             dark_extend=dark_extend,
                             light_extend=light_extend,
                             shutter_mode=shutter_mode,
-                            fill_value=fill_value
+                            temp_threshold=temp_threshold,
+                            fill_value=fill_value,
+                            index=index_temp,
+                            out=count_dark_corr[:, :, ispec],
+                            coef=coef,
+                            return_coef=True,
                             )
 
-                    if ispec in [0, 1]:
-                        x_temp = self.data_raw['temp'][:, 1]
-                    elif ispec in [2, 3]:
-                        x_temp = self.data_raw['temp'][:, 2]
-                    logic_temp = logic & (x_temp>temp_threshold)
-
-                    if logic_temp.sum() > 600:
-                        msg = '\nWarning [read_ssfr]: Temperature anomaly detected, performing temperature dependent dark correction for data with temperature >25 Celcius ...'
-                        warnings.warn(msg)
-                        shutter_dark_corr_spec[logic_temp, ispec], count_dark_corr[logic_temp, :, ispec] = \
-                                ssfr.corr.dark_corr(
-                                x_temp[logic_temp],
-                                self.data_raw['shutter'][logic_temp],
-                                self.data_raw['count_raw'][logic_temp, :, ispec],
-                                mode='temp',
-                                dark_extend=dark_extend,
-                                light_extend=light_extend,
-                                shutter_mode=shutter_mode,
-                                temp_threshold=temp_threshold,
-                                fill_value=fill_value
-                                )
+            else:
 
-                else:
+                index_light = index[shutter[index]==shutter_mode['open']]
+                msg = '\nWarning [read_ssfr]: cannot find corresponding darks for %s=%3dms at indices\n    %s' % (self.spec_info[ispec], int_time0, index_light)
+                warnings.warn(msg)
+                result['fail'] = index_light
 
-                    msg = '\nWarning [read_ssfr]: cannot find corresponding darks for %s=%3dms at indices\n    %s' % (self.spec_info[ispec], int_time0, np.where(logic_light)[0])
-                    warnings.warn(msg)
-                    fail_list.append([ispec, int_time0, logic_light])
+            return result
+
+        tasks = [(ispec, int_time0) for ispec in range(self.Nspec) for int_time0 in np.unique(cycle.int_time_set[:, ispec])]
+        results = self.map_threads(dark_corr_group, tasks, workers=workers)
+
+        fail_list = []
+        dark_summary = []
+        for result in results:
+            if result['summary'] is not None:
+                dark_summary.append([result['ispec'], result['int_time'], result['index'], result['summary']])
+            if result['coef'] is not None:
+                self.dark_temp_coef[self.spec_info[result['ispec']]][result['int_time']] = result['coef']
+            if result['fail'] is not None:
+                fail_list.append([result['ispec'], result['int_time'], result['fail']])
+        #\----------------------------------------------------------------------------/#
+
+
+        # dark cycle summary table (one row per dark cycle of every spectrometer and integration time,
+        # empty unless dark_corr_mode='interp'),
+        # dark offsets can be rebuilt from the table for any light sample without raw counts, e.g.,
+        #   logic = (self.dark_summary['ispec']==0) & (self.dark_summary['int_time']==150.0)
+        #   dark  = ssfr.corr.cal_dark_offset(tmhr, {key: self.dark_summary[key][logic] for key in self.dark_summary.keys()})
+        #/----------------------------------------------------------------------------\#
+        self.dark_summary = {
+                'ispec'   : np.zeros(0, dtype=np.int32),
+                'int_time': np.zeros(0, dtype=np.float64),
+                'index_s' : np.zeros(0, dtype=np.int64),
+                'index_e' : np.zeros(0, dtype=np.int64),
+                }
+        vnames = ['n', 'x_s', 'x_e', 'x_mean', 'sxx', 'y_mean', 'sxy', 'syy']
+        for vname in vnames:
+            self.dark_summary[vname] = np.zeros((0,)+((self.Nchan,) if vname in ['y_mean', 'sxy', 'syy'] else ()), dtype=np.float64)
+
+        if len(dark_summary) > 0:
+            self.dark_summary['ispec']    = np.concatenate([np.repeat(item[0], item[3]['n'].size).astype(np.int32) for item in dark_summary])
+            self.dark_summary['int_time'] = np.concatenate([np.repeat(item[1], item[3]['n'].size).astype(np.float64) for item in dark_summary])
+            self.dark_summary['index_s']  = np.concatenate([item[2][item[3]['range'][:, 0]] for item in dark_summary])
+            self.dark_summary['index_e']  = np.concatenate([item[2][item[3]['range'][:, 1]-1]+1 for item in dark_summary])
+            for vname in vnames:
+                self.dark_summary[vname] = np.concatenate([item[3][vname] for item in dark_summary], axis=0)
         #\----------------------------------------------------------------------------/#
 
 
@@ -503,33 +1154,39 @@ class read_ssfr:
         #this piece might causing issues
         if dark_fallback:
 
-            for item in fail_list:
+            def dark_fallback_group(item):
 
-                ispec, int_time0, logic_light = item
+                ispec, int_time0, index_light = item
 
-                logic_dark = (shutter_dark_corr_spec[:, ispec] == shutter_mode['close'])
-                darks = (self.data_raw['count_raw'][logic_dark, :, ispec]-self.count_base) / (self.data_raw['int_time'][logic_dark, np.newaxis, ispec]) * int_time0 + self.count_base
+                index_dark = np.where(shutter_dark_corr_spec[:, ispec] == shutter_mode['close'])[0]
+                darks = (self.data_raw['count_raw'][index_dark, :, ispec].astype(np.float64)-self.count_base) / (int_time[index_dark, np.newaxis, ispec]) * int_time0 + self.count_base
                 dark_mean = np.mean(darks, axis=0)
 
-                shutter_dark_corr_spec[logic_light, ispec] = shutter_mode['fallback']
-                count_dark_corr[logic_light, :, ispec] = self.data_raw['count_raw'][logic_light, :, ispec] - dark_mean[np.newaxis, :]
-                msg = '\nWarning [read_ssfr]: using average darks for %s=%3dms (where no darks were found) at indices\n    %s' % (self.spec_info[ispec], int_time0, np.where(logic_light)[0])
+                count_dark_corr[index_light, :, ispec] = self.data_raw['count_raw'][index_light, :, ispec] - dark_mean[np.newaxis, :]
+                msg = '\nWarning [read_ssfr]: using average darks for %s=%3dms (where no darks were found) at indices\n    %s' % (self.spec_info[ispec], int_time0, index_light)
                 warnings.warn(msg)
+
+            # darks (shutter status of 'close') are taken before any fallback status is assigned
+            self.map_threads(dark_fallback_group, fail_list, workers=workers)
+            for ispec, int_time0, index_light in fail_list:
+                shutter_dark_corr_spec[index_light, ispec] = shutter_mode['fallback']
         #\----------------------------------------------------------------------------/#
 
 
         # since dark correction is performed over different spectrometers seperately,
         # we only keep the when correction for four spectrometers are all successful
         #/----------------------------------------------------------------------------\#
-        shutter_dark_corr = np.zeros_like(self.data_raw['shutter'])
+        logic_same = np.all(shutter_dark_corr_spec==shutter_dark_corr_spec[:, [0]], axis=-1)
+        shutter_dark_corr = np.zeros_like(shutter)
         shutter_dark_corr[...] = shutter_mode['unknown']
-        for key in shutter_mode.keys():
-            if key != 'unknown':
-                shutter_dark_corr[np.sum(shutter_dark_corr_spec==shutter_mode[key], axis=-1)==self.Nspec] = shutter_mode[key]
+        shutter_dark_corr[logic_same] = shutter_dark_corr_spec[logic_same, 0]
 
         logic_fill = (shutter_dark_corr>0)
         count_dark_corr[logic_fill, :, :] = fill_value
 
+        if 'flag' in self.data_raw.keys():
+            self.data_raw['flag'] |= ((shutter_dark_corr!=shutter_mode['open']).astype(np.uint8) << self.flag_bit['dark_corr'])
+
         if self.verbose:
             msg = '\nMessage [read_ssfr]:'
             print(msg)
@@ -540,8 +1197,13 @@ class read_ssfr:
         #\----------------------------------------------------------------------------/#
 
         self.data_raw['shutter_dark-corr'] = shutter_dark_corr
-        self.data_raw['count_dark-corr'] = count_dark_corr
-        self.data_raw['count_per_ms_dark-corr'] = count_dark_corr / self.data_raw['int_time'][:, np.newaxis, :]
+        if in_place:
+            np.divide(count_dark_corr, self.data_raw['int_time'][:, np.newaxis, :], out=count_dark_corr)
+            self.data_raw['count_per_ms_dark-corr'] = count_dark_corr
+        else:
+            self.data_raw['count_dark-corr'] = count_dark_corr
+            self.data_raw['count_per_ms_dark-corr'] = np.zeros_like(count_dark_corr)
+            np.divide(count_dark_corr, self.data_raw['int_time'][:, np.newaxis, :], out=self.data_raw['count_per_ms_dark-corr'])
 
     def wvl_join(
             self,
@@ -579,22 +1241,26 @@ class read_ssfr:
         wvl_nad = wvl_nad[indices_sort_nad]
         #\----------------------------------------------------------------------------/#
 
-        # processing data (unit counts: [counts/ms])
+        # processing data (unit counts: [counts/ms]), counts and saturation of zenith/nadir are
+        # gathered with one precomputed index of the flattened (channel, spectrometer) axes
         #/----------------------------------------------------------------------------\#
-        saturation = self.data_raw['saturation'].copy()
-        saturation[self.data_raw['shutter_dark-corr']!=0, ...] = 0
+        Nchan, Nspec = self.data_raw['count_per_ms_dark-corr'].shape[1:]
+        xchan = np.arange(Nchan)
 
-        counts_zen = np.hstack((self.data_raw['count_per_ms_dark-corr'][:, logic_zen_si, 0], self.data_raw['count_per_ms_dark-corr'][:, logic_zen_in, 1]))
-        counts_nad = np.hstack((self.data_raw['count_per_ms_dark-corr'][:, logic_nad_si, 2], self.data_raw['count_per_ms_dark-corr'][:, logic_nad_in, 3]))
+        index_zen = np.concatenate((xchan[logic_zen_si]*Nspec+0, xchan[logic_zen_in]*Nspec+1))[indices_sort_zen]
+        index_nad = np.concatenate((xchan[logic_nad_si]*Nspec+2, xchan[logic_nad_in]*Nspec+3))[indices_sort_nad]
 
-        saturation_zen = np.hstack((saturation[:, logic_zen_si, 0], saturation[:, logic_zen_in, 1]))
-        saturation_nad = np.hstack((saturation[:, logic_nad_si, 2], saturation[:, logic_nad_in, 3]))
+        counts = self.data_raw['count_per_ms_dark-corr'].reshape((-1, Nchan*Nspec))
+        counts_zen = np.take(counts, index_zen, axis=1)
+        counts_nad = np.take(counts, index_nad, axis=1)
 
-        counts_zen = counts_zen[:, indices_sort_zen]
-        counts_nad = counts_nad[:, indices_sort_nad]
+        saturation = self.data_raw['saturation'].reshape((-1, Nchan*Nspec))
+        saturation_zen = np.take(saturation, index_zen, axis=1)
+        saturation_nad = np.take(saturation, index_nad, axis=1)
 
-        saturation_zen = saturation_zen[:, indices_sort_zen]
-        saturation_nad = saturation_nad[:, indices_sort_nad]
+        logic_bad = (self.data_raw['shutter_dark-corr']!=0)
+        saturation_zen[logic_bad, :] = False
+        saturation_nad[logic_bad, :] = False
 
         self.data_spec = {}
         self.data_spec['wvl_zen'] = wvl_zen
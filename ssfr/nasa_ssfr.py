@@ -15,6 +15,10 @@ import ssfr
 
 
 __all__ = [
+           'get_ssfr_wvl', \
+           'decode_ssfr_rec', \
+           'load_ssfr_rec', \
+           'cat_ssfr_raw', \
            'read_ssfr_raw', \
            'read_ssfr', \
            'get_ssfr_wavelength'
@@ -22,6 +26,65 @@ __all__ = [
 
 
 
+# binary layout of one NASA-SSFR data record (2124 bytes, little endian, no padding),
+# see ssfr.common.rec_layout['nasa|ssfr']
+#/--------------------------------------------------------------\#
+dtype_ssfr_rec = ssfr.util.get_rec_dtype('nasa|ssfr')
+#\--------------------------------------------------------------/#
+
+
+
+def cal_jday_ssfr(btime):
+
+    """
+    Julian days (w.r.t 0001-01-01) from seconds since 1970-01-01, same as
+    (datetime(1970, 1, 1) + timedelta(seconds=btime) - datetime(1, 1, 1)).total_seconds()/86400.0 + 1.0
+    """
+
+    # 719162: number of days from 0001-01-01 to 1970-01-01
+    seconds = np.asarray(btime, dtype=np.int64) + 719162*86400
+
+    return seconds.astype(np.float64)/86400.0 + 1.0
+
+def cat_ssfr_raw(fname, headLen=0, dataLen=2124):
+
+    """
+    Catalog entry (see ssfr.util.get_raw_catalog) of a NASA-SSFR data file (.OSA2)
+
+    Output:
+        Python dictionary that contains
+            Nrec       : number of data records
+            jday       : julian days of first and last data records
+            day_counts : number of data records on each (integer) julian day
+            int_time   : sets of integration times (order of 'zen_si, zen_in, nad_si, nad_in')
+            Ncycle     : number of light and dark shutter cycles
+    """
+
+    if dataLen != dtype_ssfr_rec.itemsize:
+        msg = '\nError [cat_ssfr_raw]: <dataLen=%d> does not match NASA-SSFR record size (%d bytes).' % (dataLen, dtype_ssfr_rec.itemsize)
+        raise OSError(msg)
+
+    rec  = ssfr.util.load_rec(fname, 'nasa|ssfr', headLen=headLen)
+    Nrec = rec.size
+
+    entry = {'Nrec': int(Nrec)}
+
+    if Nrec > 0:
+        jday = cal_jday_ssfr(rec['btime'][:, 0])
+        jday_unique, counts = np.unique(np.int_(jday), return_counts=True)
+
+        entry['jday']       = [float(jday[0]), float(jday[-1])]
+        entry['day_counts'] = {str(day0): int(count0) for day0, count0 in zip(jday_unique, counts)}
+        entry['int_time']   = np.unique(rec['int_time'], axis=0).tolist()
+        entry['Ncycle']     = ssfr.lasp_ssfr.cal_shutter_cycle(rec['shsw'])
+    else:
+        entry['jday']       = []
+        entry['day_counts'] = {}
+        entry['int_time']   = []
+        entry['Ncycle']     = ssfr.lasp_ssfr.cal_shutter_cycle(np.zeros(0, dtype=np.int32))
+
+    return entry
+
 def get_ssfr_wavelength(chanNum=256):
 
     xChan = np.arange(chanNum)
@@ -51,6 +114,84 @@ def get_ssfr_wavelength(chanNum=256):
 
     return wvl_dict
 
+def get_ssfr_wvl(which_ssfr='nasa|ssfr-6', Nchan=256):
+
+    """
+    Wavelengths of the four spectrometers (same as get_ssfr_wavelength, coefficients are from ssfr/data/wvl/wvl_coef.dat)
+    """
+
+    return ssfr.lasp_ssfr.get_ssfr_wvl(which_ssfr, Nchan=Nchan)
+
+def decode_ssfr_rec(rec, data=None):
+
+    """
+    Decode NASA-SSFR data records in bulk.
+
+    Input:
+        rec: numpy structured array of <dtype_ssfr_rec>, e.g., read by np.memmap
+        data=: Python dictionary of pre-allocated arrays (same keys as output) to write into; default=None
+
+    Output:
+        Python dictionary that contains
+            count_raw (numpy array)[N/A]: (N, 256, 4), order of 'zen_si, zen_in, nad_si, nad_in'
+            shutter   (numpy array)[N/A]: (N,)
+            int_time  (numpy array)[ms] : (N, 4)
+            temp      (numpy array)[N/A]: (N, 8)
+            jday      (numpy array)[day]: (N,)
+            qual_flag (numpy array)[N/A]: (N,)
+    """
+
+    if data is None:
+        Ndata = rec.size
+        data = {
+               'count_raw': np.zeros((Ndata, 256, 4), dtype=np.float64),
+                 'shutter': np.zeros(Ndata          , dtype=np.int32),
+                'int_time': np.zeros((Ndata, 4)     , dtype=np.float64),
+                    'temp': np.zeros((Ndata, 8)     , dtype=np.float64),
+                    'jday': np.zeros(Ndata          , dtype=np.float64),
+               'qual_flag': np.zeros(Ndata          , dtype=np.int32),
+                }
+
+    # transpose: change shape from (4, 256) to (256, 4)
+    data['count_raw'][...] = np.transpose(rec['count'], axes=(0, 2, 1))
+    data['shutter'][...]   = rec['shsw']
+    data['int_time'][...]  = rec['int_time']
+    data['temp'][...]      = rec['temp']
+    data['jday'][...]      = cal_jday_ssfr(rec['btime'][:, 0])
+    data['qual_flag'][...] = 1
+
+    return data
+
+def load_ssfr_rec(fname, headLen=0, dataLen=2124):
+
+    """
+    Map the data records of a NASA-SSFR file (.OSA2) into memory (np.memmap) without decoding them.
+
+    Output:
+        rec: numpy memmap of <dtype_ssfr_rec> with shape of (iterN,)
+    """
+
+    ssfr.util.if_file_exists(fname, exitTag=True)
+
+    filename = os.path.basename(fname)
+    filetype = filename.split('.')[-1].lower()
+    if filetype != 'osa2':
+        msg = '\nError [load_ssfr_rec]: Do not support <%s>.' % filetype
+        raise OSError(msg)
+
+    if dataLen != dtype_ssfr_rec.itemsize:
+        msg = '\nError [load_ssfr_rec]: <dataLen=%d> does not match NASA-SSFR record size (%d bytes).' % (dataLen, dtype_ssfr_rec.itemsize)
+        raise OSError(msg)
+
+    fileSize = os.path.getsize(fname)
+    if fileSize <= headLen:
+        msg = '\nError [load_ssfr_rec]: <%s> has invalid file size.' % fname
+        raise OSError(msg)
+
+    rec = ssfr.util.load_rec(fname, 'nasa|ssfr', headLen=headLen)
+
+    return rec
+
 def read_ssfr_raw(fname, headLen=0, dataLen=2124, verbose=False):
 
     '''
@@ -73,73 +214,17 @@ def read_ssfr_raw(fname, headLen=0, dataLen=2124, verbose=False):
     by Hong Chen (hong.chen@lasp.colorado.edu), Sebastian Schmidt (sebastian.schmidt@lasp.colorado.edu)
     '''
 
-    ssfr.util.if_file_exists(fname, exitTag=True)
+    rec   = load_ssfr_rec(fname, headLen=headLen, dataLen=dataLen)
+    iterN = rec.size
 
-    filename = os.path.basename(fname)
-    filetype = filename.split('.')[-1].lower()
-    if filetype != 'osa2':
-        msg = '\nError [read_ssfr_raw]: Do not support <%s>.' % filetype
-        raise OSError(msg)
+    data0 = decode_ssfr_rec(rec)
 
-    fileSize = os.path.getsize(fname)
-    if fileSize > headLen:
-        iterN   = (fileSize-headLen) // dataLen
-        residual = (fileSize-headLen) %  dataLen
-        if residual != 0:
-            msg = '\nWarning [read_ssfr_raw]: <%s> contains unreadable data, omit the last data record...' % fname
-            warnings.warn(msg)
-    else:
-        msg = '\nError [read_ssfr_raw]: <%s> has invalid file size.' % fname
-        raise OSError(msg)
-
-    spectra    = np.zeros((iterN, 256, 4), dtype=np.float64) # spectra
-    shutter    = np.zeros(iterN          , dtype=np.int32  ) # shutter status (1:closed, 0:open)
-    int_time   = np.zeros((iterN, 4)     , dtype=np.float64) # integration time [ms]
-    temp       = np.zeros((iterN, 8)     , dtype=np.float64) # temperature
-    qual_flag  = np.ones(iterN           , dtype=np.int32)   # quality flag (1:good, 0:bad)
-    jday       = np.zeros(iterN          , dtype=np.float64)
-
-    # +++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
-    # 2l1   : btime
-    # 12B   : bcdtimstp(12)
-    # 6l    : intime1, intime2, intime3, intime4, accum, shsw
-    # 8L    : zsit, nsit, zirt, nirt, zirx, nirx, xt, it
-    # 1024h : zspecsi(256), zspecir(256), nspecsi(256), nspecir(256)
-    # ---------------------------------------------------------------------------------------------------------------
-    binFmt  = '<2l12B6l8L1024h'
-
-    spectra    = np.zeros((iterN, 256, 4), dtype=np.float64) # spectra
-    shutter    = np.zeros(iterN          , dtype=np.int32  ) # shutter status (1:closed, 0:open)
-    int_time   = np.zeros((iterN, 4)     , dtype=np.float64) # integration time [ms]
-    temp       = np.zeros((iterN, 8)     , dtype=np.float64) # temperature
-    qual_flag  = np.ones(iterN           , dtype=np.int32)   # quality flag (1:good, 0:bad)
-    jday       = np.zeros(iterN          , dtype=np.float64)
-
-    f           = open(fname, 'rb')
-
-    # +++++++++++++++++++++++++++ read head ++++++++++++++++++++++++++++++
-    if headLen > 0:
-        headRec   = f.read(headLen)
-    # --------------------------------------------------------------------
-
-    # read data record
-    for i in range(iterN):
-        dataRec = f.read(dataLen)
-
-        data     = struct.unpack(binFmt, dataRec)
-
-        dataSpec = np.transpose(np.array(data[28:]).reshape((4, 256)))
-        # 0, 1, 2, 3 represent 'sz, iz, sn, in'
-        # transpose: change shape from (4, 256) to (256, 4)
-
-        spectra[i, :, :]  = dataSpec
-        shutter[i]        = data[19]
-        int_time[i, :]    = np.array(data[14:18])
-        temp[i, :]        = np.array(data[20:28])
-
-        # calculate the proleptic Gregorian ordinal of the date
-        dtime      = datetime.datetime(1970, 1, 1) + datetime.timedelta(seconds=data[0])
-        jday[i]    = (dtime  - datetime.datetime(1, 1, 1)).total_seconds() / 86400.0 + 1.0
+    spectra    = data0['count_raw']  # spectra, 0, 1, 2, 3 represent 'sz, iz, sn, in'
+    shutter    = data0['shutter']    # shutter status (1:closed, 0:open)
+    int_time   = data0['int_time']   # integration time [ms]
+    temp       = data0['temp']       # temperature
+    qual_flag  = data0['qual_flag']  # quality flag (1:good, 0:bad)
+    jday       = data0['jday']       # julian day
 
     data_ = {
           'spectra' : spectra,
@@ -153,19 +238,28 @@ def read_ssfr_raw(fname, headLen=0, dataLen=2124, verbose=False):
 
     return data_
 
-class read_ssfr:
+class read_ssfr(ssfr.lasp_ssfr.read_ssfr):
 
     """
-    Read NASA Ames SSFR data files (.OSA2) into read_ssfr object
+    Read NASA Ames SSFR data files (.OSA2) into read_ssfr object, data are processed
+    with the same engine as LASP SSFR (see ssfr.lasp_ssfr.read_ssfr), i.e., dset_check,
+    dark_corr (per spectrometer and integration time) and wvl_join
 
     input:
         fnames: Python list, file paths of the data
+        fname_raw=: string, file path of processed HDF5 data (legacy), data are loaded instead of reading <fnames>
+        date_ref=: datetime.datetime object, reference date for tmhr; default=None (most frequent date)
         tmhr_range=: two elements Python list, e.g., [0, 24], starting and ending time in hours to slice the data
-        Ndata=: maximum number of data records per data file
-        time_offset=: float, time offset in seconds
+        Ndata=: no longer used (kept for backward compatibility), number of data records is determined from file sizes
+        time_add_offset=: float, time offset in seconds
+        catalog=: whether or not use the per-file time index (see ssfr.util.get_raw_catalog) to only read files within <tmhr_range>
+        process=: whether or not process data (dset_check, dark_corr and wvl_join); default=True
+        which_ssfr=: string, SSFR tag for wavelength; default='nasa|ssfr-6'
 
     Output:
         read_ssfr object that contains
+                .data_raw : Python dictionary (same as ssfr.lasp_ssfr.read_ssfr)
+                .data_spec: Python dictionary (same as ssfr.lasp_ssfr.read_ssfr, after process)
                 .jday     : julian day
                 .tmhr     : time in hour
                 .spectra  : ssfr spectra
@@ -175,7 +269,46 @@ class read_ssfr:
                 .qual_flag: quality flags
     """
 
-    def __init__(self, fnames, fname_raw=None, date_ref=None, tmhr_range=None,  Ndata=600, time_add_offset=0.0, verbose=False):
+    ID = 'NASA Ames SSFR'
+    Nchan = 256
+    Ntemp = 8
+    Nspec = 4
+    spec_info = {
+            0: 'zen|si',
+            1: 'zen|in',
+            2: 'nad|si',
+            3: 'nad|in',
+            }
+    count_base = 0
+    count_ceil = 2**15
+
+    # temperatures of NASA SSFR are not calibrated, no temperature dependent dark correction
+    temp_dark_corr = None
+
+    def __init__(
+            self,
+            fnames,
+            fname_raw=None,
+            date_ref=None,
+            tmhr_range=None,
+            Ndata=600,
+            time_add_offset=0.0,
+            catalog=False,
+            process=True,
+            dark_corr_mode='interp',
+            dark_fallback=True,
+            dark_extend=1,
+            light_extend=1,
+            which_ssfr='nasa|ssfr-6',
+            wvl_s=ssfr.common.ssfr_default['wvl_range'][0],
+            wvl_e=ssfr.common.ssfr_default['wvl_range'][1],
+            wvl_j=ssfr.common.ssfr_default['wvl_joint'],
+            verbose=False,
+            ):
+
+        self.verbose = verbose
+        self.dtype   = np.dtype(np.float64)
+        self.which_ssfr = which_ssfr
 
         if fname_raw is not None:
             data_v0 = ssfr.util.load_h5(fname_raw)
@@ -189,131 +322,176 @@ class read_ssfr:
             self.zen_wvl = data_v0['zen_wvl']
             self.zen_int_time = data_v0['zen_int_time']
 
-        else:
-
+            self.data_raw  = {'info': {'fname_raw': fname_raw}}
+            self.data_spec = {
+                    'wvl_zen': self.zen_wvl,
+                    'cnt_zen': self.zen_cnt / self.zen_int_time,
+                    'wvl_nad': self.nad_wvl,
+                    'cnt_nad': self.nad_cnt / self.nad_int_time,
+                    }
+            return
+
+        if len(fnames) == 0:
+            msg = '\nError [read_ssfr]: No files are found in <fnames>.'
+            raise OSError(msg)
+
+        # select files within tmhr_range using catalog, reference julian day is determined from all the files
+        # (note: day counts in catalog do not include <time_add_offset>, when the offset is non-zero,
+        #  the reference day is determined from the offset times of all the files instead)
+        # ++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
+        jdayRef = None
+        if catalog and (tmhr_range is not None):
+            catalog0 = ssfr.util.get_raw_catalog(fnames, which_raw='nasa|ssfr', verbose=verbose)
+            if date_ref is None:
+                if time_add_offset == 0.0:
+                    jdayRef = ssfr.util.get_catalog_day_ref(catalog0)
+                else:
+                    jday_int = np.int_(np.concatenate([cal_jday_ssfr(load_ssfr_rec(fname)['btime'][:, 0]) + time_add_offset/86400.0 for fname in fnames]))
+                    jday_unique, counts = np.unique(jday_int, return_counts=True)
+                    jdayRef = jday_unique[np.argmax(counts)]
+            else:
+                jdayRef = (date_ref-datetime.datetime(1, 1, 1)).total_seconds()/86400.0 + 1.0
+            jday_range = [jdayRef+tmhr_range[0]/24.0, jdayRef+tmhr_range[1]/24.0]
+            fnames = ssfr.util.select_raw_files(fnames, catalog0, jday_range, vname='jday', time_offset=time_add_offset/86400.0)
             if len(fnames) == 0:
-                sys.exit('Error   [read_ssfr]: No files are found in \'fnames\'.')
-
-            # initialize
-            # ++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
-            Nx         = Ndata * len(fnames)
-            spectra    = np.zeros((Nx, 256, 4), dtype=np.float64) # spectra
-            shutter    = np.zeros(Nx          , dtype=np.int32  ) # shutter status (1:closed, 0:open)
-            int_time   = np.zeros((Nx, 4)     , dtype=np.float64) # integration time [ms]
-            temp       = np.zeros((Nx, 8)     , dtype=np.float64) # temperature
-            qual_flag  = np.zeros(Nx          , dtype=np.int32)
-            jday       = np.zeros(Nx          , dtype=np.float64)
-            # ------------------------------------------------------------------------------------------
-
-            # read in data file by file
-            # ++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
-            Nstart = 0
-            for fname in fnames:
-
-                data0 = read_ssfr_raw(fname)
-                Nend = data0['iterN'] + Nstart
-                spectra[Nstart:Nend, ...]    = data0['spectra']
-                shutter[Nstart:Nend, ...]    = data0['shutter']
-                int_time[Nstart:Nend, ...]   = data0['int_time']
-                temp[Nstart:Nend, ...]       = data0['temp']
-                jday[Nstart:Nend, ...]       = data0['jday']
-                qual_flag[Nstart:Nend, ...]  = data0['qual_flag']
-                Nstart = Nend
-            # ------------------------------------------------------------------------------------------
-
-            # remove redundant data
-            # ++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
-            spectra    = spectra[:Nend, ...]
-            shutter    = shutter[:Nend, ...]
-            int_time   = int_time[:Nend, ...]
-            temp       = temp[:Nend, ...]
-            jday       = jday[:Nend, ...]
-            qual_flag  = qual_flag[:Nend, ...]
-            # ------------------------------------------------------------------------------------------
-
-            # correct time by adding time_add_offset
-            # ++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
-            jday    = jday + time_add_offset/86400.0
-            # ------------------------------------------------------------------------------------------
-
-            # find the most frequent julian day
-            # ++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
+                msg = '\nError [read_ssfr]: No data records are found within <tmhr_range=[%.4f, %.4f]>.' % tuple(tmhr_range)
+                raise OSError(msg)
+        # ------------------------------------------------------------------------------------------
+
+        # map data records into memory, only time is decoded before selecting data records
+        # ++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
+        recs  = [load_ssfr_rec(fname) for fname in fnames]
+        jdays = [cal_jday_ssfr(rec['btime'][:, 0]) + time_add_offset/86400.0 for rec in recs]
+        # ------------------------------------------------------------------------------------------
+
+        # find the most frequent julian day (already determined from catalog if used)
+        # ++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
+        if jdayRef is None:
             if date_ref is None:
-                jday_int = np.int_(jday)
+                jday_int = np.int_(np.concatenate(jdays))
                 jday_unique, counts = np.unique(jday_int, return_counts=True)
                 jdayRef = jday_unique[np.argmax(counts)]
             else:
                 jdayRef = (date_ref-datetime.datetime(1, 1, 1)).total_seconds()/86400.0 + 1.0
-            # ------------------------------------------------------------------------------------------
-
-            # calculate tmhr: time in hour
-            # ++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
-            tmhr    = (jday-jdayRef)*24.0
-            # ------------------------------------------------------------------------------------------
+        # ------------------------------------------------------------------------------------------
 
-            # slice data using input time_range
-            # ++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
+        # select data records using input tmhr_range
+        # ++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
+        indices = []
+        for jday0 in jdays:
             if tmhr_range is not None:
-                logic = (tmhr>=tmhr_range[0]) & (tmhr<=tmhr_range[1])
+                tmhr0 = (jday0-jdayRef)*24.0
+                indices.append(np.where((tmhr0>=tmhr_range[0]) & (tmhr0<=tmhr_range[1]))[0])
             else:
-                logic = (jday>=0.0)
-            # ------------------------------------------------------------------------------------------
-
-            # add data to the attributes
-            # ++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
-            self.jday       = jday[logic]
-            self.tmhr       = tmhr[logic]
-            self.spectra    = spectra[logic, ...]
-            self.shutter    = shutter[logic, ...]
-            self.int_time   = int_time[logic, ...]
-            self.temp       = temp[logic, ...]
-            self.qual_flag  = qual_flag[logic, ...]
-            # ------------------------------------------------------------------------------------------
-
-    def process_data(self, wvl_join=950.0, wvl_start=350.0, wvl_end=2200.0, intTime={'si':60, 'in':300}):
-
-        wvls = get_ssfr_wavelength()
-
-        # zenith
-        logic_si = (wvls['zenith_si'] >= wvl_start) & (wvls['zenith_si'] <= wvl_join)
-        logic_in = (wvls['zenith_in'] >  wvl_join)  & (wvls['zenith_in'] <= wvl_end)
-
-        wvl_data = np.concatenate((wvls['zenith_si'][logic_si], wvls['zenith_in'][logic_in]))
-        cnt_data = np.hstack((self.spectra[:, logic_si, 0], self.spectra[:, logic_in, 1]))
-
-        indices_sort  = np.argsort(wvl_data)
-        self.zen_wvl  = wvl_data[indices_sort]
-        self.zen_int_time  = np.concatenate((np.repeat(intTime['si'], logic_si.sum()), np.repeat(intTime['in'], logic_in.sum())))
-        tmp, self.zen_cnt  = ssfr.corr.dark_corr(self.tmhr, self.shutter, cnt_data[:, indices_sort])
-
-        # nadir
-        logic_si = (wvls['nadir_si'] >= wvl_start) & (wvls['nadir_si'] <= wvl_join)
-        logic_in = (wvls['nadir_in'] >  wvl_join)  & (wvls['nadir_in'] <= wvl_end)
-
-        wvl_data = np.concatenate((wvls['nadir_si'][logic_si], wvls['nadir_in'][logic_in]))
-        cnt_data = np.hstack((self.spectra[:, logic_si, 2], self.spectra[:, logic_in, 3]))
-
-        indices_sort  = np.argsort(wvl_data)
-        self.nad_wvl  = wvl_data[indices_sort]
-        self.nad_int_time  = np.concatenate((np.repeat(intTime['si'], logic_si.sum()), np.repeat(intTime['in'], logic_in.sum())))
-        tmp, self.nad_cnt  = ssfr.corr.dark_corr(self.tmhr, self.shutter, cnt_data[:, indices_sort])
+                indices.append(np.arange(jday0.size))
+
+        Nsel = np.array([index0.size for index0 in indices])
+        Nx = Nsel.sum()
+        # ------------------------------------------------------------------------------------------
+
+        # allocate exactly for the selected data records and decode
+        # ++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
+        self.data_raw = {}
+        self.data_raw['info'] = {}
+        self.data_raw['info']['ssfr_tag'] = '%s' % (self.ID)
+        self.data_raw['info']['fnames']   = [fname for i, fname in enumerate(fnames) if Nsel[i]>0]
+
+        data_all = {
+               'count_raw': np.zeros((Nx, self.Nchan, self.Nspec), dtype=np.float64),
+                 'shutter': np.zeros(Nx                     , dtype=np.int32),
+                'int_time': np.zeros((Nx, self.Nspec)          , dtype=np.float64),
+                    'temp': np.zeros((Nx, self.Ntemp)          , dtype=np.float64),
+                    'jday': np.zeros(Nx                     , dtype=np.float64),
+               'qual_flag': np.zeros(Nx                     , dtype=np.int32),
+                }
+
+        Nstart = 0
+        for i, rec in enumerate(recs):
+            Nend = Nstart + Nsel[i]
+            data0 = {vname: data_all[vname][Nstart:Nend, ...] for vname in data_all.keys()}
+            decode_ssfr_rec(rec[indices[i]], data=data0)
+            data0['jday'][...] = jdays[i][indices[i]]
+            Nstart = Nend
+
+        self.data_raw.update(data_all)
+        self.data_raw['info']['Ndata'] = Nx
+        self.data_raw['tmhr'] = (self.data_raw['jday']-jdayRef)*24.0
+        # ------------------------------------------------------------------------------------------
+
+        # add data to the attributes
+        # ++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
+        self.jday       = self.data_raw['jday']
+        self.tmhr       = self.data_raw['tmhr']
+        self.spectra    = self.data_raw['count_raw']
+        self.shutter    = self.data_raw['shutter']
+        self.int_time   = self.data_raw['int_time']
+        self.temp       = self.data_raw['temp']
+        self.qual_flag  = self.data_raw['qual_flag']
+        # ------------------------------------------------------------------------------------------
+
+        if process:
+            self.process_data(wvl_join=wvl_j, wvl_start=wvl_s, wvl_end=wvl_e, which_ssfr=which_ssfr, dark_corr_mode=dark_corr_mode, dark_extend=dark_extend, light_extend=light_extend, dark_fallback=dark_fallback)
+
+    def process_data(
+            self,
+            wvl_join=950.0,
+            wvl_start=350.0,
+            wvl_end=2200.0,
+            intTime=None,
+            which_ssfr='nasa|ssfr-6',
+            dark_corr_mode='interp',
+            dark_extend=1,
+            light_extend=1,
+            dark_fallback=True,
+            ):
+
+        """
+        Process data with dset_check, dark_corr and wvl_join (<intTime> is no longer used, integration
+        times are taken from the data), after processing, the object also contains (same as legacy <fname_raw=>)
+                .zen_wvl, .nad_wvl: wavelength
+                .zen_cnt, .nad_cnt: dark corrected counts
+                .zen_int_time, .nad_int_time: integration time of every channel, counts per ms are <zen_cnt/zen_int_time>
+                                              (same as self.data_spec['cnt_zen'])
+        """
+
+        self.dset_check()
+        self.dark_corr(dark_corr_mode=dark_corr_mode, dark_extend=dark_extend, light_extend=light_extend, dark_fallback=dark_fallback)
+        self.wvl_join(which_ssfr, wvl_start=wvl_start, wvl_end=wvl_end, wvl_join=wvl_join)
+
+        # silicon channels are below <wvl_join> (see wvl_join)
+        self.zen_wvl = self.data_spec['wvl_zen']
+        self.zen_int_time = self.int_time[:, np.where(self.zen_wvl<=wvl_join, 0, 1)]
+        self.zen_cnt = self.data_spec['cnt_zen'] * self.zen_int_time
+
+        self.nad_wvl = self.data_spec['wvl_nad']
+        self.nad_int_time = self.int_time[:, np.where(self.nad_wvl<=wvl_join, 2, 3)]
+        self.nad_cnt = self.data_spec['cnt_nad'] * self.nad_int_time
 
     def cal_flux(self, fnames, wvl0=550.0):
 
-        resp_zen = ssfr.cal.load_rad_resp_h5(fnames['zenith'])
-        self.zen_flux = np.zeros_like(self.zen_cnt)
+        """
+        Convert dark corrected counts (<zen_cnt/zen_int_time>, e.g., after cosine correction of <zen_cnt>)
+        to flux with secondary response
 
-        resp_nad = ssfr.cal.load_rad_resp_h5(fnames['nadir'])
-        self.nad_flux = np.zeros_like(self.nad_cnt)
+        Input:
+            fnames: Python dictionary, file paths of radiometric response for 'zenith' and 'nadir'
+            wvl0=: float, wavelength used to detect bad data (flux <= 0)
+        """
 
-        for i in range(self.tmhr.size):
+        resp_zen = ssfr.util.load_h5(fnames['zenith'])
+        resp_nad = ssfr.util.load_h5(fnames['nadir'])
 
-            self.zen_flux[i, :] = self.zen_cnt[i, :] / self.zen_int_time / resp_zen['sec_resp']
-            self.nad_flux[i, :] = self.nad_cnt[i, :] / self.nad_int_time / resp_nad['sec_resp']
+        self.zen_flux = self.zen_cnt / self.zen_int_time / resp_zen['sec_resp'][np.newaxis, :]
+        self.nad_flux = self.nad_cnt / self.nad_int_time / resp_nad['sec_resp'][np.newaxis, :]
+
+        if 'shutter_dark-corr' in self.data_raw.keys():
+            logic_bad = (self.data_raw['shutter_dark-corr']!=0)
+        else:
+            logic_bad = (self.shutter==1)
 
         index_zen = np.argmin(np.abs(self.zen_wvl-wvl0))
         index_nad = np.argmin(np.abs(self.nad_wvl-wvl0))
-        logic_bad = (self.shutter==1) | (self.zen_flux[:, index_zen]<=0.0) | (self.nad_flux[:, index_nad]<=0.0)
+        logic_bad = logic_bad | (self.zen_flux[:, index_zen]<=0.0) | (self.nad_flux[:, index_nad]<=0.0)
         self.zen_flux[logic_bad, :] = np.nan
         self.nad_flux[logic_bad, :] = np.nan
 
@@ -321,7 +499,6 @@ class read_ssfr:
 
 
 
-
 if __name__ == '__main__':
 
     pass
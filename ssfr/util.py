@@ -1,9 +1,14 @@
 import os
 import sys
 import glob
+import json
 import h5py
 import struct
+import warnings
 import fnmatch
+import hashlib
+import shutil
+import tempfile
 import pysolar
 from tqdm import tqdm
 from scipy import interpolate
@@ -12,6 +17,7 @@ import xml.etree.ElementTree as ET
 import numpy as np
 import datetime
 from scipy import stats
+from scipy import sparse
 
 import ssfr
 
@@ -20,6 +26,14 @@ import ssfr
 __all__ = [
         'get_all_files',
         'get_all_folders',
+        'get_raw_catalog',
+        'select_raw_files',
+        'get_catalog_day_ref',
+        'get_rec_dtype',
+        'load_rec',
+        'read_rec',
+        'get_shared_dir',
+        'shared_buffers',
         'if_file_exists',
         'cal_heading',
         'cal_solar_angles',
@@ -32,9 +46,12 @@ __all__ = [
         'interp',
         'load_h5',
         'save_h5',
+        'load_asset',
         'get_solar_kurudz',
         'get_slit_func',
         'cal_weighted_flux',
+        'get_slit_matrix',
+        'cal_slit_flux',
         'read_ict',
         'write_ict',
         'read_iwg_nsrc',
@@ -59,6 +76,337 @@ def get_all_folders(fdir, pattern='*'):
 
     return folders
 
+# cache of compiled record dtypes, see get_rec_dtype
+_rec_dtype = {}
+
+def get_rec_dtype(which_rec):
+
+    """
+    Compile binary record layout (see ssfr.common.rec_layout) into numpy structured dtype
+
+    Input:
+        which_rec: string, name of the record layout, e.g., 'lasp|ssfr', 'nasa|ssfr', 'lasp|alp', 'lasp|cg4'
+
+    Output:
+        numpy structured dtype (compiled dtype is cached)
+    """
+
+    if which_rec in _rec_dtype.keys():
+        return _rec_dtype[which_rec]
+
+    if which_rec not in ssfr.common.rec_layout.keys():
+        msg = '\nError [get_rec_dtype]: Cannot find record layout <%s>, please choose from %s.' % (which_rec, list(ssfr.common.rec_layout.keys()))
+        raise OSError(msg)
+
+    layout = ssfr.common.rec_layout[which_rec]
+
+    fields = []
+    for field in layout['fields']:
+        vname, vtype = field[:2]
+        if vtype in ssfr.common.rec_layout.keys():
+            vtype = get_rec_dtype(vtype)
+        fields.append((vname, vtype) + tuple(field[2:]))
+
+    dtype = np.dtype(fields)
+
+    if ('dataLen' in layout.keys()) and (dtype.itemsize != layout['dataLen']):
+        msg = '\nError [get_rec_dtype]: Size of <%s> record layout (%d bytes) does not match <dataLen=%d>.' % (which_rec, dtype.itemsize, layout['dataLen'])
+        raise OSError(msg)
+
+    _rec_dtype[which_rec] = dtype
+
+    return dtype
+
+def load_rec(fname, which_rec, headLen=None):
+
+    """
+    Map data records of a raw data file into memory (np.memmap) based on record layout (see get_rec_dtype),
+    data are only read from disk when accessed (e.g., rec['GPS_Time'])
+
+    Input:
+        fname: string, file path of the raw data
+        which_rec: string, name of the record layout, e.g., 'nasa|ssfr', 'lasp|alp', 'lasp|cg4'
+        headLen=: integer, number of bytes of the header; default=None (use <headLen> of the record layout)
+
+    Output:
+        rec: numpy memmap of structured dtype with shape of (iterN,)
+    """
+
+    if_file_exists(fname, exitTag=True)
+
+    dtype = get_rec_dtype(which_rec)
+    if headLen is None:
+        headLen = ssfr.common.rec_layout[which_rec].get('headLen', 0)
+
+    fileSize = os.path.getsize(fname)
+    if fileSize >= headLen:
+        iterN    = (fileSize-headLen) // dtype.itemsize
+        residual = (fileSize-headLen) %  dtype.itemsize
+        if residual != 0:
+            msg = '\nWarning [load_rec]: <%s> contains unreadable data, omit the last data record...' % fname
+            warnings.warn(msg)
+    else:
+        msg = '\nError [load_rec]: <%s> has invalid file size.' % fname
+        raise OSError(msg)
+
+    if iterN > 0:
+        rec = np.memmap(fname, dtype=dtype, mode='r', offset=headLen, shape=(iterN,))
+    else:
+        rec = np.zeros(0, dtype=dtype)
+
+    return rec
+
+def read_rec(fname, which_rec, vnames=None, headLen=None):
+
+    """
+    Read data records of a raw data file in bulk based on record layout (see get_rec_dtype),
+    only the fields in <vnames> are read
+
+    Input:
+        fname: string, file path of the raw data
+        which_rec: string, name of the record layout, e.g., 'nasa|ssfr', 'lasp|alp', 'lasp|cg4'
+        vnames=: Python list, field names to read; default=None (all fields)
+        headLen=: integer, number of bytes of the header; default=None (use <headLen> of the record layout)
+
+    Output:
+        data: Python dictionary, <vname>: numpy array with shape of (iterN, ...)
+    """
+
+    rec = load_rec(fname, which_rec, headLen=headLen)
+
+    if vnames is None:
+        vnames = rec.dtype.names
+
+    data = {}
+    for vname in vnames:
+        if vname not in rec.dtype.names:
+            msg = '\nError [read_rec]: Cannot find <%s> in <%s> record layout.' % (vname, which_rec)
+            raise OSError(msg)
+        data[vname] = np.array(rec[vname])
+
+    return data
+
+def get_shared_dir(nbytes, fdirs=None, margin=1.1):
+
+    """
+    Find a directory for shared (file-backed) buffers of <nbytes> bytes, memory-backed /dev/shm is
+    preferred, the default temporary directory (usually on disk) is used when /dev/shm cannot hold
+    the buffers (writing beyond tmpfs capacity kills the writing process with SIGBUS), readers fall
+    back to reading data in series when no directory has enough free space
+
+    Input:
+        nbytes: total number of bytes of the buffers
+        fdirs=: Python list of candidate directories; default=None (['/dev/shm', tempfile.gettempdir()])
+        margin=: required free space is <margin>*<nbytes>; default=1.1
+
+    Output:
+        directory path, None if no candidate has enough free space
+    """
+
+    if fdirs is None:
+        fdirs = ['/dev/shm', tempfile.gettempdir()]
+
+    for fdir in fdirs:
+        if os.path.isdir(fdir) and os.access(fdir, os.W_OK):
+            if shutil.disk_usage(fdir).free >= margin*nbytes:
+                return fdir
+
+    return None
+
+class shared_buffers:
+
+    """
+    Shared (file-backed) output arrays for worker processes, files are always removed on exit
+    (including errors and interrupts, a dead worker makes ProcessPoolExecutor raise BrokenProcessPool
+    instead of hanging), e.g.,
+
+        with shared_buffers({'data': ((N, 4), np.float64)}, fdir=get_shared_dir(N*4*8)) as shm:
+            # workers open shm.buffers['data'] = (file path, shape, dtype) with np.memmap(..., mode='r+')
+            data = shm.detach()['data']
+
+    Input:
+        vars_info: Python dictionary of {vname: (shape, dtype)}
+        fdir=: directory of the buffer files (see get_shared_dir); default=None (default temporary directory)
+        prefix=: prefix of the temporary directory; default='ssfr_'
+    """
+
+    def __init__(self, vars_info, fdir=None, prefix='ssfr_'):
+
+        self.vars_info = vars_info
+        self.fdir      = fdir
+        self.prefix    = prefix
+
+    def __enter__(self):
+
+        self.fdir_tmp = tempfile.mkdtemp(prefix=self.prefix, dir=self.fdir)
+        self.buffers = {vname: (os.path.join(self.fdir_tmp, '%s.bin' % vname), shape, dtype) for vname, (shape, dtype) in self.vars_info.items()}
+        try:
+            self.data = {vname: np.memmap(fname_buf, dtype=dtype, mode='w+', shape=shape) for vname, (fname_buf, shape, dtype) in self.buffers.items()}
+        except BaseException:
+            self.cleanup()
+            raise
+
+        return self
+
+    def detach(self):
+
+        """
+        Return the buffers as numpy arrays (contents stay mapped in memory after the files are removed)
+        """
+
+        return {vname: self.data[vname].view(np.ndarray) for vname in self.data.keys()}
+
+    def cleanup(self):
+
+        shutil.rmtree(self.fdir_tmp, ignore_errors=True)
+
+    def __exit__(self, exc_type, exc_value, traceback):
+
+        self.cleanup()
+
+        return False
+
+def get_raw_catalog(fnames, which_raw='lasp|ssfr', fname_cat='.ssfr_catalog.json', verbose=False):
+
+    """
+    Get per-file time index (catalog) of raw data files, e.g., LASP SSFR (.SKS), NASA SSFR (.OSA2) and ALP (.plt3)
+
+    Since raw data records have fixed length, the record count and the times of the first and last
+    data records (head and tail) can be obtained without decoding the whole file. The catalog entries
+    are saved in a sidecar file (<fname_cat>) under the directory of the raw files, an entry is
+    re-generated only when size or modification time of the raw file changes.
+
+    Input:
+        fnames: Python list, file paths of the raw data
+        which_raw=: string, 'lasp|ssfr', 'nasa|ssfr' or 'lasp|alp'; default='lasp|ssfr'
+        fname_cat=: string, file name of the sidecar catalog file; default='.ssfr_catalog.json'
+
+    Output:
+        catalog: Python list of catalog entries (Python dictionary) in the same order as <fnames>, check
+            ssfr.lasp_ssfr.cat_ssfr_raw
+            ssfr.nasa_ssfr.cat_ssfr_raw
+            ssfr.lasp_alp.cat_alp_raw
+        for the variables in the catalog entry
+    """
+
+    funcs = {
+            'lasp|ssfr': ssfr.lasp_ssfr.cat_ssfr_raw,
+            'nasa|ssfr': ssfr.nasa_ssfr.cat_ssfr_raw,
+             'lasp|alp': ssfr.lasp_alp.cat_alp_raw,
+            }
+
+    which_raw = which_raw.lower()
+    if which_raw not in funcs.keys():
+        msg = '\nError [get_raw_catalog]: <which_raw=\'%s\'> is not supported, please choose from %s.' % (which_raw, list(funcs.keys()))
+        raise OSError(msg)
+
+    # load sidecar catalog file(s), one per directory
+    #/----------------------------------------------------------------------------\#
+    cats = {}
+    for fname in fnames:
+        fdir = os.path.dirname(os.path.abspath(fname))
+        if fdir not in cats.keys():
+            fname_cat0 = os.path.join(fdir, fname_cat)
+            cats[fdir] = {'fname': fname_cat0, 'data': {}, 'update': False}
+            if os.path.exists(fname_cat0):
+                try:
+                    with open(fname_cat0, 'r') as f:
+                        cats[fdir]['data'] = json.load(f)
+                except (OSError, ValueError):
+                    msg = '\nWarning [get_raw_catalog]: Cannot read <%s>, catalog will be re-generated.' % fname_cat0
+                    warnings.warn(msg)
+    #\----------------------------------------------------------------------------/#
+
+    # get catalog entries, only files that are new or have been changed are read
+    #/----------------------------------------------------------------------------\#
+    catalog = []
+    for fname in fnames:
+
+        fdir = os.path.dirname(os.path.abspath(fname))
+        key  = os.path.basename(fname)
+        stat = os.stat(fname)
+
+        entry = cats[fdir]['data'].get(key, None)
+        if (entry is None) or (entry.get('which_raw', None) != which_raw) or \
+           (entry.get('size', None) != stat.st_size) or (entry.get('mtime', None) != stat.st_mtime_ns):
+
+            if verbose:
+                msg = '\nMessage [get_raw_catalog]: Indexing <%s> ...' % fname
+                print(msg)
+
+            entry = funcs[which_raw](fname)
+            entry['which_raw'] = which_raw
+            entry['size']  = stat.st_size
+            entry['mtime'] = stat.st_mtime_ns
+
+            cats[fdir]['data'][key] = entry
+            cats[fdir]['update'] = True
+
+        catalog.append(entry)
+    #\----------------------------------------------------------------------------/#
+
+    # save updated sidecar catalog file(s)
+    #/----------------------------------------------------------------------------\#
+    for fdir in cats.keys():
+        if cats[fdir]['update']:
+            fname_cat0 = cats[fdir]['fname']
+            try:
+                with open('%s.tmp' % fname_cat0, 'w') as f:
+                    json.dump(cats[fdir]['data'], f, indent=1)
+                os.replace('%s.tmp' % fname_cat0, fname_cat0)
+            except OSError:
+                msg = '\nWarning [get_raw_catalog]: Cannot write <%s>, catalog is not saved.' % fname_cat0
+                warnings.warn(msg)
+    #\----------------------------------------------------------------------------/#
+
+    return catalog
+
+def select_raw_files(fnames, catalog, time_range, vname='jday', time_offset=0.0):
+
+    """
+    Select raw data files that overlap with given time range based on catalog (see get_raw_catalog)
+
+    Input:
+        fnames: Python list, file paths of the raw data
+        catalog: Python list, catalog entries of <fnames>
+        time_range: two elements Python list, e.g., [738999.5, 739000.0], in the units of <vname>
+        vname=: string, time variable in catalog entry, e.g., 'jday_ARINC', 'jday_cRIO' for LASP SSFR, 'jday' for NASA SSFR, 'day' for ALP
+        time_offset=: float, time offset (in the units of <vname>) added to the catalog time
+
+    Output:
+        Python list, file paths that contain data records within <time_range>
+    """
+
+    fnames_sel = []
+    for fname, entry in zip(fnames, catalog):
+        if entry['Nrec'] > 0:
+            time_s0 = min(entry[vname]) + time_offset
+            time_e0 = max(entry[vname]) + time_offset
+            if (time_e0 >= time_range[0]) and (time_s0 <= time_range[-1]):
+                fnames_sel.append(fname)
+
+    return fnames_sel
+
+def get_catalog_day_ref(catalog):
+
+    """
+    Get the most frequent (integer) day from the <day_counts> of catalog entries (see get_raw_catalog)
+    """
+
+    counts = {}
+    for entry in catalog:
+        for day0, count0 in entry['day_counts'].items():
+            counts[int(day0)] = counts.get(int(day0), 0) + count0
+
+    if len(counts) == 0:
+        msg = '\nError [get_catalog_day_ref]: No data records are found in <catalog>.'
+        raise OSError(msg)
+
+    days = np.array(sorted(counts.keys()))
+    day_ref = days[np.argmax([counts[day0] for day0 in days])]
+
+    return day_ref
+
 def if_file_exists(fname, exitTag=True):
 
     """
@@ -272,6 +620,80 @@ def save_h5(fname, data):
 
     print('Message [save_h5]: Data has been successfully saved into \'%s\'.' % fname)
 
+_asset_cache = {}
+
+def load_asset(fname, reader=np.loadtxt, fdir_cache=None):
+
+    """
+    Load data file (e.g., files under ssfr/data) once per process, parsed data are memoized
+    and returned as read-only numpy arrays (copy before modifying)
+
+    Input:
+        fname: file path
+        reader=: function to parse the file, returns numpy array or Python dictionary of numpy arrays; default=np.loadtxt
+        fdir_cache=: directory to store/read binary (.npz) copy of the parsed data keyed by checksum
+                     of the source file; default=None (use ssfr.common.fdir_cache, disabled if None)
+
+    Output:
+        numpy array or Python dictionary of numpy arrays
+    """
+
+    fname = os.path.abspath(fname)
+    if not os.path.exists(fname):
+        msg = '\nError [load_asset]: cannot locate <%s>.' % fname
+        raise OSError(msg)
+
+    stat = os.stat(fname)
+    key  = (fname, reader.__module__, reader.__name__, stat.st_mtime_ns, stat.st_size)
+    if key in _asset_cache:
+        return _asset_cache[key]
+
+    if fdir_cache is None:
+        fdir_cache = ssfr.common.fdir_cache
+
+    data = None
+
+    # binary copy keyed by checksum of the source file
+    #/----------------------------------------------------------------------------\#
+    if fdir_cache is not None:
+        with open(fname, 'rb') as f:
+            checksum = hashlib.sha1(f.read()).hexdigest()
+        fname_npz = os.path.join(fdir_cache, '%s_%s_%s.npz' % (os.path.basename(fname), reader.__name__, checksum[:16]))
+
+        if os.path.exists(fname_npz):
+            with np.load(fname_npz) as f:
+                if '__array__' in f.files:
+                    data = f['__array__']
+                else:
+                    data = {vname: f[vname] for vname in f.files}
+    #\----------------------------------------------------------------------------/#
+
+    if data is None:
+        data = reader(fname)
+        if fdir_cache is not None:
+            # write to a temporary file first so that a partially written cache is never loaded
+            fname_tmp = '%s.%d.tmp' % (fname_npz, os.getpid())
+            try:
+                os.makedirs(fdir_cache, exist_ok=True)
+                with open(fname_tmp, 'wb') as f:
+                    if isinstance(data, dict):
+                        np.savez(f, **data)
+                    else:
+                        np.savez(f, __array__=data)
+                os.replace(fname_tmp, fname_npz)
+            except OSError:
+                if os.path.exists(fname_tmp):
+                    os.remove(fname_tmp)
+                msg = '\nWarning [load_asset]: Cannot write <%s>, cache is not saved.' % fname_npz
+                warnings.warn(msg)
+
+    for data0 in (data.values() if isinstance(data, dict) else [data]):
+        data0.flags.writeable = False
+
+    _asset_cache[key] = data
+
+    return data
+
 def get_slit_func(wvl, slit_func_file=None, wvl_joint=950.0):
 
     if slit_func_file is None:
@@ -280,7 +702,7 @@ def get_slit_func(wvl, slit_func_file=None, wvl_joint=950.0):
         else:
             slit_func_file = '%s/slit/nir_0.1nm_s.dat' % ssfr.common.fdir_data
 
-    data_slt = np.loadtxt(slit_func_file)
+    data_slt = load_asset(slit_func_file).copy()
 
     return data_slt
 
@@ -289,7 +711,7 @@ def get_solar_kurudz(kurudz_file=None):
     if kurudz_file is None:
         kurudz_file = '%s/solar/kurudz_0.1nm.dat' % ssfr.common.fdir_data
 
-    data_sol = np.loadtxt(kurudz_file)
+    data_sol = load_asset(kurudz_file).copy()
     data_sol[:, 1] /= 1000.0
 
     return data_sol
@@ -304,6 +726,99 @@ def cal_weighted_flux(wvl, data_wvl, data_flux, slit_func_file=None, wvl_joint=9
 
     return flux
 
+_slit_matrix_cache = OrderedDict()
+
+def get_slit_matrix(wvl, data_wvl, slit_func_file=None, wvl_joint=950.0, cache_size=16):
+
+    """
+    Build sparse slit-weight matrix (Nchan, Nhighres) so that the slit-weighted flux at SSFR
+    channel wavelengths <wvl> is <matrix @ data_flux>, equivalent to calling cal_weighted_flux
+    at every channel (including np.interp edge behavior)
+
+    Input:
+        wvl: SSFR channel wavelengths, float or 1D array
+        data_wvl: high resolution wavelengths (monotonically increasing), 1D array
+        slit_func_file=: slit function file, if None, vis/nir slit function is selected per
+                         channel by <wvl_joint>; default=None
+        wvl_joint=: joint wavelength of vis/nir slit functions; default=950.0
+        cache_size=: number of matrices kept in cache; default=16
+
+    Output:
+        scipy.sparse.csr_matrix of shape (Nchan, Nhighres)
+    """
+
+    wvl      = np.atleast_1d(np.asarray(wvl, dtype=np.float64))
+    data_wvl = np.asarray(data_wvl, dtype=np.float64)
+
+    key = (wvl.tobytes(), data_wvl.size, data_wvl[0], data_wvl[-1], hash(data_wvl.tobytes()), slit_func_file, wvl_joint)
+    if key in _slit_matrix_cache:
+        _slit_matrix_cache.move_to_end(key)
+        return _slit_matrix_cache[key]
+
+    Nchan = wvl.size
+    Ndata = data_wvl.size
+
+    # slit function (offset, weight) for every channel, loaded once per file
+    #/----------------------------------------------------------------------------\#
+    if slit_func_file is None:
+        fnames_slt = np.where(wvl<=wvl_joint, \
+                '%s/slit/vis_0.1nm_s.dat' % ssfr.common.fdir_data, \
+                '%s/slit/nir_0.1nm_s.dat' % ssfr.common.fdir_data)
+    else:
+        fnames_slt = np.repeat(slit_func_file, Nchan)
+
+    rows    = []
+    cols    = []
+    weights = []
+    for fname_slt in np.unique(fnames_slt):
+
+        ichan    = np.where(fnames_slt==fname_slt)[0]
+        data_slt = get_slit_func(wvl[ichan[0]], slit_func_file=fname_slt)
+
+        # sample locations and normalized weights, shape (Nchan_, Nslit)
+        wvl_x  = wvl[ichan, np.newaxis] + data_slt[np.newaxis, :, 0]
+        weight = np.broadcast_to(data_slt[:, 1]/data_slt[:, 1].sum(), wvl_x.shape)
+
+        # linear interpolation weights of the bracketing high resolution points
+        # (clamped to the end values beyond <data_wvl> as np.interp)
+        index = np.clip(np.searchsorted(data_wvl, wvl_x, side='right')-1, 0, Ndata-2)
+        frac  = np.clip((wvl_x-data_wvl[index])/(data_wvl[index+1]-data_wvl[index]), 0.0, 1.0)
+
+        irow = np.broadcast_to(ichan[:, np.newaxis], wvl_x.shape)
+        rows    += [irow.ravel(), irow.ravel()]
+        cols    += [index.ravel(), (index+1).ravel()]
+        weights += [(weight*(1.0-frac)).ravel(), (weight*frac).ravel()]
+    #\----------------------------------------------------------------------------/#
+
+    # duplicate (row, col) entries are summed
+    matrix = sparse.coo_matrix((np.concatenate(weights), (np.concatenate(rows), np.concatenate(cols))), shape=(Nchan, Ndata)).tocsr()
+
+    _slit_matrix_cache[key] = matrix
+    while len(_slit_matrix_cache) > cache_size:
+        _slit_matrix_cache.popitem(last=False)
+
+    return matrix
+
+def cal_slit_flux(wvl, data_wvl, data_flux, slit_func_file=None, wvl_joint=950.0):
+
+    """
+    Slit-weighted flux at SSFR channel wavelengths <wvl> from high resolution spectrum
+    (e.g., Kurucz solar spectrum, lamp file, model output), vectorized version of cal_weighted_flux
+
+    Input:
+        wvl: SSFR channel wavelengths, 1D array (Nchan,)
+        data_wvl: high resolution wavelengths, 1D array (Nhighres,)
+        data_flux: high resolution flux, 1D array (Nhighres,) or 2D array (Nhighres, Nspectra)
+
+    Output:
+        flux: 1D array (Nchan,) or 2D array (Nchan, Nspectra)
+    """
+
+    matrix = get_slit_matrix(wvl, data_wvl, slit_func_file=slit_func_file, wvl_joint=wvl_joint)
+    flux   = matrix @ np.asarray(data_flux)
+
+    return flux
+
 def dtime_to_jday(dtime):
 
     jday = (dtime - datetime.datetime(1, 1, 1)).total_seconds()/86400.0 + 1.0
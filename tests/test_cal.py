@@ -0,0 +1,172 @@
+import os
+import datetime
+import tempfile
+import warnings
+import h5py
+import numpy as np
+
+import ssfr
+
+
+
+
+def test_cal_slit_flux():
+
+    """
+    Slit-weighted flux from sparse slit matrix vs cal_weighted_flux at every channel
+    """
+
+    rng = np.random.default_rng(0)
+
+    data_wvl  = np.linspace(300.0, 2300.0, 4001)
+    data_flux = 1.0 + np.sin(data_wvl/37.0)**2 + 0.1*rng.random(data_wvl.size)
+
+    # include channels beyond the high resolution wavelengths (edge behavior of np.interp)
+    wvl = np.concatenate(([250.0, 2400.0], np.linspace(350.0, 2200.0, 300)))
+
+    flux0 = np.array([ssfr.util.cal_weighted_flux(wvl0, data_wvl, data_flux) for wvl0 in wvl])
+    flux1 = ssfr.util.cal_slit_flux(wvl, data_wvl, data_flux)
+    assert np.allclose(flux0, flux1, rtol=1e-12, atol=0.0)
+
+    # multiple spectra
+    flux2 = ssfr.util.cal_slit_flux(wvl, data_wvl, np.stack((data_flux, 2.0*data_flux), axis=-1))
+    assert flux2.shape == (wvl.size, 2)
+    assert np.allclose(flux2[:, 0], flux1, rtol=1e-12, atol=0.0)
+    assert np.allclose(flux2[:, 1], 2.0*flux1, rtol=1e-12, atol=0.0)
+
+    # single slit function file
+    fname_slit = os.path.join(ssfr.common.fdir_data, 'slit', 'nir_1nm_s.dat')
+    flux0 = np.array([ssfr.util.cal_weighted_flux(wvl0, data_wvl, data_flux, slit_func_file=fname_slit) for wvl0 in wvl])
+    flux1 = ssfr.util.cal_slit_flux(wvl, data_wvl, data_flux, slit_func_file=fname_slit)
+    assert np.allclose(flux0, flux1, rtol=1e-12, atol=0.0)
+
+
+
+def test_rad_resp_catalog():
+
+    """
+    Nearest-date selection of radiometric response files (ties go to the earlier date, files with
+    the same date go to the latest modified one)
+    """
+
+    fnames = {
+            'f1': '2024-03-29_lamp-1324|2024-03-29_lamp-150c|2024-05-01_lamp-150c|rad-resp|lasp|ssfr-a|zen|si-080|in-250.h5',
+            'f2': '2024-03-29_lamp-1324|2024-03-29_lamp-150c|2024-05-11_lamp-150c|rad-resp|lasp|ssfr-a|zen|si-080|in-250.h5',
+            'f3': '2024-03-29_lamp-1324|2024-03-29_lamp-150c_after|2024-05-11_lamp-150c|rad-resp|lasp|ssfr-a|zen|si-080|in-250.h5',
+            'f4': '2024-03-29_lamp-1324|2024-03-29_lamp-150c|2024-05-01_lamp-150c|rad-resp|lasp|ssfr-a|nad|si-080|in-250.h5',
+            }
+
+    with tempfile.TemporaryDirectory() as fdir:
+
+        for i, key in enumerate(sorted(fnames.keys())):
+            fname = os.path.join(fdir, fnames[key])
+            open(fname, 'w').close()
+            os.utime(fname, (1.7e9+i, 1.7e9+i))
+
+        # <f2> has the same date as <f3> but is modified later
+        fnames = {key: os.path.join(fdir, fnames[key]) for key in fnames.keys()}
+        os.utime(fnames['f2'], (1.8e9, 1.8e9))
+
+        cat0 = ssfr.cal.rad_resp_catalog(fdir)
+        assert len(cat0.entries) == 4
+
+        select = lambda date, which_lc='zen': cat0.select('lasp|ssfr-a', which_lc, [80, 250], date)
+
+        assert select(datetime.datetime(2024, 4, 1))  == fnames['f1']
+        assert select(datetime.datetime(2024, 5, 5))  == fnames['f1']
+        assert select(datetime.datetime(2024, 5, 6))  == fnames['f1']
+        assert select(datetime.datetime(2024, 5, 7))  == fnames['f2']
+        assert select(datetime.datetime(2024, 8, 1))  == fnames['f2']
+        assert select(datetime.datetime(2024, 8, 1), which_lc='nad') == fnames['f4']
+
+        try:
+            cat0.select('lasp|ssfr-a', 'zen', [120, 350], datetime.datetime(2024, 5, 1))
+        except OSError:
+            pass
+        else:
+            raise AssertionError('OSError is expected for missing integration times.')
+
+
+
+def test_cdata_ang_resp():
+
+    """
+    Angular response gridding (one interpolation for all channels) and polynomial fitting (one least
+    squares solve for all mu) vs per-channel interp1d and per-mu np.polyfit, files are read in series
+    and in parallel (<workers=>)
+    """
+
+    from scipy import interpolate
+    from test_raw import gen_lasp_ssfr
+
+    warnings.simplefilter('ignore')
+
+    fdir0 = os.getcwd()
+
+    with tempfile.TemporaryDirectory() as fdir:
+
+        # synthetic cosine response (channel dependent), noise-free constant darks
+        angles = [0, 0, 30, -30, 60, -60, 80, -80]
+        fnames = {}
+        for i, ang in enumerate(angles):
+            fname = os.path.join(fdir, 'ang_%d.SKS' % i)
+            resp = np.cos(np.deg2rad(ang))**(1.0+0.002*np.arange(256))
+            gen_lasp_ssfr(fname, Nrec=200, counts=lambda irec, ispec, shutter: 1000.0 + 20000.0*(1-shutter)*resp, seed=i)
+            fnames[fname] = ang
+
+        data = {}
+        os.chdir(fdir)
+        try:
+            for workers in [None, 2]:
+                fname_out = ssfr.cal.cdata_ang_resp(fnames, which_lc='zen', int_time={'si':80, 'in':80}, workers=workers, verbose=False)
+                with h5py.File(fname_out, 'r') as f:
+                    data[workers] = {key: f[key][...] for key in ['wvl', 'mu', 'ang_resp', 'ang_resp_int', 'poly_coef', 'raw/mu0']}
+                    for spec_tag in ['zen|si', 'zen|in']:
+                        for key in ['wvl', 'ang_resp', 'ang_resp0', 'ang_resp_std0']:
+                            data[workers]['raw/%s/%s' % (spec_tag, key)] = f['raw/%s/%s' % (spec_tag, key)][...]
+        finally:
+            os.chdir(fdir0)
+
+    for key in data[None].keys():
+        assert np.array_equal(data[None][key], data[2][key]), key
+
+    data0 = data[None]
+
+    ang_resp0 = np.cos(np.deg2rad(np.array(angles)))[:, np.newaxis]**(1.0+0.002*np.arange(256))
+    for spec_tag in ['zen|si', 'zen|in']:
+        assert np.allclose(data0['raw/%s/ang_resp' % spec_tag], ang_resp0, rtol=0.0, atol=1e-4)
+
+    # per-channel gridding and per-mu fitting
+    #/----------------------------------------------------------------------------\#
+    wvl_data = np.concatenate([data0['raw/zen|si/wvl'], data0['raw/zen|in/wvl']])
+    logic_wvl = np.concatenate([(data0['raw/zen|si/wvl']>=350.0) & (data0['raw/zen|si/wvl']<=950.0), (data0['raw/zen|in/wvl']>950.0) & (data0['raw/zen|in/wvl']<=2200.0)])
+
+    ang_resp_all = np.zeros((data0['mu'].size, 512), dtype=np.float64)
+    for i, spec_tag in enumerate(['zen|si', 'zen|in']):
+        for ichan in range(256):
+            f = interpolate.interp1d(data0['raw/mu0'], data0['raw/%s/ang_resp0' % spec_tag][:, ichan], fill_value='extrapolate')
+            ang_resp_all[:, i*256+ichan] = f(data0['mu'])
+
+    indices_sort = np.argsort(wvl_data[logic_wvl])
+    wvl      = wvl_data[logic_wvl][indices_sort]
+    ang_resp = ang_resp_all[:, logic_wvl][:, indices_sort]
+    assert np.array_equal(data0['wvl'], wvl)
+    assert np.allclose(data0['ang_resp'], ang_resp, rtol=1e-12, atol=1e-14)
+
+    trapezoid = getattr(np, 'trapezoid', None) or np.trapz
+    for i in range(wvl.size):
+        assert np.isclose(data0['ang_resp_int'][i], trapezoid(ang_resp[:, i], x=data0['mu']), rtol=1e-12, atol=1e-14)
+
+    logic = (wvl>=400.0) & (wvl<=2000.0)
+    for i in range(data0['mu'].size):
+        coef0 = np.polyfit(wvl[logic], ang_resp[i, logic], 4)
+        assert np.allclose(data0['poly_coef'][i, :], coef0, rtol=1e-6, atol=0.0), i
+    #\----------------------------------------------------------------------------/#
+
+
+
+if __name__ == '__main__':
+
+    test_cal_slit_flux()
+    test_rad_resp_catalog()
+    test_cdata_ang_resp()
@@ -0,0 +1,261 @@
+import warnings
+import numpy as np
+
+import ssfr
+
+
+
+
+def gen_shutter_data(seed=0, Ny=64):
+
+    """
+    Synthetic shutter time series (random light/dark cycle lengths, starts with light cycle and ends with
+    light cycle for odd <seed>) and counts with a drifting dark offset
+    """
+
+    rng = np.random.default_rng(seed)
+
+    Nrun = 60 + seed % 2
+
+    shutter = np.repeat(np.arange(Nrun) % 2, rng.integers(3, 60, Nrun)).astype(np.int32)
+    Nx = shutter.size
+
+    x = 20.0 + np.cumsum(rng.uniform(0.5, 1.5, Nx))/3600.0
+    data = rng.normal(100.0, 5.0, (Nx, Ny)) + 3.0*x[:, np.newaxis] + 50.0*(shutter==0)[:, np.newaxis]
+
+    return x, shutter, data
+
+
+
+def dark_corr_ref(x, shutter, data, dark_extend=1, light_extend=1):
+
+    """
+    Reference interp dark correction (per light cycle least-squares line through the darks of the
+    previous and next dark cycles, average darks of the nearest dark cycle at both ends)
+    """
+
+    cycle = ssfr.corr.get_dark_cycle(shutter, dark_extend=dark_extend, light_extend=light_extend)
+    index_dark = np.where(cycle['tag']==1)[0]
+
+    data_corr = np.zeros_like(data)
+    data_corr[...] = np.nan
+
+    for i in np.where(cycle['tag']==0)[0]:
+        il = index_dark[index_dark<i]
+        ir = index_dark[index_dark>i]
+        light = slice(*cycle['range'][i])
+
+        if il.size == 0:
+            dark = np.mean(data[slice(*cycle['range'][ir[0]]), :], axis=0)
+        elif ir.size == 0:
+            dark = np.mean(data[slice(*cycle['range'][il[-1]]), :], axis=0)
+        else:
+            index = np.r_[slice(*cycle['range'][il[-1]]), slice(*cycle['range'][ir[0]])]
+            x_mean = np.mean(x[index])
+            coef = np.polyfit(x[index]-x_mean, data[index, :], 1)
+            dark = coef[0, :]*(x[light]-x_mean)[:, np.newaxis] + coef[1, :]
+
+        data_corr[light, :] = data[light, :] - dark
+
+    return data_corr
+
+
+
+def test_dark_corr_interp():
+
+    """
+    Closed-form interp dark correction (dark summary) vs per-cycle least-squares fit
+    """
+
+    warnings.simplefilter('ignore')
+
+    for seed in range(4):
+        x, shutter, data = gen_shutter_data(seed=seed)
+        for dark_extend, light_extend in [(1, 1), (2, 2), (2, 3)]:
+            data0 = dark_corr_ref(x, shutter, data, dark_extend=dark_extend, light_extend=light_extend)
+            shutter1, data1 = ssfr.corr.dark_corr(x, shutter, data, mode='interp', dark_extend=dark_extend, light_extend=light_extend, shutter_mode={'open':0, 'close':1})
+
+            assert np.array_equal(np.isnan(data0), np.isnan(data1))
+            assert np.array_equal(np.isfinite(data1[:, 0]), np.isin(shutter1, [0, -10, -11]))
+            assert np.allclose(data0, data1, rtol=0.0, atol=1e-8, equal_nan=True)
+
+
+
+def test_shutter_cycle():
+
+    """
+    Groups of shutter_cycle (one spectrometer at one integration time) vs get_dark_cycle on the selected samples
+    """
+
+    rng = np.random.default_rng(1)
+
+    x, shutter, data = gen_shutter_data(seed=1)
+    Nx = shutter.size
+
+    int_time = np.zeros((Nx, 2), dtype=np.float64)
+    int_time[:, 0] = np.where(np.arange(Nx)<(Nx//2), 100.0, 200.0)
+    int_time[:, 1] = rng.choice([250.0, 300.0], Nx)
+
+    cycle = ssfr.corr.shutter_cycle(shutter, int_time=int_time)
+    assert np.array_equal(cycle.get_dset_num(), np.unique(int_time, axis=0, return_inverse=True)[1].ravel())
+
+    for ispec in range(int_time.shape[1]):
+        for int_time0 in np.unique(int_time[:, ispec]):
+            for dark_extend, light_extend in [(1, 1), (2, 3)]:
+                group = cycle.get_group(ispec=ispec, int_time0=int_time0, dark_extend=dark_extend, light_extend=light_extend)
+                index = np.where(int_time[:, ispec]==int_time0)[0]
+                cycle0 = ssfr.corr.get_dark_cycle(shutter[index], dark_extend=dark_extend, light_extend=light_extend)
+
+                assert np.array_equal(group['index'], index)
+                assert np.array_equal(group['range'], cycle0['range'])
+                assert np.array_equal(group['tag'], cycle0['tag'])
+                assert group['Ndark'] == (shutter[index]==1).sum()
+
+
+
+def test_fit_dark_temp():
+
+    """
+    Shared Vandermonde least-squares fit of temperature dependent darks vs np.polyfit/np.polyval per channel
+    """
+
+    warnings.simplefilter('ignore')
+
+    rng = np.random.default_rng(3)
+
+    for deg in [1, 3, 5]:
+        x = np.sort(rng.uniform(20.0, 40.0, 500))
+        y = rng.normal(0.0, 2.0, (x.size, 16)) + 0.02*(x[:, np.newaxis]-30.0)**3 + rng.uniform(100.0, 200.0, 16)
+
+        coef = ssfr.corr.fit_dark_temp(x, y, deg=deg)
+        assert coef.shape == (deg+1, y.shape[1])
+
+        x0 = np.linspace(20.0, 40.0, 50)
+        dark = ssfr.corr.cal_dark_temp(x0, coef)
+        for iChan in range(y.shape[1]):
+            coef0 = np.polyfit(x, y[:, iChan], deg)
+            assert np.allclose(coef[:, iChan], coef0, rtol=1e-6, atol=1e-10)
+            assert np.allclose(dark[:, iChan], np.polyval(coef0, x0), rtol=0.0, atol=1e-6)
+
+        # one channel (1D input)
+        assert np.allclose(ssfr.corr.fit_dark_temp(x, y[:, 0], deg=deg), np.polyfit(x, y[:, 0], deg), rtol=1e-6, atol=1e-10)
+
+
+
+def test_cal_dark_offset():
+
+    """
+    Dark offsets rebuilt from dark summary vs dark_corr(mode='interp') and dark_corr(mode='mean')
+    """
+
+    warnings.simplefilter('ignore')
+
+    for seed in range(4):
+        x, shutter, data = gen_shutter_data(seed=seed)
+
+        cycle = ssfr.corr.get_dark_cycle(shutter)
+        summary = ssfr.corr.get_dark_summary(x, data, cycle)
+
+        for mode in ['interp', 'mean']:
+            shutter0, data0 = ssfr.corr.dark_corr(x, shutter, data, mode=mode)
+            logic = np.isfinite(data0[:, 0]) & (shutter==0)
+
+            dark = ssfr.corr.cal_dark_offset(x[logic], summary, mode=mode)
+            assert np.allclose(data[logic, :]-dark, data0[logic, :], rtol=0.0, atol=1e-9)
+
+
+
+def test_dark_corr_stream():
+
+    """
+    Streaming dark correction fed in random batches vs dark_corr(mode='interp')
+    """
+
+    warnings.simplefilter('ignore')
+
+    rng = np.random.default_rng(2)
+
+    for seed in range(6):
+        x, shutter, data = gen_shutter_data(seed=seed)
+        Nx = shutter.size
+        dark_extend, light_extend = int(rng.integers(0, 3)), int(rng.integers(0, 3))
+
+        shutter_mode = {'open':0, 'close':1, 'interp_begin':-10, 'interp_end':-11, 'excluded':10}
+        shutter0, data0 = ssfr.corr.dark_corr(x, shutter, data, mode='interp', dark_extend=dark_extend, light_extend=light_extend, shutter_mode=dict(shutter_mode))
+
+        stream = ssfr.corr.dark_corr_stream(dark_extend=dark_extend, light_extend=light_extend)
+        data_out = []
+        i = 0
+        while i < Nx:
+            N = int(rng.integers(1, 200))
+            data_out.append(stream.feed(x[i:i+N], shutter[i:i+N], data[i:i+N, :]))
+            i += N
+        data_out.append(stream.flush())
+
+        index1   = np.concatenate([data_out0['index'] for data_out0 in data_out])
+        shutter1 = np.concatenate([data_out0['shutter'] for data_out0 in data_out])
+        data1    = np.concatenate([data_out0['data'].reshape((-1, data.shape[1])) for data_out0 in data_out], axis=0)
+
+        assert np.array_equal(index1, np.arange(Nx))
+        assert np.array_equal(shutter0, shutter1)
+        assert np.allclose(data0, data1, rtol=0.0, atol=1e-9, equal_nan=True)
+
+
+
+def test_dark_corr_spline():
+
+    """
+    B-spline dark correction vs per-channel scipy.interpolate.make_lsq_spline fit, and fallback to
+    interp when there are too few dark cycles
+    """
+
+    from scipy import interpolate
+
+    warnings.simplefilter('ignore')
+
+    for seed in range(2):
+        x, shutter, data = gen_shutter_data(seed=seed, Ny=8)
+        for spline_degree, spline_step in [(3, 4), (1, 2)]:
+            shutter1, data1 = ssfr.corr.dark_corr(x, shutter, data, mode='spline', shutter_mode={'open':0, 'close':1}, spline_degree=spline_degree, spline_step=spline_step)
+
+            cycle = ssfr.corr.get_dark_cycle(shutter)
+            index_cycle = np.where(cycle['tag']==1)[0]
+            index_dark  = np.concatenate([np.arange(*cycle['range'][i]) for i in index_cycle])
+            x_knot = np.array([np.mean(x[slice(*cycle['range'][i])]) for i in index_cycle])[1:-1][::spline_step]
+            knots = np.r_[[x[index_dark[0]]]*(spline_degree+1), x_knot, [x[index_dark[-1]]]*(spline_degree+1)]
+
+            # light samples between the first and the last dark cycle
+            logic = (shutter1==0)
+            assert logic.sum() > 0
+            for iChan in range(data.shape[1]):
+                spl = interpolate.make_lsq_spline(x[index_dark], data[index_dark, iChan], knots, k=spline_degree)
+                assert np.allclose(data1[logic, iChan], data[logic, iChan]-spl(x[logic]), rtol=0.0, atol=1e-8)
+
+    # noise-free dark drift is recovered exactly
+    x, shutter, data = gen_shutter_data(seed=2, Ny=4)
+    data = 100.0 + 3.0*x[:, np.newaxis] + 50.0*(shutter==0)[:, np.newaxis]*np.ones((1, 4))
+    shutter1, data1 = ssfr.corr.dark_corr(x, shutter, data, mode='spline', shutter_mode={'open':0, 'close':1})
+    assert np.allclose(data1[shutter1==0, :], 50.0, rtol=0.0, atol=1e-8)
+
+    # fewer than <spline_degree+1> dark cycles (0, 1, 0, 1, 0, 1, 0)
+    x, shutter, data = gen_shutter_data(seed=3, Ny=4)
+    logic = (np.cumsum(np.diff(shutter, prepend=shutter[0])!=0)<7)
+    x, shutter, data = x[logic], shutter[logic], data[logic, :]
+    with warnings.catch_warnings(record=True) as w:
+        warnings.simplefilter('always')
+        shutter1, data1 = ssfr.corr.dark_corr(x, shutter, data, mode='spline', shutter_mode={'open':0, 'close':1})
+    assert any('fall back' in str(w0.message) for w0 in w)
+    shutter0, data0 = ssfr.corr.dark_corr(x, shutter, data, mode='interp', shutter_mode={'open':0, 'close':1})
+    assert np.array_equal(shutter0, shutter1)
+    assert np.allclose(data0, data1, rtol=0.0, atol=0.0, equal_nan=True)
+
+
+
+if __name__ == '__main__':
+
+    test_dark_corr_interp()
+    test_shutter_cycle()
+    test_fit_dark_temp()
+    test_cal_dark_offset()
+    test_dark_corr_stream()
+    test_dark_corr_spline()
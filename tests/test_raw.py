@@ -0,0 +1,375 @@
+import os
+import struct
+import datetime
+import tempfile
+import warnings
+import h5py
+import numpy as np
+
+import ssfr
+
+
+
+
+def gen_lasp_ssfr(fname, Nrec=400, t0=datetime.datetime(2024, 5, 28, 12, 0, 0), dt=0.25, int_time=(80, 250, 80, 250),
+        cycle=(40, 10), counts=None, bad=(), seed=0):
+
+    """
+    Synthetic LASP-SSFR file (.SKS) written record by record with struct.pack ('<B144s3B' header and
+    '<d9ld9ll11dl2Bl257hl2Bl257hl2Bl257hlBBl257h' data records), light/dark cycles of <cycle> records,
+    spectrometers are in the file order of 'zen_si, nad_si, zen_in, nad_in', <counts> is a function
+    of (record index, spectrometer index, shutter) returning 256 counts (random if not provided),
+    records at <bad> fail one of the quality checks (shutter, EOS, null, spectrometer order)
+    """
+
+    rng = np.random.default_rng(seed)
+
+    def get_time(dtime):
+        return [dtime.microsecond/1.0e6, dtime.second, dtime.minute, dtime.hour, dtime.day, dtime.month, dtime.year, dtime.weekday(), dtime.timetuple().tm_yday, 0]
+
+    with open(fname, 'wb') as f:
+        f.write(struct.pack('<B144s3B', 144, b'synthetic', 0, 0, 0))
+        for i in range(Nrec):
+            dtime  = t0 + datetime.timedelta(seconds=i*dt + rng.uniform(0.0, 0.01))
+            shutter = int((i%sum(cycle)) >= cycle[0])
+
+            data = get_time(dtime) + get_time(dtime+datetime.timedelta(seconds=0.123456)) + [0] + rng.normal(15.0, 1.0, 11).tolist()
+            for ispec in range(4):
+                spec = [int_time[ispec], shutter, 1, 257, ispec]
+                if i in bad:
+                    k = bad.index(i) % 4
+                    if ispec == 1:
+                        spec[[1, 2, 3, 4][k]] = [1-shutter, 0, 256, 3][k]
+                    if (k == 3) and (ispec == 3):
+                        spec[4] = 1
+                if counts is None:
+                    data += spec + rng.integers(-32768, 32767, 256).tolist()
+                else:
+                    data += spec + np.round(counts(i, ispec, shutter)).astype(np.int64).tolist()
+            f.write(struct.pack('<d9ld9ll11dl2Bl257hl2Bl257hl2Bl257hlBBl257h', *data))
+
+
+
+def gen_nasa_ssfr(fname, Nrec=600, t0=datetime.datetime(2016, 9, 1, 23, 0, 0), seed=0):
+
+    """
+    Synthetic NASA-SSFR file (.OSA2) written record by record with struct.pack ('<2l12B6l8L1024h'),
+    10 dark records every 50 records
+    """
+
+    rng = np.random.default_rng(seed)
+    sec0 = int((t0-datetime.datetime(1970, 1, 1)).total_seconds())
+
+    with open(fname, 'wb') as f:
+        for i in range(Nrec):
+            shutter = 1 if (i%50)<10 else 0
+            counts = rng.integers(0, 1000, 1024) + 5000*(1-shutter)
+            f.write(struct.pack('<2l12B6l8L1024h', sec0+i, 0, *([0]*12), 60, 300, 60, 300, 1, shutter, *rng.integers(0, 100, 8).tolist(), *counts.tolist()))
+
+
+
+def gen_lasp_alp(fname, Nrec=1000, gps_time0=2*86400.0+23.5*3600.0, dt=1.0, Nbad=0, seed=0):
+
+    """
+    Synthetic ALP file (.plt3) written record by record with struct.pack ('<31d'), the first <Nbad>
+    records have bad GPS time (0, e.g., during GPS initialization)
+    """
+
+    rng = np.random.default_rng(seed)
+
+    with open(fname, 'wb') as f:
+        for i in range(Nrec):
+            data = rng.normal(size=31)
+            data[3] = gps_time0 + i*dt if i >= Nbad else 0.0
+            data[10] = rng.uniform(60.0, 70.0)
+            data[11] = rng.uniform(-50.0, -40.0)
+            f.write(struct.pack('<31d', *data))
+
+
+
+def gen_lasp_cg4(fname, Nrec=300, sec0=1500000000, seed=0):
+
+    """
+    Synthetic CG4 file (.CG4) written record by record with struct.pack
+    ('<2l1l1B3B1l1h1B1B1l1l1l1l1l1B3B1l1h1B1B1l1l1l1l1l'), channel 1 (zenith) and channel 2 (nadir)
+    """
+
+    rng = np.random.default_rng(seed)
+    const = int('800000', 16)
+
+    with open(fname, 'wb') as f:
+        for i in range(Nrec):
+            data = [sec0+i, 0, i]
+            for serial, gain in [(20592, 1), (20618, 2)]:
+                data += [0, 0, 0, 0, serial, 1, 1, gain] + (const + rng.integers(-1000, 1000, 5)).tolist()
+            f.write(struct.pack('<2l1l1B3B1l1h1B1B1l1l1l1l1l1B3B1l1h1B1B1l1l1l1l1l', *data))
+
+
+
+def test_rec_layout():
+
+    """
+    Record layouts (ssfr.common.rec_layout) vs struct formats of the raw data files
+    """
+
+    fmts = {
+            'lasp|ssfr': '<d9ld9ll11dl2Bl257hl2Bl257hl2Bl257hlBBl257h',
+            'nasa|ssfr': '<2l12B6l8L1024h',
+             'lasp|alp': '<31d',
+             'lasp|cg4': '<2l1l1B3B1l1h1B1B1l1l1l1l1l1B3B1l1h1B1B1l1l1l1l1l',
+            }
+
+    for which_rec, fmt in fmts.items():
+        dtype = ssfr.util.get_rec_dtype(which_rec)
+        assert dtype.itemsize == struct.calcsize(fmt), which_rec
+        assert dtype.itemsize == ssfr.common.rec_layout[which_rec]['dataLen'], which_rec
+
+    # field values of a packed record
+    rng = np.random.default_rng(0)
+    data = rng.integers(0, 100, 29).tolist()
+    rec = np.frombuffer(struct.pack(fmts['lasp|cg4'], *data), dtype=ssfr.util.get_rec_dtype('lasp|cg4'))
+    for vname, i in [('cnt', 2), ('status1', 3), ('serial1', 7), ('sys_serial1', 8), ('gain1', 10), ('voltage1', 11), ('caltemp1', 15),
+                     ('status2', 16), ('serial2', 20), ('gain2', 23), ('voltage2', 24), ('caltemp2', 28)]:
+        assert rec[vname][0] == data[i], vname
+    assert np.array_equal(rec['time1'][0], data[0:2])
+
+    try:
+        ssfr.util.get_rec_dtype('lasp|ssfr-x')
+    except OSError:
+        pass
+    else:
+        raise AssertionError('OSError is expected for unknown record layout.')
+
+
+
+def test_lasp_ssfr():
+
+    """
+    LASP-SSFR bulk decoder (structured dtype) vs struct.unpack decode (record by record)
+    """
+
+    warnings.simplefilter('ignore')
+
+    with tempfile.TemporaryDirectory() as fdir:
+
+        fname = os.path.join(fdir, 'ssfr.SKS')
+        gen_lasp_ssfr(fname, bad=[3, 17, 101, 250, 333])
+
+        data0 = ssfr.lasp_ssfr.read_ssfr_raw(fname)
+        assert data0['iterN'] == 400
+        assert data0['comment'].startswith(b'synthetic')
+
+        with open(fname, 'rb') as f:
+            f.read(148)
+            for i in range(data0['iterN']):
+                data = struct.unpack('<d9ld9ll11dl2Bl257hl2Bl257hl2Bl257hlBBl257h', f.read(2276))
+                dataHead = data[:32]
+                dataSpec = np.transpose(np.array(data[32:]).reshape((4, 261)))[:, [0, 2, 1, 3]]
+
+                qual_flag = not ((np.unique(dataSpec[1, :]).size != 1) or any(dataSpec[2, :] != 1) or \
+                                 any(dataSpec[3, :] != 257) or (not np.array_equal(dataSpec[4, :], np.array([0, 2, 1, 3]))))
+
+                assert np.array_equal(data0['count_raw'][i, :, :], dataSpec[5:, :])
+                assert data0['shutter'][i] == dataSpec[1, 0]
+                assert np.array_equal(data0['int_time'][i, :], dataSpec[0, :])
+                assert np.array_equal(data0['temp'][i, :], dataHead[21:])
+                assert data0['qual_flag'][i] == qual_flag
+                assert qual_flag == (i not in [3, 17, 101, 250, 333])
+
+                for vname, i0 in [('jday_ARINC', 0), ('jday_cRIO', 10)]:
+                    dtime = datetime.datetime(*dataHead[i0+6:i0:-1], int(round(dataHead[i0]*1000000.0)))
+                    assert abs(data0[vname][i] - ((dtime-datetime.datetime(1, 1, 1)).total_seconds()/86400.0+1.0)) < 1.0e-10
+
+
+
+def test_nasa_ssfr():
+
+    """
+    NASA-SSFR bulk decoder vs struct.unpack decode (record by record), and cal_flux of processed data
+    vs legacy processed HDF5 (<fname_raw=>)
+    """
+
+    warnings.simplefilter('ignore')
+
+    with tempfile.TemporaryDirectory() as fdir:
+
+        fnames = [os.path.join(fdir, 'spc%5.5d.OSA2' % i) for i in range(2)]
+        for i, fname in enumerate(fnames):
+            gen_nasa_ssfr(fname, t0=datetime.datetime(2016, 9, 1, 23, 0, 0)+datetime.timedelta(seconds=600*i), seed=i)
+
+        # decode
+        #/----------------------------------------------------------------------------\#
+        data0 = ssfr.nasa_ssfr.read_ssfr_raw(fnames[0])
+        with open(fnames[0], 'rb') as f:
+            for i in range(data0['iterN']):
+                data = struct.unpack('<2l12B6l8L1024h', f.read(2124))
+                assert np.array_equal(data0['spectra'][i, :, :], np.array(data[28:]).reshape((4, 256)).T)
+                assert data0['shutter'][i] == data[19]
+                assert np.array_equal(data0['int_time'][i, :], data[14:18])
+                assert np.array_equal(data0['temp'][i, :], data[20:28])
+                jday0 = ((datetime.datetime(1970, 1, 1)+datetime.timedelta(seconds=data[0])) - datetime.datetime(1, 1, 1)).total_seconds()/86400.0 + 1.0
+                assert data0['jday'][i] == jday0
+        #\----------------------------------------------------------------------------/#
+
+        # tmhr_range with and without catalog
+        #/----------------------------------------------------------------------------\#
+        # (data are shifted to the next day with 1 hour offset)
+        for time_add_offset, tmhr_range in [(0.0, [23.1, 23.3]), (3600.0, [0.1, 0.3])]:
+            ssfr0 = ssfr.nasa_ssfr.read_ssfr(fnames, tmhr_range=tmhr_range, time_add_offset=time_add_offset, process=False)
+            ssfr1 = ssfr.nasa_ssfr.read_ssfr(fnames, tmhr_range=tmhr_range, time_add_offset=time_add_offset, process=False, catalog=True)
+            assert ssfr0.tmhr.size > 0
+            assert np.array_equal(ssfr0.tmhr, ssfr1.tmhr)
+            assert np.array_equal(ssfr0.spectra, ssfr1.spectra)
+        #\----------------------------------------------------------------------------/#
+
+        # cal_flux of processed data and legacy processed data
+        #/----------------------------------------------------------------------------\#
+        ssfr0 = ssfr.nasa_ssfr.read_ssfr(fnames)
+        assert np.allclose(ssfr0.zen_cnt/ssfr0.zen_int_time, ssfr0.data_spec['cnt_zen'], equal_nan=True)
+        assert np.allclose(ssfr0.nad_cnt/ssfr0.nad_int_time, ssfr0.data_spec['cnt_nad'], equal_nan=True)
+
+        fnames_resp = {}
+        for which_lc, wvl in [('zenith', ssfr0.zen_wvl), ('nadir', ssfr0.nad_wvl)]:
+            fnames_resp[which_lc] = os.path.join(fdir, 'rad-resp_%s.h5' % which_lc)
+            with h5py.File(fnames_resp[which_lc], 'w') as f:
+                f['sec_resp'] = np.linspace(1.0, 2.0, wvl.size)
+
+        fname_raw = os.path.join(fdir, 'ssfr_v0.h5')
+        with h5py.File(fname_raw, 'w') as f:
+            for vname in ['jday', 'tmhr', 'shutter', 'zen_wvl', 'nad_wvl', 'zen_cnt', 'nad_cnt']:
+                f[vname] = getattr(ssfr0, vname)
+            # integration times are constant, stored per channel as in legacy files
+            f['zen_int_time'] = ssfr0.zen_int_time[0, :]
+            f['nad_int_time'] = ssfr0.nad_int_time[0, :]
+
+        ssfr1 = ssfr.nasa_ssfr.read_ssfr([], fname_raw=fname_raw)
+
+        ssfr0.cal_flux(fnames_resp)
+        ssfr1.cal_flux(fnames_resp)
+
+        logic = np.isfinite(ssfr0.zen_flux[:, 0])
+        assert logic.sum() > 0
+        assert np.all(np.isfinite(ssfr1.zen_flux[logic, 0]))
+        assert np.allclose(ssfr0.zen_flux[logic, :], ssfr1.zen_flux[logic, :])
+        assert np.allclose(ssfr0.nad_flux[logic, :], ssfr1.nad_flux[logic, :])
+        #\----------------------------------------------------------------------------/#
+
+
+
+def test_lasp_alp():
+
+    """
+    ALP column projection (memory mapped) vs struct.unpack decode (record by record), and read_alp
+    with shared buffer (<workers=>) vs serial read
+    """
+
+    warnings.simplefilter('ignore')
+
+    with tempfile.TemporaryDirectory() as fdir:
+
+        fnames = [os.path.join(fdir, 'alp_%d.plt3' % i) for i in range(3)]
+        for i, fname in enumerate(fnames):
+            gen_lasp_alp(fname, Nrec=300, gps_time0=2*86400.0+23.0*3600.0+i*300.0, seed=i)
+
+        vnames_all = list(ssfr.util.get_rec_dtype('lasp|alp').names)
+        vnames = ['GPS_Time', 'Longitude', 'Latitude', 'ARINC_Pitch']
+
+        with open(fnames[0], 'rb') as f:
+            data = np.array(list(struct.iter_unpack('<31d', f.read())))
+        assert np.array_equal(ssfr.lasp_alp.read_alp_raw(fnames[0]), data)
+        assert np.array_equal(ssfr.lasp_alp.read_alp_raw(fnames[0], vnames=vnames), data[:, [vnames_all.index(vname) for vname in vnames]])
+
+        alp0 = ssfr.lasp_alp.read_alp(fnames, verbose=False)
+        alp1 = ssfr.lasp_alp.read_alp(fnames, workers=2, verbose=False)
+        assert alp0.data_raw['tmhr'].size == 900
+        for vname in alp0.data_raw.keys():
+            if vname != 'info':
+                assert np.array_equal(alp0.data_raw[vname], alp1.data_raw[vname], equal_nan=True), vname
+
+
+
+def test_lasp_cg4():
+
+    """
+    CG4 bulk decoder vs struct.unpack decode (record by record), and calibration with configuration file
+    """
+
+    warnings.simplefilter('ignore')
+
+    with tempfile.TemporaryDirectory() as fdir:
+
+        fnames = [os.path.join(fdir, 'cg4_%d.CG4' % i) for i in range(2)]
+        for i, fname in enumerate(fnames):
+            gen_lasp_cg4(fname, sec0=1500000000+300*i, seed=i)
+
+        const = int('800000', 16)
+        data = []
+        for fname in fnames:
+            with open(fname, 'rb') as f:
+                data += list(struct.iter_unpack('<2l1l1B3B1l1h1B1B1l1l1l1l1l1B3B1l1h1B1B1l1l1l1l1l', f.read()))
+        data = np.array(data, dtype=np.float64)
+
+        dtime = datetime.datetime(2017, 7, 14)
+        cg40 = ssfr.lasp_cg4.cg4(fnames, dtime=dtime)
+        assert np.array_equal(cg40.tmhr, (data[:, 0]-(dtime-datetime.datetime(1970, 1, 1)).days*86400.0)/3600.0)
+        for vname, i, i_gain in [('vol_zen', 11, 10), ('temp_zen', 12, 10), ('temp_rear_zen', 13, 10), ('temp_sys_zen', 14, 10),
+                                 ('vol_nad', 24, 23), ('temp_nad', 25, 23), ('temp_rear_nad', 26, 23), ('temp_sys_nad', 27, 23)]:
+            assert np.allclose(getattr(cg40, vname), (data[:, i]-const)*1.25/const/data[:, i_gain], rtol=1e-12, atol=0.0), vname
+
+        fname_cfg = os.path.join(fdir, 'cg4.cfg')
+        with open(fname_cfg, 'w') as f:
+            f.write('cg4cal 20618 1.0 2.0 1.0 20592 0.5 1.5 1.0\ncg4tem 20618 0 1 0 1 0 1 20592 0 1 0 1 0 1\n')
+
+        cg41 = ssfr.lasp_cg4.cg4(fnames, fname_cfg=fname_cfg, dtime=dtime)
+        assert np.array_equal(cg41.zen['T'], 1.0e3*cg40.temp_zen)
+        assert np.allclose(cg41.nad['F'], 1.0 + cg40.vol_nad*1.0e6*2.0 + 5.6704e-8*(1.0e3*cg40.temp_nad+273.15)**4.0, rtol=1e-12, atol=0.0)
+        assert np.array_equal(cg41.tmhr, cg40.tmhr)
+
+        # empty file
+        fname_empty = os.path.join(fdir, 'empty.CG4')
+        open(fname_empty, 'wb').close()
+        try:
+            ssfr.lasp_cg4.cg4([fname_empty])
+        except OSError:
+            pass
+        else:
+            raise AssertionError('OSError is expected for CG4 files without data records.')
+
+
+
+def test_lasp_alp_catalog():
+
+    """
+    ALP files selected by catalog (tmhr_range) vs all files sliced by tmhr_range, with time offset
+    that moves data across midnight
+    """
+
+    warnings.simplefilter('ignore')
+
+    with tempfile.TemporaryDirectory() as fdir:
+
+        fnames = [os.path.join(fdir, 'alp_%d.plt3' % i) for i in range(3)]
+        for i, fname in enumerate(fnames):
+            gen_lasp_alp(fname, gps_time0=2*86400.0+23.0*3600.0+i*1000.0, Nbad=5*(i==0), seed=i)
+
+        for time_offset, tmhr_range in [(0.0, [23.2, 23.5]), (-1800.0, [22.8, 23.0]), (2700.0, [0.0, 0.2])]:
+            alp0 = ssfr.lasp_alp.read_alp(fnames, time_offset=time_offset, verbose=False)
+            alp1 = ssfr.lasp_alp.read_alp(fnames, time_offset=time_offset, tmhr_range=tmhr_range, catalog=True, verbose=False)
+
+            logic = (alp0.data_raw['tmhr']>=tmhr_range[0]) & (alp0.data_raw['tmhr']<=tmhr_range[1])
+            assert logic.sum() > 0
+            # (heading is derived from neighbouring positions, not compared)
+            for vname in alp0.data_raw.keys():
+                if vname not in ['info', 'ang_hed']:
+                    assert np.array_equal(alp0.data_raw[vname][logic], alp1.data_raw[vname]), vname
+
+
+
+if __name__ == '__main__':
+
+    test_rec_layout()
+    test_lasp_ssfr()
+    test_nasa_ssfr()
+    test_lasp_alp()
+    test_lasp_alp_catalog()
+    test_lasp_cg4()